@@ -1,52 +1,35 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Body, Query
+from fastapi import APIRouter, HTTPException, Request, Body, Query
 from typing import List, Dict, Optional, Any
 from pydantic import BaseModel, ConfigDict
 import os
+import asyncio
 import logging
 import traceback
-import uuid
 from datetime import datetime
 import numpy as np
-from app.services.code_parser import CodeParser
-from app.services.embedder import CodeEmbedder
-from app.db.vector_store import VectorStore
-from app.services.cache import CacheService
 from app.services.rate_limiter import rate_limiter
 from app.core.config import get_settings
-from chromadb import PersistentClient
-from app.services.code_indexer import CodeIndexer
-from app.services.rag_engine import RAGEngine
+from app.core import services
+from app.core.profiling import profiler
+from app.services.model_registry import model_registry
+from app.services.file_watcher import FileWatcher
 from app.db import metadata_store
 from app.core.utils import get_workspace_root
-from app.db.metadata_store import delete_chunks_for_file
-import openai
 
 router = APIRouter()
 
-# Initialize services and dependencies (should be shared with main.py)
-code_parser = CodeParser()
-code_embedder = CodeEmbedder()
+# Services are built on first use and shared with main.py (see app.core.services)
 workspace_root = get_workspace_root()
-persist_directory = os.path.join(workspace_root, ".devflow", "chroma_db")
-os.makedirs(persist_directory, exist_ok=True)
-client = PersistentClient(path=persist_directory)
-vector_store = VectorStore(client)
-code_indexer = CodeIndexer(vector_store)
-rag_engine = RAGEngine(vector_store)
-cache = CacheService()
+file_watcher: Optional[FileWatcher] = None
 settings = get_settings()
 logger = logging.getLogger("devflow")
 
-LANGUAGE_MAP = {
-    'py': 'python', 'js': 'javascript', 'ts': 'typescript', 'java': 'java', 'go': 'go', 'rb': 'ruby',
-    'cpp': 'cpp', 'cc': 'cpp', 'cxx': 'cpp', 'cs': 'csharp', 'kt': 'kotlin', 'php': 'php', 'c': 'c',
-    'rs': 'rust', 'scala': 'scala', 'swift': 'swift'
-}
-
 class IndexRequest(BaseModel):
     path: str
     recursive: bool = True
     extensions: Optional[List[str]] = None
+    incremental: bool = True  # Skip unchanged files instead of rebuilding the whole index
+    background: bool = True  # Return a job ID right away instead of waiting for the run to finish
 
 class FindSimilarRequest(BaseModel):
     code_snippet: str
@@ -57,6 +40,11 @@ class SearchRequest(BaseModel):
     query: str
     limit: int = 5
 
+class ReduceRequest(BaseModel):
+    dims: Optional[int] = None  # Target dimensions (default EMBEDDING_REDUCED_DIM); 0 restores full vectors
+    sample_size: Optional[int] = None  # Vectors sampled to fit and evaluate (default EMBEDDING_REDUCTION_SAMPLE)
+    apply: bool = True  # Re-project the index; False only reports the recall the setting would cost
+
 class ApiResponse(BaseModel):
     message: str
     data: dict | None = None
@@ -94,15 +82,13 @@ async def health_check():
     }
 
 @router.post("/index")
-async def index_codebase(request: IndexRequest, background_tasks: BackgroundTasks, req: Request):
+async def index_codebase(request: IndexRequest, req: Request):
     await rate_limiter.check_rate_limit(
         req, "index", settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW
     )
     try:
         # Only log status, not detailed results
         logger.warning(f"POST /api/index - 200 OK")
-        # Clear the vector store before indexing
-        vector_store.clear()
         # If the path is not absolute, resolve it relative to the project root
         if not os.path.isabs(request.path):
             path = os.path.abspath(os.path.join(workspace_root, request.path))
@@ -111,108 +97,117 @@ async def index_codebase(request: IndexRequest, background_tasks: BackgroundTask
         if not os.path.exists(path):
             logger.error(f"POST /api/index - 404 Not Found: {path}")
             raise HTTPException(status_code=404, detail=f"Path not found: {path}")
-        total_files = 0
-        total_chunks = 0
-        total_embeddings = 0
-        supported_exts = set(LANGUAGE_MAP.keys())
-        for root, _, files in os.walk(path):
-            if not request.recursive and root != path:
-                continue
-            for file in files:
-                ext = os.path.splitext(file)[1][1:].lower()
-                if request.extensions:
-                    normalized_exts = [ext.lower().lstrip('.') for ext in request.extensions]
-                    if ext not in normalized_exts:
-                        continue
-                if ext not in supported_exts:
-                    continue  # Skip unsupported files and do not log errors
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        code = f.read()
-                    lang = LANGUAGE_MAP.get(ext, ext)
-                    parsed_code = code_parser.parse_code(code, lang)
-                    if not parsed_code:
-                        continue
-                    functions = code_parser.extract_functions(parsed_code, code)
-                    classes = code_parser.extract_classes(parsed_code, code)
-                    file_record = metadata_store.add_file(file_path)
-                    file_id = file_record.id
-                    # Delete old chunks for this file before adding new ones
-                    delete_chunks_for_file(file_id)
-                    for func in functions:
-                        try:
-                            vector_store.add_vectors(
-                                [func['code']],
-                                [{
-                                    'type': 'function',
-                                    'name': func['name'],
-                                    'file_path': file_path,
-                                    'code': func['code'],
-                                    'language': lang
-                                }]
-                            )
-                            total_embeddings += 1
-                            chunk_id = str(uuid.uuid4())
-                            embedding_id = chunk_id
-                            metadata_store.add_chunk(
-                                file_id=file_id,
-                                chunk_id=chunk_id,
-                                type_='function',
-                                name=func['name'],
-                                start=func.get('start_line', 0),
-                                end=func.get('end_line', 0),
-                                embedding_id=embedding_id
-                            )
-                        except Exception as e:
-                            logger.error(f"Embedding error for function in {file_path}: {e}\n{traceback.format_exc()}")
-                    for cls in classes:
-                        try:
-                            vector_store.add_vectors(
-                                [cls['code']],
-                                [{
-                                    'type': 'class',
-                                    'name': cls['name'],
-                                    'file_path': file_path,
-                                    'code': cls['code'],
-                                    'language': lang
-                                }]
-                            )
-                            total_embeddings += 1
-                            chunk_id = str(uuid.uuid4())
-                            embedding_id = chunk_id
-                            metadata_store.add_chunk(
-                                file_id=file_id,
-                                chunk_id=chunk_id,
-                                type_='class',
-                                name=cls['name'],
-                                start=cls.get('start_line', 0),
-                                end=cls.get('end_line', 0),
-                                embedding_id=embedding_id
-                            )
-                        except Exception as e:
-                            logger.error(f"Embedding error for class in {file_path}: {e}\n{traceback.format_exc()}")
-                    total_files += 1
-                    total_chunks += len(functions) + len(classes)
-                except UnicodeDecodeError:
-                    # Suppress decode errors for non-UTF-8 files
-                    continue
-                except Exception as e:
-                    logger.error(f"Error processing {file_path}: {e}\n{traceback.format_exc()}")
-                    continue
+        code_indexer = services.get_code_indexer()
+        job = services.get_index_jobs().submit(path, lambda job: code_indexer.index_codebase(
+            path,
+            recursive=request.recursive,
+            extensions=request.extensions,
+            incremental=request.incremental,
+            job=job
+        ))
+        if request.background:
+            return {
+                "success": True,
+                "message": f"Indexing started. Poll /api/index/jobs/{job.id} for progress.",
+                "data": job.to_dict()
+            }
+        # Blocking mode still runs on the job executor, so the event loop stays free
+        while job.finished_at is None:
+            await asyncio.sleep(0.2)
+        if job.status != "completed":
+            raise HTTPException(status_code=500, detail=f"Indexing {job.status}: {job.error}")
+        result = dict(job.result)
         return {
             "success": True,
-            "message": f"Indexing complete! {total_files} files, {total_chunks} code chunks, {total_embeddings} embeddings.",
-            "data": {
-                "total_files": total_files,
-                "total_chunks": total_chunks,
-                "total_embeddings": total_embeddings
-            }
+            "message": result.pop("message"),
+            "data": result
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"POST /api/index - 500 Internal Server Error: {e}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}\n{traceback.format_exc()}")
 
+@router.get("/index/jobs")
+async def list_index_jobs():
+    jobs = [job.to_dict() for job in services.get_index_jobs().list()]
+    return {
+        "success": True,
+        "message": f"{len(jobs)} index jobs found.",
+        "data": {
+            "jobs": jobs
+        }
+    }
+
+@router.get("/index/jobs/{job_id}")
+async def get_index_job(job_id: str):
+    job = services.get_index_jobs().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Index job not found: {job_id}")
+    return {
+        "success": True,
+        "message": f"Index job {job.status}.",
+        "data": job.to_dict()
+    }
+
+@router.post("/index/jobs/{job_id}/cancel")
+async def cancel_index_job(job_id: str):
+    job = services.get_index_jobs().cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Index job not found: {job_id}")
+    return {
+        "success": True,
+        "message": "Cancellation requested." if job.finished_at is None else f"Index job already {job.status}.",
+        "data": job.to_dict()
+    }
+
+def _reindex_changed(paths):
+    """File watcher callback: re-index touched files, or everything after lost events."""
+    code_indexer = services.get_code_indexer()
+    if paths is None:
+        # Rescan what was last indexed, with the same filters
+        summary = code_indexer.index_codebase(**(code_indexer.last_scope() or {"path": workspace_root}))
+    else:
+        summary = code_indexer.index_files(paths)
+    logger.info(f"Watcher: {summary['message']}")
+
+def start_watcher() -> FileWatcher:
+    global file_watcher
+    if file_watcher is None:
+        file_watcher = FileWatcher(workspace_root, _reindex_changed)
+    file_watcher.start()
+    return file_watcher
+
+def stop_watcher():
+    if file_watcher is not None:
+        file_watcher.stop()
+
+@router.post("/watch/start")
+async def watch_start():
+    watcher = start_watcher()
+    return {
+        "success": True,
+        "message": f"Watching {watcher.root} for changes.",
+        "data": watcher.status()
+    }
+
+@router.post("/watch/stop")
+async def watch_stop():
+    stop_watcher()
+    return {
+        "success": True,
+        "message": "File watcher stopped.",
+        "data": file_watcher.status() if file_watcher else None
+    }
+
+@router.get("/watch/status")
+async def watch_status():
+    return {
+        "success": True,
+        "message": "File watcher running." if file_watcher and file_watcher.running else "File watcher stopped.",
+        "data": file_watcher.status() if file_watcher else None
+    }
+
 @router.post("/find_similar")
 async def find_similar_code(request: FindSimilarRequest, req: Request):
     await rate_limiter.check_rate_limit(
@@ -220,8 +215,8 @@ async def find_similar_code(request: FindSimilarRequest, req: Request):
     )
     try:
         logger.info(f"Finding similar code snippet in {request.language}")
-        code_embedding = code_embedder.embed_code(request.code_snippet)
-        results, scores = vector_store.search(code_embedding, k=3)
+        code_embedding = await services.get_snippet_batcher().embed(request.code_snippet)
+        results, scores = services.get_vector_store().search_by_vector(code_embedding, k=3)
         logger.info(f"Found {len(results)} similar code chunks for context")
         chunks = []
         for result, score in zip(results, scores):
@@ -263,21 +258,29 @@ async def find_similar_code(request: FindSimilarRequest, req: Request):
 async def search_codebase(request: SearchRequest, req: Request):
     try:
         logger.info(f"Received search: {request.query} (limit {request.limit})")
-        results, distances = vector_store.search(request.query, k=request.limit)
+        query_embedding = await services.get_query_batcher().embed(request.query)
+        results, distances = services.get_vector_store().search_by_vector(query_embedding, k=request.limit)
         chunks = []
         for result, score in zip(results, distances):
+            # Every place this code occurs; the first one in the result's file gives its lines
+            locations = result.get('locations', [])
+            location = next((loc for loc in locations if loc['file_path'] == result['file_path']), {})
             chunk = {
                 'text': result['code'],
                 'file_path': result['file_path'],
                 'type': result['type'],
                 'name': result['name'],
                 'score': float(score),
-                'start_line': result.get('start_line', 0),
-                'end_line': result.get('end_line', 0),
+                'start_line': location.get('start_line', result.get('start_line', 0)),
+                'end_line': location.get('end_line', result.get('end_line', 0)),
                 'docstring': result.get('docstring'),
                 'parent_class': result.get('parent_class'),
-                'comments': result.get('comments', [])
+                'comments': result.get('comments', []),
+                'locations': locations
             }
+            if result['type'] == 'class' and location:
+                # A class is stored as a skeleton; its methods and nested classes are chunks of their own
+                chunk['members'] = metadata_store.list_child_chunks(location['chunk_id'])
             chunks.append(chunk)
         # logger.warning(f"POST /api/search - returning {len(chunks)} chunks")
         return {
@@ -294,7 +297,8 @@ async def search_codebase(request: SearchRequest, req: Request):
 @router.get("/stats")
 async def get_stats(debug: bool = Query(False)):
     # Get vector/embedding stats from ChromaDB
-    vector_stats = vector_store.get_stats(debug=debug)
+    vector_stats = services.get_vector_store().get_stats(debug=debug)
+    code_embedder = services.get_embedder()
     # Get file/chunk stats from metadata
     files = metadata_store.list_files() if hasattr(metadata_store, 'list_files') else []
     file_count = len(files)
@@ -312,7 +316,14 @@ async def get_stats(debug: bool = Query(False)):
         "vector_sample_files": vector_stats.get("sample_files", []),
         "last_indexed": vector_stats.get("last_indexed"),
         "errors": vector_stats.get("errors", []),
-        "vector_debug": vector_stats.get("debug_info", {})
+        "vector_debug": vector_stats.get("debug_info", {}),
+        "embedding_cache": code_embedder.cache.stats() if code_embedder.cache else None,
+        "query_cache": code_embedder.query_cache.stats() if code_embedder.query_cache else None,
+        "embedding_models": model_registry.memory_report(),
+        "query_batching": {
+            "query": services.get_query_batcher().stats(),
+            "snippet": services.get_snippet_batcher().stats()
+        }
     }
     return {
         "success": True,
@@ -320,9 +331,18 @@ async def get_stats(debug: bool = Query(False)):
         "data": stats
     }
 
+@router.get("/profile/startup")
+async def startup_profile():
+    report = profiler.report()
+    return {
+        "success": True,
+        "message": f"Ready after {report['ready_seconds']}s." if report["ready_seconds"] is not None else "Still starting.",
+        "data": {**report, "services_built": services.status()}
+    }
+
 @router.get("/embeddings")
 async def list_embeddings():
-    embeddings = vector_store.list_all()
+    embeddings = services.get_vector_store().list_all()
     return {
         "success": True,
         "message": f"{len(embeddings)} embeddings found.",
@@ -331,11 +351,28 @@ async def list_embeddings():
         }
     }
 
+@router.post("/embeddings/reduce")
+async def reduce_embeddings(request: ReduceRequest):
+    dims = settings.EMBEDDING_REDUCED_DIM if request.dims is None else request.dims
+    try:
+        report = await asyncio.to_thread(services.get_code_indexer().reduce_dimensions, dims, request.sample_size, request.apply)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"POST /api/embeddings/reduce - 500 Internal Server Error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    action = "Index rebuilt" if request.apply else "Evaluated"
+    return {
+        "success": True,
+        "message": f"{action} at {report['dimensions']} dimensions.",
+        "data": report
+    }
+
 @router.post("/clear")
 async def clear_index():
     try:
-        vector_store.clear()
-        cache.clear()
+        services.get_vector_store().clear()
+        services.get_cache().clear()
         metadata_store.clear()
         return {
             "success": True,
@@ -367,12 +404,13 @@ async def answer_query(
         }
 
     try:
-        answer = rag_engine.answer_query(
+        answer = services.get_rag_engine().answer_query(
             request.query,
             k=request.limit,
             openai_key=key,
             openai_model=model,
-            openai_token_limit=token_limit
+            openai_token_limit=token_limit,
+            query_embedding=await services.get_query_batcher().embed(request.query)
         )
         return {
             "success": True,
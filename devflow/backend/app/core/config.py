@@ -35,6 +35,44 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4.1-nano")
     EMBEDDING_DIMENSION: int = 768
     MAX_SEQUENCE_LENGTH: int = 512
+    EMBEDDING_BATCH_TOKENS: int = 16384  # padded tokens per forward pass
+    EMBEDDING_MAX_BATCH_SIZE: int = 64
+    EMBEDDING_CACHE_ENABLED: bool = True  # keep computed embeddings in .devflow/embedding_cache.db
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 100_000  # least recently used beyond this are evicted (~3 KB each at 768 dims)
+    EMBEDDING_CACHE_DTYPE: str = "float32"  # float32 | float16 | int8 precision of cached vectors (2x / 4x smaller)
+    EMBEDDING_REDUCED_DIM: int = 128  # default target dimensions of /embeddings/reduce (PCA)
+    EMBEDDING_REDUCTION_SAMPLE: int = 20000  # stored vectors sampled to fit the PCA and measure recall
+    EMBEDDING_BACKEND: str = "torch"  # torch | onnx | onnx-int8 (needs onnxruntime; exported to .devflow/onnx)
+    EMBEDDING_ONNX_MIN_COSINE: float = 0.99  # ONNX exports embedding less similar than this to torch are rejected
+    EMBEDDING_WARMUP: bool = True  # load the embedding model in the background at startup instead of on first use
+    QUERY_CACHE_MAX_ENTRIES: int = 1024  # query embeddings kept in memory; 0 = no query cache
+    QUERY_CACHE_TTL: float = 600  # seconds a cached query embedding stays valid
+    EMBEDDING_WORKERS: int = 1  # embedding processes for indexing, each with its own model copy; 1 = in-process, 0 = fill the cores
+    EMBEDDING_WORKER_THREADS: int = 0  # intra-op threads per embedding worker; 0 = cores / workers
+    QUERY_BATCH_MAX_SIZE: int = 32  # concurrent search embeddings run in one forward pass
+    QUERY_BATCH_MAX_WAIT_MS: float = 5.0  # how long the first request of a batch waits for others
+    
+    # Startup Settings
+    STARTUP_PROFILE: bool = True  # time imports and service construction, see GET /api/profile/startup
+    
+    # Indexing Settings
+    INDEX_EMBED_BUFFER: int = 256  # chunks collected across files before embedding
+    INDEX_QUEUE_SIZE: int = 64  # bound of each queue between pipeline stages
+    INDEX_READER_THREADS: int = 4  # threads that stat, hash and read files
+    INDEX_USE_GIT: bool = True  # ask git for changed paths instead of walking the tree when possible
+    INDEX_BLOB_ARCHIVE_CHUNKS: int = 100000  # chunks of no-longer-checked-out git blobs kept for reuse
+    INDEX_MAX_FILE_BYTES: int = 1_000_000  # larger files are skipped (generated or minified code); 0 = no limit
+    PARSE_WORKERS: int = 0  # parse worker processes; 0 = one per CPU core, 1 = parse in-process
+    PARSE_CHUNKSIZE: int = 8  # files sent to a parse worker per round trip
+    PARSE_TIMEOUT_MS: int = 5000  # tree-sitter parse time allowed per file; 0 = no limit
+    INDEX_JOB_HISTORY: int = 50  # finished index jobs kept for polling
+    CHUNK_MAX_TOKENS: int = 480  # embedding tokens per chunk; leaves room for the type/name prefix within MAX_SEQUENCE_LENGTH
+    CHUNK_OVERLAP_TOKENS: int = 32  # tokens shared by consecutive parts of a split function or class; 0 = none
+    
+    # File Watcher Settings
+    WATCH_ENABLED: bool = False  # start watching the workspace on startup
+    WATCH_DEBOUNCE_MS: int = 250  # quiet period that closes a batch of save events
+    WATCH_POLL_INTERVAL: float = 1.0  # seconds between scans of the polling fallback
     
     # Cache Settings
     CACHE_TTL: int = 3600  # seconds
@@ -0,0 +1,137 @@
+"""
+Startup Profiling
+
+Records where cold-start time goes: how long each top-level package takes
+to import (cumulative, so `transformers` includes the `torch` it pulls in
+unless torch was already loaded) and how long each service takes to build.
+The app marks the moment it is ready to serve; imports and services that
+come later (on first use) are reported as deferred, so the report shows both
+the time to first response and what the first real request pays for.
+Served by GET /api/profile/startup.
+"""
+
+import importlib.abc
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("devflow")
+
+# Entries shown per section of the report
+REPORT_LIMIT = 30
+
+class StartupProfiler:
+    """Collects import and service construction times of the process."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ready_at: Optional[float] = None
+        self.imports: List[Dict[str, Any]] = []
+        self.services: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._hook: Optional["_ImportTimer"] = None
+
+    def _record(self, entries: List[Dict[str, Any]], name: str, start: float):
+        end = time.perf_counter()
+        with self._lock:
+            entries.append({
+                "name": name,
+                "seconds": round(end - start, 4),
+                "at": round(start - self.started, 4),
+                "deferred": self.ready_at is not None,
+            })
+
+    def install_import_hook(self):
+        """Time every top-level package imported from now on."""
+        if self._hook is None:
+            self._hook = _ImportTimer(self)
+            sys.meta_path.insert(0, self._hook)
+
+    @contextmanager
+    def service(self, name: str) -> Iterator[None]:
+        """Time the construction of a service."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(self.services, name, start)
+
+    def mark_ready(self) -> float:
+        """Note that the app can serve requests; returns the seconds it took."""
+        self.ready_at = time.perf_counter()
+        return self.ready_at - self.started
+
+    def report(self) -> Dict[str, Any]:
+        """Time to ready plus the slowest imports and every service build, split by before/after ready."""
+        with self._lock:
+            imports = sorted(self.imports, key=lambda entry: -entry["seconds"])
+            services = list(self.services)
+        startup_imports = [entry for entry in imports if not entry["deferred"]]
+        return {
+            "ready_seconds": round(self.ready_at - self.started, 4) if self.ready_at else None,
+            "import_hook": self._hook is not None,
+            "startup_import_seconds": round(sum(entry["seconds"] for entry in startup_imports), 4),
+            "deferred_import_seconds": round(
+                sum(entry["seconds"] for entry in imports if entry["deferred"]), 4
+            ),
+            "imports": imports[:REPORT_LIMIT],
+            "services": services,
+        }
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    Meta path finder that times the execution of top-level modules. It finds
+    nothing itself: it asks the other finders and puts a timing proxy in
+    front of the loader of the spec they return.
+    """
+
+    def __init__(self, profiler: StartupProfiler):
+        self.profiler = profiler
+        self._local = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        if "." in fullname or getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            spec = None
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+        finally:
+            self._local.finding = False
+        if spec is not None and spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, fullname, self.profiler)
+        return spec
+
+class _TimedLoader(importlib.abc.Loader):
+    """Loader proxy timing `exec_module`; the module is handed back its real loader first."""
+
+    def __init__(self, loader, name: str, profiler: StartupProfiler):
+        self.loader = loader
+        self.name = name
+        self.profiler = profiler
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        module.__loader__ = self.loader
+        if getattr(module, "__spec__", None) is not None:
+            module.__spec__.loader = self.loader
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profiler._record(self.profiler.imports, self.name, start)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+profiler = StartupProfiler()
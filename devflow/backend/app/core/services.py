@@ -0,0 +1,127 @@
+"""
+Service Container
+
+Every service of the API is built on first use by one of these getters and
+shared afterwards. Heavy dependencies (torch and transformers, chromadb,
+tree-sitter grammars, openai, redis) are imported inside the getters, so
+importing the app and answering /health needs none of them. Construction
+times are recorded by the startup profiler.
+"""
+
+import os
+from functools import lru_cache
+from app.core.profiling import profiler
+from app.core.utils import get_workspace_root
+
+@lru_cache()
+def get_code_parser():
+    with profiler.service("code_parser"):
+        from app.services.code_parser import CodeParser
+        return CodeParser()
+
+@lru_cache()
+def get_embedder():
+    """The shared embedder (see model_registry); its weights load on first use or warm-up."""
+    with profiler.service("code_embedder"):
+        from app.services.model_registry import get_embedder as registry_embedder
+        return registry_embedder()
+
+@lru_cache()
+def get_chroma_client():
+    with profiler.service("chroma_client"):
+        from chromadb import PersistentClient
+        persist_directory = os.path.join(get_workspace_root(), ".devflow", "chroma_db")
+        os.makedirs(persist_directory, exist_ok=True)
+        return PersistentClient(path=persist_directory)
+
+@lru_cache()
+def get_vector_store():
+    client = get_chroma_client()
+    with profiler.service("vector_store"):
+        from app.db.vector_store import VectorStore
+        return VectorStore(client)
+
+@lru_cache()
+def get_parse_pool():
+    tokenizer = get_embedder().tokenizer
+    with profiler.service("parse_pool"):
+        from app.services.parse_pool import ParsePool
+        return ParsePool(tokenizer=tokenizer)
+
+@lru_cache()
+def get_embedding_pool():
+    embedder = get_embedder()
+    with profiler.service("embedding_pool"):
+        from app.services.embedding_pool import EmbeddingPool
+        return EmbeddingPool(embedder=embedder)
+
+@lru_cache()
+def get_code_indexer():
+    vector_store, parse_pool, embedding_pool = get_vector_store(), get_parse_pool(), get_embedding_pool()
+    with profiler.service("code_indexer"):
+        from app.services.code_indexer import CodeIndexer
+        return CodeIndexer(vector_store, parse_pool, embedding_pool)
+
+@lru_cache()
+def get_rag_engine():
+    vector_store = get_vector_store()
+    with profiler.service("rag_engine"):
+        from app.services.rag_engine import RAGEngine
+        return RAGEngine(vector_store)
+
+@lru_cache()
+def get_query_batcher():
+    """Batches concurrent search queries into shared forward passes."""
+    embedder = get_embedder()
+    with profiler.service("query_batcher"):
+        from app.services.query_batcher import QueryBatcher
+        return QueryBatcher(embedder.embed_queries, name="query")
+
+@lru_cache()
+def get_snippet_batcher():
+    """Batches concurrent similar-code snippets into shared forward passes."""
+    embedder = get_embedder()
+    with profiler.service("snippet_batcher"):
+        from app.services.query_batcher import QueryBatcher
+        return QueryBatcher(embedder.embed_code_batch, name="snippet")
+
+@lru_cache()
+def get_index_jobs():
+    with profiler.service("index_jobs"):
+        from app.services.index_jobs import IndexJobManager
+        return IndexJobManager()
+
+@lru_cache()
+def get_cache():
+    with profiler.service("cache"):
+        from app.services.cache import CacheService
+        return CacheService()
+
+SERVICES = {
+    "code_parser": get_code_parser,
+    "code_embedder": get_embedder,
+    "chroma_client": get_chroma_client,
+    "vector_store": get_vector_store,
+    "parse_pool": get_parse_pool,
+    "embedding_pool": get_embedding_pool,
+    "code_indexer": get_code_indexer,
+    "rag_engine": get_rag_engine,
+    "query_batcher": get_query_batcher,
+    "snippet_batcher": get_snippet_batcher,
+    "index_jobs": get_index_jobs,
+    "cache": get_cache,
+}
+
+def _built(getter) -> bool:
+    return getter.cache_info().currsize > 0
+
+def status():
+    """Whether each service has been built yet."""
+    return {name: "initialized" if _built(getter) else "not_initialized" for name, getter in SERVICES.items()}
+
+def shutdown():
+    """Stop the worker threads and processes of the services that were built."""
+    for name in ("index_jobs", "parse_pool", "embedding_pool", "query_batcher", "snippet_batcher"):
+        getter = SERVICES[name]
+        if _built(getter):
+            getter().shutdown()
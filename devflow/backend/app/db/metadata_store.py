@@ -5,9 +5,9 @@ This service handles storing and retrieving metadata about indexed files,
 code chunks, and user feedback using SQLite.
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, DateTime, func, inspect, text
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Set, Tuple
 from datetime import datetime
 import json
 import os
@@ -27,6 +27,12 @@ class File(Base):
     id = Column(Integer, primary_key=True, index=True)
     path = Column(String, unique=True, index=True)
     indexed_at = Column(DateTime, default=datetime.utcnow)
+    # Change-detection state used by incremental re-indexing
+    size = Column(Integer, nullable=True)
+    mtime_ns = Column(Integer, nullable=True)
+    content_hash = Column(String, nullable=True)
+    # Git blob object ID of the indexed content (None outside git repositories)
+    blob_sha = Column(String, nullable=True)
     chunks = relationship("Chunk", back_populates="file", cascade="all, delete-orphan")
 
 class Chunk(Base):
@@ -37,7 +43,15 @@ class Chunk(Base):
     name = Column(String)
     start_line = Column(Integer)
     end_line = Column(Integer)
-    embedding_id = Column(String)
+    # Content address of the chunk's vector; identical chunks share one vector
+    embedding_id = Column(String, index=True)
+    # Chunks extracted from a git blob outlive the file version they came from:
+    # when the file moves to other content they are archived (file_id = NULL)
+    # and re-attached if the blob comes back, e.g. after switching branches
+    blob_sha = Column(String, nullable=True, index=True)
+    archived_at = Column(DateTime, nullable=True)
+    # Methods point at the skeleton chunk of their class
+    parent_id = Column(String, nullable=True, index=True)
     file = relationship("File", back_populates="chunks")
     feedback = relationship("Feedback", back_populates="chunk", cascade="all, delete-orphan")
 
@@ -50,9 +64,33 @@ class Feedback(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     chunk = relationship("Chunk", back_populates="feedback")
 
+class IndexState(Base):
+    """Small key/value records the indexer keeps between runs (e.g. the last indexed git commit)."""
+    __tablename__ = "index_state"
+    key = Column(String, primary_key=True)
+    value = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+def _ensure_columns(table: str, columns: Dict[str, str]):
+    """Add columns missing from a table created by an older version (create_all never alters)."""
+    existing = {col["name"] for col in inspect(engine).get_columns(table)}
+    with engine.begin() as conn:
+        for name, ddl_type in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+
+def _ensure_index(table: str, column: str):
+    """Create an index that a table created by an older version lacks."""
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"))
+
+_ensure_columns("files", {"size": "INTEGER", "mtime_ns": "INTEGER", "content_hash": "VARCHAR", "blob_sha": "VARCHAR"})
+_ensure_columns("chunks", {"blob_sha": "VARCHAR", "archived_at": "DATETIME", "parent_id": "VARCHAR"})
+_ensure_index("chunks", "embedding_id")
+
 # --- CRUD utility functions ---
 def get_session():
     return SessionLocal()
@@ -88,6 +126,25 @@ def add_chunk(file_id: int, chunk_id: str, type_: str, name: str, start: int, en
         db.refresh(chunk)
         return chunk
 
+def add_chunks(chunks: List[Dict]):
+    """Insert many chunk records in one transaction (keys mirror `add_chunk`'s arguments)."""
+    with get_session() as db:
+        db.add_all([
+            Chunk(
+                id=c["chunk_id"],
+                file_id=c["file_id"],
+                type=c["type"],
+                name=c["name"],
+                start_line=c["start"],
+                end_line=c["end"],
+                embedding_id=c["embedding_id"],
+                blob_sha=c.get("blob_sha"),
+                parent_id=c.get("parent_id")
+            )
+            for c in chunks
+        ])
+        db.commit()
+
 def add_feedback(chunk_id: str, feedback_type: str, comment: str = None):
     with get_session() as db:
         feedback = Feedback(chunk_id=chunk_id, feedback_type=feedback_type, comment=comment)
@@ -108,6 +165,169 @@ def delete_chunks_for_file(file_id: int):
         db.query(Chunk).filter(Chunk.file_id == file_id).delete()
         db.commit()
 
+def delete_all_chunks():
+    with get_session() as db:
+        db.query(Chunk).delete()
+        db.commit()
+
+def get_file_states() -> Dict[str, Dict]:
+    """Return the stored change-detection state of every indexed file, keyed by path."""
+    with get_session() as db:
+        rows = db.query(File.id, File.path, File.size, File.mtime_ns, File.content_hash, File.blob_sha).all()
+        return {
+            row.path: {
+                "id": row.id,
+                "size": row.size,
+                "mtime_ns": row.mtime_ns,
+                "content_hash": row.content_hash,
+                "blob_sha": row.blob_sha
+            }
+            for row in rows
+        }
+
+def update_file_state(path: str, size: int, mtime_ns: int, content_hash: Optional[str], blob_sha: Optional[str] = None):
+    """Record the size, mtime, content hash and git blob a file had when it was last indexed."""
+    with get_session() as db:
+        file = db.query(File).filter(File.path == path).first()
+        if not file:
+            file = File(path=path)
+            db.add(file)
+        file.size = size
+        file.mtime_ns = mtime_ns
+        file.content_hash = content_hash
+        file.blob_sha = blob_sha
+        file.indexed_at = datetime.utcnow()
+        db.commit()
+        db.refresh(file)
+        return file
+
+def retire_chunks(file_id: int) -> Set[str]:
+    """
+    Detach the chunks of a file's previous version.
+
+    Chunks keyed by a git blob are archived for reuse, unless the blob
+    already has archived chunks (another file with the same content); the
+    others are deleted.
+
+    Returns:
+        Embedding IDs of the retired chunks, whose vectors may now be unreferenced
+    """
+    with get_session() as db:
+        rows = db.query(Chunk.id, Chunk.blob_sha, Chunk.embedding_id).filter(Chunk.file_id == file_id).all()
+        blobs = {row.blob_sha for row in rows if row.blob_sha}
+        archived_blobs = {
+            row.blob_sha for row in
+            db.query(Chunk.blob_sha).filter(Chunk.file_id.is_(None), Chunk.blob_sha.in_(blobs)).distinct()
+        } if blobs else set()
+        archived = [row.id for row in rows if row.blob_sha and row.blob_sha not in archived_blobs]
+        deleted = [row.id for row in rows if not row.blob_sha or row.blob_sha in archived_blobs]
+        if archived:
+            db.query(Chunk).filter(Chunk.id.in_(archived)).update(
+                {Chunk.file_id: None, Chunk.archived_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+        # Feedback rows go first, as in prune_archived_chunks; sliced for SQLite's bound-parameter limit
+        for start in range(0, len(deleted), 500):
+            batch = deleted[start:start + 500]
+            db.query(Feedback).filter(Feedback.chunk_id.in_(batch)).delete(synchronize_session=False)
+            db.query(Chunk).filter(Chunk.id.in_(batch)).delete(synchronize_session=False)
+        db.commit()
+        return {row.embedding_id for row in rows}
+
+def get_archived_blobs() -> Set[str]:
+    """Blob SHAs whose chunks are archived and can be re-attached without re-embedding."""
+    with get_session() as db:
+        rows = db.query(Chunk.blob_sha).filter(Chunk.file_id.is_(None), Chunk.blob_sha.isnot(None)).distinct()
+        return {row.blob_sha for row in rows}
+
+def restore_blob_chunks(blob_sha: str, file_id: int) -> Set[str]:
+    """Re-attach the archived chunks of a blob to a file; returns their embedding IDs."""
+    with get_session() as db:
+        rows = db.query(Chunk.id, Chunk.embedding_id).filter(Chunk.file_id.is_(None), Chunk.blob_sha == blob_sha).all()
+        if rows:
+            db.query(Chunk).filter(Chunk.id.in_([row.id for row in rows])).update(
+                {Chunk.file_id: file_id, Chunk.archived_at: None},
+                synchronize_session=False
+            )
+            db.commit()
+        return {row.embedding_id for row in rows}
+
+def prune_archived_chunks(keep: int) -> Set[str]:
+    """Delete the least recently archived chunks beyond `keep`; returns their embedding IDs."""
+    with get_session() as db:
+        rows = (
+            db.query(Chunk.id, Chunk.embedding_id)
+            .filter(Chunk.file_id.is_(None), Chunk.blob_sha.isnot(None))
+            .order_by(Chunk.archived_at.desc())
+            .offset(keep)
+            .all()
+        )
+        ids = [row.id for row in rows]
+        # Delete in slices to stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            db.query(Feedback).filter(Feedback.chunk_id.in_(batch)).delete(synchronize_session=False)
+            db.query(Chunk).filter(Chunk.id.in_(batch)).delete(synchronize_session=False)
+        db.commit()
+        return {row.embedding_id for row in rows}
+
+def embedding_refs(embedding_ids: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+    """
+    Reference counts of vectors: how many active and how many archived chunks
+    point at each embedding ID. IDs no chunk points at are left out.
+    """
+    embedding_ids = list(embedding_ids)
+    refs: Dict[str, Tuple[int, int]] = {}
+    with get_session() as db:
+        for start in range(0, len(embedding_ids), 500):
+            rows = (
+                db.query(Chunk.embedding_id, Chunk.file_id.isnot(None), func.count())
+                .filter(Chunk.embedding_id.in_(embedding_ids[start:start + 500]))
+                .group_by(Chunk.embedding_id, Chunk.file_id.isnot(None))
+            )
+            for embedding_id, active, count in rows:
+                current = refs.get(embedding_id, (0, 0))
+                refs[embedding_id] = (current[0] + count, current[1]) if active else (current[0], current[1] + count)
+    return refs
+
+def get_chunk_locations(embedding_ids: Iterable[str]) -> Dict[str, List[Dict]]:
+    """Every indexed (non-archived) chunk that shares each embedding ID, by embedding ID."""
+    embedding_ids = list(embedding_ids)
+    locations: Dict[str, List[Dict]] = {}
+    with get_session() as db:
+        for start in range(0, len(embedding_ids), 500):
+            rows = (
+                db.query(Chunk.embedding_id, Chunk.id, Chunk.name, Chunk.start_line, Chunk.end_line, Chunk.parent_id, File.path)
+                .join(File, Chunk.file_id == File.id)
+                .filter(Chunk.embedding_id.in_(embedding_ids[start:start + 500]))
+                .order_by(File.path, Chunk.start_line)
+            )
+            for row in rows:
+                locations.setdefault(row.embedding_id, []).append({
+                    "chunk_id": row.id,
+                    "file_path": row.path,
+                    "name": row.name,
+                    "start_line": row.start_line,
+                    "end_line": row.end_line,
+                    "parent_id": row.parent_id
+                })
+    return locations
+
+def get_index_state(key: str) -> Optional[str]:
+    with get_session() as db:
+        state = db.get(IndexState, key)
+        return state.value if state else None
+
+def set_index_state(key: str, value: str):
+    with get_session() as db:
+        state = db.get(IndexState, key)
+        if not state:
+            state = IndexState(key=key)
+            db.add(state)
+        state.value = value
+        state.updated_at = datetime.utcnow()
+        db.commit()
+
 # More query/delete/update functions can be added as needed.
 
 class MetadataStore:
@@ -416,6 +636,29 @@ def list_files():
 def list_chunks(file_id: int):
     with get_session() as db:
         chunks = db.query(Chunk).filter(Chunk.file_id == file_id).all()
+        return [
+            {
+                "id": c.id,
+                "file_id": c.file_id,
+                "type": c.type,
+                "name": c.name,
+                "start_line": c.start_line,
+                "end_line": c.end_line,
+                "embedding_id": c.embedding_id,
+                "parent_id": c.parent_id
+            }
+            for c in chunks
+        ]
+
+def list_child_chunks(parent_id: str):
+    """Chunks linked to a class skeleton chunk: its methods and nested classes."""
+    with get_session() as db:
+        chunks = (
+            db.query(Chunk)
+            .filter(Chunk.parent_id == parent_id, Chunk.file_id.isnot(None))
+            .order_by(Chunk.start_line)
+            .all()
+        )
         return [
             {
                 "id": c.id,
@@ -448,4 +691,5 @@ def clear():
         db.query(Feedback).delete()
         db.query(Chunk).delete()
         db.query(File).delete()
+        db.query(IndexState).delete()
         db.commit() 
\ No newline at end of file
@@ -2,21 +2,28 @@
 Vector Store Service
 
 This service handles storing and retrieving code embeddings using ChromaDB.
+
+Vectors are content-addressed: identical chunks share one vector, and the
+metadata store records every location a vector stands for. The chunk text is
+stored once, as the document.
 """
 
-from typing import List, Dict, Any, Tuple
+from typing import Callable, List, Dict, Any, Set, Tuple, Optional, Union
 import chromadb
 import os
+import random
 import uuid
 from chromadb import Client, Collection
-from app.services.embedder import code_embedder
+from app.services.model_registry import get_embedder
 import numpy as np
-from app.db.metadata_store import get_last_indexed
+from app.db.metadata_store import get_chunk_locations, get_last_indexed
 
 class VectorStore:
     """Vector store for code embeddings using ChromaDB."""
 
     COLLECTION_NAME = "code_embeddings"
+    # Vectors of git blobs no longer checked out, kept out of search until they are re-attached
+    ARCHIVE_COLLECTION_NAME = "code_embeddings_archive"
 
     def __init__(self, client: Client):
         """Initialize the vector store."""
@@ -24,27 +31,42 @@ class VectorStore:
         persist_directory = os.path.join(os.path.dirname(__file__), "chroma_db")
         os.makedirs(persist_directory, exist_ok=True)
         self.client = client
+        self._recover_rebuild()
         self.collection = self.client.get_or_create_collection(
             name=self.COLLECTION_NAME,
             metadata={"hnsw:space": "cosine"}
         )
+        self.archive = self.client.get_or_create_collection(
+            name=self.ARCHIVE_COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine"}
+        )
 
-    def add_vectors(self, texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+    def add_vectors(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        embeddings: Optional[List[np.ndarray]] = None
+    ) -> List[str]:
         """Add vectors to the store.
         
         Args:
             texts: List of code texts
             metadatas: List of metadata dictionaries
+            ids: Optional vector IDs (e.g. the metadata store chunk IDs)
+            embeddings: Optional precomputed embeddings; computed from the texts when omitted
+            
+        Returns:
+            The IDs the vectors were stored under
         """
         try:
-            # Generate embeddings with metadata
-            embeddings = []
-            for text, metadata in zip(texts, metadatas):
-                embedding = code_embedder.embed_code(text, metadata)
-                embeddings.append(embedding)
+            # Generate embeddings with metadata in length-bucketed batches
+            if embeddings is None:
+                embeddings = list(get_embedder().embed_code_batch(texts, metadatas))
             
-            # Generate unique IDs
-            ids = [str(uuid.uuid4()) for _ in range(len(texts))]
+            # Generate unique IDs unless the caller supplied them
+            if ids is None:
+                ids = [str(uuid.uuid4()) for _ in range(len(texts))]
             
             # Add to collection
             self.collection.add(
@@ -53,65 +75,334 @@ class VectorStore:
                 metadatas=metadatas,
                 ids=ids
             )
+            return ids
         except Exception as e:
             print(f"Error adding vectors: {str(e)}")
             raise
 
-    def search(self, query: str, k: int = 5) -> Tuple[List[Dict[str, Any]], List[float]]:
+    def delete_file(self, file_path: str) -> None:
+        """Remove every vector that was indexed from the given file."""
+        try:
+            self.collection.delete(where={"file_path": file_path})
+        except Exception as e:
+            print(f"Error deleting vectors for {file_path}: {str(e)}")
+            raise
+
+    def _move(self, source: Collection, target: Collection, ids: List[str]) -> int:
+        """Move vectors between collections without re-embedding them; returns how many moved."""
+        if not ids:
+            return 0
+        records = source.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+        if not records["ids"]:
+            return 0
+        target.upsert(
+            ids=records["ids"],
+            embeddings=records["embeddings"],
+            documents=records["documents"],
+            metadatas=records["metadatas"]
+        )
+        source.delete(ids=records["ids"])
+        return len(records["ids"])
+
+    def archive_vectors(self, ids: List[str]) -> int:
+        """Take vectors out of search while keeping them for a later `restore_vectors`."""
+        try:
+            return self._move(self.collection, self.archive, ids)
+        except Exception as e:
+            print(f"Error archiving vectors: {str(e)}")
+            raise
+
+    def restore_vectors(self, ids: List[str]) -> int:
+        """Bring archived vectors back into search; IDs not archived are skipped."""
+        try:
+            return self._move(self.archive, self.collection, ids)
+        except Exception as e:
+            print(f"Error restoring vectors: {str(e)}")
+            raise
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        """The given IDs that are stored, whether searchable or archived."""
+        if not ids:
+            return set()
+        existing = set()
+        for collection in (self.collection, self.archive):
+            existing.update(collection.get(ids=ids, include=[])["ids"])
+        return existing
+
+    def file_vector_ids(self, file_path: str) -> List[str]:
+        """IDs of the searchable vectors attributed to a file in their metadata."""
+        return self.collection.get(where={"file_path": file_path}, include=[])["ids"]
+
+    def delete_vectors(self, ids: List[str]) -> None:
+        """Remove vectors by ID, whether they are searchable or archived."""
+        if not ids:
+            return
+        try:
+            self.collection.delete(ids=ids)
+            self.archive.delete(ids=ids)
+        except Exception as e:
+            print(f"Error deleting vectors: {str(e)}")
+            raise
+
+    def search(
+        self, query: str, k: int = 5, query_embedding: Optional[np.ndarray] = None
+    ) -> Tuple[List[Dict[str, Any]], List[float]]:
         """Search for similar vectors.
         
         Args:
             query: Query string
             k: Number of results to return
+            query_embedding: Embedding of the query if already computed
+                             (e.g. by the query batcher); embedded here otherwise
             
         Returns:
             Tuple of (results, scores)
         """
+        if query_embedding is not None:
+            return self.search_by_vector(query_embedding, k=k)
+        return self.search_batch([query], k=k)[0]
+
+    def search_by_vector(
+        self, embedding: np.ndarray, k: int = 5, where: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], List[float]]:
+        """Search with an embedding the caller already has; the model is not used.
+
+        Args:
+            embedding: Query embedding, in the space of the stored vectors
+                       (as returned by CodeEmbedder, i.e. after any dimension reduction)
+            k: Number of results to return
+            where: Optional Chroma metadata filter, e.g. {"language": "python"}
+
+        Returns:
+            Tuple of (results, scores)
+        """
+        return self.search_batch([embedding], k=k, where=where)[0]
+
+    def search_batch(
+        self,
+        queries: List[Union[str, np.ndarray]],
+        k: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[List[Dict[str, Any]], List[float]]]:
+        """Search for several queries with one collection query.
+
+        Args:
+            queries: Query strings and/or query embeddings; the strings are
+                     embedded together in one batch, embeddings are used as given
+            k: Number of results per query
+            where: Optional Chroma metadata filter applied to every query
+
+        Returns:
+            (results, scores) of each query, in input order
+        """
+        if not queries:
+            return []
         try:
-            # Generate query embedding with enhanced context
-            query_embedding = code_embedder.embed_query(query)
+            texts = [(i, query) for i, query in enumerate(queries) if isinstance(query, str)]
+            query_embeddings = list(queries)
+            if texts:
+                # Generate query embeddings with enhanced context
+                embedded = get_embedder().embed_queries([text for _, text in texts])
+                for (i, _), embedding in zip(texts, embedded):
+                    query_embeddings[i] = embedding
             
             # Search collection
             results = self.collection.query(
-                query_embeddings=[query_embedding],
+                query_embeddings=[np.asarray(embedding, dtype=np.float32) for embedding in query_embeddings],
                 n_results=k,
+                where=where,
                 include=["metadatas", "documents", "distances"]
             )
             
-            # Extract results and scores
-            metadatas = results["metadatas"][0]
-            documents = results["documents"][0]
-            distances = results["distances"][0]
-            
-            # Convert distances to similarity scores (1 - normalized distance)
-            max_distance = max(distances) if distances else 1.0
-            scores = [1 - (d / max_distance) for d in distances]
-            
-            # Combine results
-            search_results = []
-            for metadata, doc, score in zip(metadatas, documents, scores):
-                result = metadata.copy()
-                result["text"] = doc
-                search_results.append(result)
-            
-            return search_results, scores
+            # A vector stands for every chunk with the same content
+            locations = get_chunk_locations(list({vector_id for ids in results["ids"] for vector_id in ids}))
+            return [
+                self._format_results(ids, metadatas, documents, distances, locations)
+                for ids, metadatas, documents, distances in zip(
+                    results["ids"], results["metadatas"], results["documents"], results["distances"]
+                )
+            ]
             
         except Exception as e:
             print(f"Error searching vectors: {str(e)}")
             raise
 
-    def clear(self) -> None:
-        """Clear all vectors from the store."""
+    def _format_results(
+        self,
+        ids: List[str],
+        metadatas: List[Dict[str, Any]],
+        documents: List[str],
+        distances: List[float],
+        locations: Dict[str, List[Dict[str, Any]]]
+    ) -> Tuple[List[Dict[str, Any]], List[float]]:
+        """Results and similarity scores of one query."""
+        # Convert distances to similarity scores (1 - normalized distance)
+        max_distance = max(distances) if distances else 1.0
+        scores = [1 - (d / max_distance) for d in distances]
+        
+        # Combine results
+        search_results = []
+        for vector_id, metadata, doc in zip(ids, metadatas, documents):
+            result = metadata.copy()
+            result["text"] = doc
+            # Vectors stored before the text was kept only as the document also carry it in metadata
+            result.setdefault("code", doc)
+            result["locations"] = locations.get(vector_id, [])
+            if result["locations"] and result.get("file_path") not in {loc["file_path"] for loc in result["locations"]}:
+                # The file the vector was first stored for no longer holds this content
+                result["file_path"] = result["locations"][0]["file_path"]
+            search_results.append(result)
+        
+        return search_results, scores
+
+    def sample(self, n: int) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        """IDs, documents and metadata of up to `n` random searchable vectors."""
+        ids = self.collection.get(include=[])["ids"]
+        if len(ids) > n:
+            ids = random.sample(ids, n)
+        if not ids:
+            return [], [], []
+        records = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return records["ids"], records["documents"], records["metadatas"]
+
+    def rebuild(
+        self,
+        embed: Callable[[List[str], List[Dict[str, Any]]], np.ndarray],
+        page_size: int = 1000,
+        on_swap: Optional[Callable[[], None]] = None
+    ) -> int:
+        """
+        Re-embed every stored vector (searchable and archived), e.g. into a new
+        dimensionality, which Chroma cannot change within a collection.
+
+        Each collection is copied page by page into a staging one; the old ones
+        stay searchable until every copy is complete. The copies then take the
+        collections' names while the old ones are renamed aside, and the old
+        ones are only dropped once both copies are in place. On any failure the
+        old collections keep (or get back) their names and the copies are dropped.
+
+        Args:
+            embed: Maps documents and metadata to their new embeddings
+            page_size: Vectors read and written per round trip
+            on_swap: Called once the copies have the collections' names, right
+                     before searches switch to them (e.g. to switch queries to
+                     the new embedding space); if it raises, the rebuild is
+                     rolled back like any other failure
+
+        Returns:
+            Number of vectors rebuilt
+        """
+        targets = (("collection", self.COLLECTION_NAME), ("archive", self.ARCHIVE_COLLECTION_NAME))
+        staged = []
+        total = 0
         try:
-            self.client.delete_collection(self.COLLECTION_NAME)
-        except Exception as e:
-            # Ignore error if collection does not exist
-            if "does not exists" not in str(e):
-                raise
+            for attribute, name in targets:
+                staging, count = self._copy_rebuilt(getattr(self, attribute), f"{name}_rebuild", embed, page_size)
+                staged.append((attribute, name, staging))
+                total += count
+        except Exception:
+            for _, name in targets:
+                self._drop_collection(f"{name}_rebuild")
+            raise
+        # [name, old collection, rebuilt collection, whether the rebuilt one has the name]
+        swapped = []
+        try:
+            for attribute, name, staging in staged:
+                live = getattr(self, attribute)
+                self._drop_collection(f"{name}_previous")
+                live.modify(name=f"{name}_previous")
+                swapped.append([name, live, staging, False])
+                staging.modify(name=name)
+                swapped[-1][3] = True
+            if on_swap is not None:
+                on_swap()
+        except Exception:
+            for name, live, staging, in_place in reversed(swapped):
+                if in_place:
+                    staging.modify(name=f"{name}_rebuild")
+                live.modify(name=name)
+            for _, name in targets:
+                self._drop_collection(f"{name}_rebuild")
+            raise
+        for attribute, name, staging in staged:
+            setattr(self, attribute, staging)
+            self._drop_collection(f"{name}_previous")
+        return total
+
+    def _copy_rebuilt(
+        self,
+        source: Collection,
+        staging_name: str,
+        embed: Callable[[List[str], List[Dict[str, Any]]], np.ndarray],
+        page_size: int
+    ) -> Tuple[Collection, int]:
+        """Copy a collection into a fresh staging one with new embeddings; returns it and the vector count."""
+        # Leftover of an interrupted rebuild
+        self._drop_collection(staging_name)
+        staging = self.client.get_or_create_collection(name=staging_name, metadata={"hnsw:space": "cosine"})
+        offset = 0
+        while True:
+            page = source.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            # The text is kept once, as the document
+            metadatas = [{k: v for k, v in metadata.items() if k != "code"} for metadata in page["metadatas"]]
+            staging.add(
+                ids=page["ids"],
+                embeddings=list(embed(page["documents"], metadatas)),
+                documents=page["documents"],
+                metadatas=metadatas
+            )
+            offset += len(page["ids"])
+        return staging, offset
+
+    def _has_collection(self, name: str) -> bool:
+        try:
+            self.client.get_collection(name)
+            return True
+        except Exception:
+            return False
+
+    def _drop_collection(self, name: str) -> None:
+        if self._has_collection(name):
+            self.client.delete_collection(name)
+
+    def _recover_rebuild(self) -> None:
+        """Finish or undo a `rebuild` interrupted while the collections were being renamed."""
+        names = (self.COLLECTION_NAME, self.ARCHIVE_COLLECTION_NAME)
+        for name in names:
+            self._drop_collection(f"{name}_rebuild")
+        left_aside = [name for name in names if self._has_collection(f"{name}_previous")]
+        if not left_aside:
+            return
+        if all(self._has_collection(name) for name in names):
+            # Every rebuilt collection took its name; only the old ones were left behind
+            for name in left_aside:
+                self.client.delete_collection(f"{name}_previous")
+            return
+        # Renaming stopped halfway: put every old collection back
+        print(f"Restoring {', '.join(left_aside)} after an interrupted rebuild")
+        for name in left_aside:
+            self._drop_collection(name)
+            self.client.get_collection(f"{name}_previous").modify(name=name)
+
+    def clear(self) -> None:
+        """Clear all vectors from the store, archived ones included."""
+        for name in (self.COLLECTION_NAME, self.ARCHIVE_COLLECTION_NAME):
+            try:
+                self.client.delete_collection(name)
+            except Exception as e:
+                # Ignore error if collection does not exist
+                if "does not exists" not in str(e):
+                    raise
         self.collection = self.client.get_or_create_collection(
             name=self.COLLECTION_NAME,
             metadata={"hnsw:space": "cosine"}
         )
+        self.archive = self.client.get_or_create_collection(
+            name=self.ARCHIVE_COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine"}
+        )
 
     def get_stats(self, debug: bool = False) -> Dict[str, Any]:
         """Get statistics about the store, with optional debug info."""
@@ -2,17 +2,20 @@
 FastAPI application for DevFlow backend.
 """
 
+from .core.config import get_settings
+from .core.profiling import profiler
+if get_settings().STARTUP_PROFILE:
+    # Installed before the imports below so they are timed too
+    profiler.install_import_hook()
+
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Body
 from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, ConfigDict
 from typing import List, Dict, Optional, Any
-from .services.code_parser import CodeParser
-from .services.embedder import CodeEmbedder
-from .db.vector_store import VectorStore
-from .services.cache import CacheService
+from .core import services
+from .services.model_registry import model_registry
 from .services.rate_limiter import rate_limiter
-from .core.config import get_settings
 import os
 from pathlib import Path
 import json
@@ -20,12 +23,8 @@ from datetime import datetime
 import logging
 import traceback
 import numpy as np
-from chromadb import PersistentClient
-from app.services.code_indexer import CodeIndexer
-from app.services.rag_engine import RAGEngine
-from app.db import metadata_store
 import uuid
-from app.api.v1.endpoints import router as v1_router
+from app.api.v1.endpoints import router as v1_router, start_watcher, stop_watcher
 from app.core.utils import get_workspace_root
 from contextlib import asynccontextmanager
 
@@ -44,9 +43,12 @@ async def lifespan(app: FastAPI):
         logger.warning(f"💾 Persist directory: {persist_directory}")
         os.makedirs(persist_directory, exist_ok=True)
         logger.warning(f"✅ Successfully created/verified persist directory")
-        client = PersistentClient(path=persist_directory)
-        logger.warning(f"✅ ChromaDB client initialized successfully")
-        logger.warning("🎉 All startup checks passed!")
+        # ChromaDB, the parser and the model are set up on first use (see app.core.services)
+        if get_settings().EMBEDDING_WARMUP:
+            model_registry.warm_up()
+        if get_settings().WATCH_ENABLED:
+            start_watcher()
+        logger.warning(f"🎉 All startup checks passed! Ready in {profiler.mark_ready():.2f}s")
     except Exception as e:
         logger.error(f"❌ Startup error: {str(e)}")
         logger.error(f"❌ Traceback: {traceback.format_exc()}")
@@ -55,6 +57,8 @@ async def lifespan(app: FastAPI):
 
     # Shutdown logic
     logger.warning("🛑 FastAPI shutdown event triggered")
+    stop_watcher()
+    services.shutdown()
 
 app = FastAPI(
     title="DevFlow API",
@@ -72,52 +76,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services with error handling
-try:
-    logger.info("🔧 Initializing services...")
-    
-    code_parser = CodeParser()
-    logger.info("✅ CodeParser initialized")
-    
-    code_embedder = CodeEmbedder()
-    logger.info("✅ CodeEmbedder initialized")
-
-    # Use workspace-specific DB directory
-    workspace_root = get_workspace_root()
-    logger.info(f"📁 Using workspace root: {workspace_root}")
-    
-    persist_directory = os.path.join(workspace_root, ".devflow", "chroma_db")
-    logger.info(f"💾 Using persist directory: {persist_directory}")
-    
-    os.makedirs(persist_directory, exist_ok=True)
-    logger.info("✅ Persist directory created/verified")
-    
-    client = PersistentClient(path=persist_directory)
-    logger.info("✅ ChromaDB client initialized")
-    
-    vector_store = VectorStore(client)
-    logger.info("✅ VectorStore initialized")
-
-    # Initialize code indexer
-    code_indexer = CodeIndexer(vector_store)
-    logger.info("✅ CodeIndexer initialized")
-
-    # Initialize RAG engine
-    rag_engine = RAGEngine(vector_store)
-    logger.info("✅ RAGEngine initialized")
-
-    cache = CacheService()
-    logger.info("✅ CacheService initialized")
-    
-    settings = get_settings()
-    logger.info("✅ Settings loaded")
-    
-    logger.info("🎉 All services initialized successfully!")
-    
-except Exception as e:
-    logger.error(f"❌ Service initialization error: {str(e)}")
-    logger.error(f"❌ Traceback: {traceback.format_exc()}")
-    # Don't raise here during module import - let the app start and handle errors gracefully
+settings = get_settings()
 
 # Language mapping for file extensions
 LANGUAGE_MAP = {
@@ -179,13 +138,10 @@ async def health_check():
             "timestamp": datetime.now().isoformat(),
             "workspace_root": get_workspace_root(),
             "services": {
-                "code_parser": "initialized" if 'code_parser' in globals() else "not_initialized",
-                "code_embedder": "initialized" if 'code_embedder' in globals() else "not_initialized",
-                "vector_store": "initialized" if 'vector_store' in globals() else "not_initialized",
-                "code_indexer": "initialized" if 'code_indexer' in globals() else "not_initialized",
-                "rag_engine": "initialized" if 'rag_engine' in globals() else "not_initialized",
-                "cache": "initialized" if 'cache' in globals() else "not_initialized",
-            }
+                # Services are built on first use; not_initialized is not an error
+                **services.status(),
+            },
+            "models": model_registry.memory_report()
         }
         logger.warning(f"🏥 Health check passed: {status['status']}")
         return status
@@ -0,0 +1,384 @@
+"""
+Code Chunker Service
+
+This service turns a parsed file into the chunks the indexer embeds, sized in
+tokens of the embedding model's own tokenizer instead of characters, so no
+chunk is cut off by the model's input limit.
+
+Functions, methods and classes that fit CHUNK_MAX_TOKENS become one chunk
+each. Larger ones are split along their syntax tree: consecutive child nodes
+are packed into windows under the budget, children that are too large
+themselves are split the same way, and only a node without children falls
+back to line boundaries. Consecutive parts of a split element can share
+CHUNK_OVERLAP_TOKENS of context. Module-level code between the elements
+(imports, constants, top-level statements) is packed into module chunks the
+same way.
+
+A class is embedded as a skeleton: its signatures, docstrings and fields,
+with the bodies of its methods spliced out since those are chunks of their
+own. The skeleton chunk lists the IDs of its method chunks and each method
+points back at it, so no method body is tokenized and stored twice.
+
+Tokens are counted on whitespace-normalized text, the form the embedder
+feeds to the model.
+"""
+
+import logging
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app.core.config import get_settings
+from app.services.code_parser import ChunkType, CodeParser, Source, as_buffer
+
+settings = get_settings()
+logger = logging.getLogger("devflow")
+
+# Characters per token assumed when no tokenizer is available
+CHARS_PER_TOKEN = 3
+
+# Tokens the model reads per input, besides its two special tokens; the rest is truncated
+MODEL_INPUT_TOKENS = settings.MAX_SEQUENCE_LENGTH - 2
+
+# Module-level runs smaller than this (a lone `package main`) are not worth a vector
+MIN_MODULE_TOKENS = 16
+
+class _Piece(NamedTuple):
+    """A span of source that is never split further."""
+    start_byte: int
+    end_byte: int
+    start_line: int
+    end_line: int
+    tokens: int
+
+def _text(code_bytes: Any, start: int, end: int) -> str:
+    return bytes(code_bytes[start:end]).decode('utf-8', errors='replace')
+
+class CodeChunker:
+    """Splits parsed code into chunks that fit the embedding model's token budget."""
+
+    def __init__(
+        self,
+        parser: Optional[CodeParser] = None,
+        tokenizer: Any = None,
+        max_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            parser: CodeParser used to parse and find elements (a new one by default)
+            tokenizer: Hugging Face tokenizer of the embedding model; without one,
+                       tokens are estimated from the character count
+            max_tokens: Token budget of one chunk (default CHUNK_MAX_TOKENS)
+            overlap_tokens: Tokens repeated between consecutive parts of a split
+                            element (default CHUNK_OVERLAP_TOKENS)
+        """
+        self.parser = parser or CodeParser()
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+        self.overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Token count of each text as the embedder would see it, special tokens excluded."""
+        if not texts:
+            return []
+        normalized = [' '.join(text.split()) for text in texts]
+        if self.tokenizer is None:
+            return [-(-len(text) // CHARS_PER_TOKEN) for text in normalized]
+        encoded = self.tokenizer(normalized, add_special_tokens=False, verbose=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def chunk_code(self, code: Source, language: str) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Parse and chunk source code; code in a language without a grammar is
+        split along lines into module chunks.
+
+        Returns:
+            (chunks, stats), as for `chunk_tree`
+        """
+        tree = self.parser.parse_code(code, language) if self.parser.supports(language) else None
+        if tree is not None:
+            return self.chunk_tree(tree, code, language)
+        code_bytes = as_buffer(code)
+        pieces = self._split_lines(code_bytes, 0, len(code_bytes), 0)
+        chunks = [
+            self._chunk(code_bytes, window, ChunkType.MODULE.value, None, None, None)
+            for window in self._pack(pieces)
+        ]
+        return chunks, self._finish(chunks, 0)
+
+    def chunk_tree(self, tree: Any, code: Source, language: str) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Chunk a parsed file.
+
+        `code` is the source the tree was parsed from; with a bytes-like
+        source only the emitted chunks are decoded.
+
+        Returns:
+            (chunks, stats). Chunks of functions, methods and classes come in
+            document order, followed by module chunks. Each has a `chunk_id`,
+            name, type, code, start/end line and byte spans, `parent` (the
+            index of the first chunk of the enclosing element, None at top
+            level) and its `parent_id`, `part` (the position within a split
+            element, None if it was not split) and `tokens`. A class chunk's
+            code is its skeleton (see `_skeleton`) and `method_ids` lists the
+            chunks of its members. Stats count the `chunks`, the `split_elements` and
+            the `truncated_chunks` the model would still cut off (a single
+            line too long to split).
+        """
+        code_bytes = as_buffer(code)
+        elements = self.parser.element_nodes(tree, code_bytes, language)
+        members: Dict[int, List[Any]] = {}
+        for node, _, _, parent in elements:
+            if parent is not None:
+                members.setdefault(parent, []).append(node)
+        # Classes are embedded as skeletons: their methods have chunks of their own
+        skeletons = {}
+        texts = []
+        for index, (node, kind, _, _) in enumerate(elements):
+            skeleton = None
+            if kind == ChunkType.CLASS.value and index in members:
+                skeleton = self._skeleton(code_bytes, node, members[index])
+            if skeleton is not None:
+                skeletons[index] = skeleton
+                texts.append(skeleton[0].decode('utf-8', errors='replace'))
+            else:
+                texts.append(_text(code_bytes, node.start_byte, node.end_byte))
+        counts = self.count_tokens(texts)
+        chunks = []
+        # Index of each element's first chunk, for the parent links
+        first_chunk = []
+        split_elements = 0
+        for index, ((node, kind, name, parent), tokens) in enumerate(zip(elements, counts)):
+            parent_chunk = first_chunk[parent] if parent is not None else None
+            first_chunk.append(len(chunks))
+            if index in skeletons:
+                parts = self._skeleton_chunks(node, *skeletons[index], tokens, kind, name, parent_chunk)
+                split_elements += len(parts) > 1
+                chunks.extend(parts)
+                continue
+            if tokens <= self.max_tokens:
+                piece = _Piece(node.start_byte, node.end_byte, node.start_point[0], node.end_point[0], tokens)
+                chunks.append(self._chunk(code_bytes, [piece], kind, name, parent_chunk, None))
+                continue
+            split_elements += 1
+            windows = self._pack(self._pieces([node], code_bytes, [tokens]))
+            for part, window in enumerate(windows):
+                chunks.append(self._chunk(code_bytes, window, kind, name, parent_chunk, part))
+        for window in self._module_windows(tree.root_node, elements, code_bytes):
+            chunks.append(self._chunk(code_bytes, window, ChunkType.MODULE.value, None, None, None))
+        return chunks, self._finish(chunks, split_elements)
+
+    def _chunk(
+        self,
+        code_bytes: Any,
+        window: List[_Piece],
+        kind: str,
+        name: Optional[str],
+        parent: Optional[int],
+        part: Optional[int]
+    ) -> Dict[str, Any]:
+        start, end = window[0].start_byte, window[-1].end_byte
+        return {
+            'name': name,
+            'type': kind,
+            'code': _text(code_bytes, start, end),
+            'start_line': window[0].start_line,
+            'end_line': window[-1].end_line,
+            'start_byte': start,
+            'end_byte': end,
+            'parent': parent,
+            'part': part,
+            'tokens': sum(piece.tokens for piece in window)
+        }
+
+    def _skeleton(self, code_bytes: Any, node: Any, members: List[Any]) -> Optional[Tuple[bytes, List[int]]]:
+        """
+        A class with the bodies of its methods and nested classes spliced out,
+        keeping signatures, docstrings and fields; None if nothing was elided.
+
+        Returns:
+            (skeleton source, source line of each skeleton line)
+        """
+        cuts = []
+        for member in sorted(members, key=lambda member: member.start_byte):
+            if member.start_byte < node.start_byte or member.end_byte > node.end_byte:
+                # Defined outside the class, e.g. a Go method
+                continue
+            body = member.child_by_field_name('body') or next(
+                (child for child in reversed(member.named_children) if child.type.endswith('body')), None
+            )
+            if body is None:
+                continue
+            first = body.named_children[0] if body.named_child_count else None
+            if first is not None and first.type == 'expression_statement' and first.named_child_count and first.named_children[0].type == 'string':
+                # Keep a Python docstring, then elide the rest of the body
+                start, placeholder = first.end_byte, b'\n' + b' ' * first.start_point[1] + b'...'
+            else:
+                start = body.start_byte
+                placeholder = b'{ ... }' if bytes(code_bytes[start:start + 1]) == b'{' else b'...'
+            if body.end_byte - start > len(placeholder):
+                cuts.append((start, body.end_byte, body.end_point[0], placeholder))
+        if not cuts:
+            return None
+        parts = []
+        rows = [node.start_point[0]]
+        row = node.start_point[0]
+        position = node.start_byte
+        for start, end, end_row, placeholder in cuts + [(node.end_byte, node.end_byte, node.end_point[0], b'')]:
+            kept = bytes(code_bytes[position:start])
+            for _ in range(kept.count(b'\n')):
+                row += 1
+                rows.append(row)
+            rows.extend([row] * placeholder.count(b'\n'))
+            parts += [kept, placeholder]
+            row, position = end_row, end
+        return b''.join(parts), rows
+
+    def _skeleton_chunks(
+        self,
+        node: Any,
+        skeleton: bytes,
+        rows: List[int],
+        tokens: int,
+        kind: str,
+        name: str,
+        parent: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """Chunks of a class skeleton, split along its lines if it is over the budget."""
+        if tokens <= self.max_tokens:
+            windows = [[_Piece(0, len(skeleton), 0, len(rows) - 1, tokens)]]
+        else:
+            windows = self._pack(self._split_lines(skeleton, 0, len(skeleton), 0))
+        chunks = []
+        for part, window in enumerate(windows):
+            chunk = self._chunk(skeleton, window, kind, name, parent, part if len(windows) > 1 else None)
+            # Lines map back to the source; bytes span the whole class
+            chunk.update(
+                start_line=rows[chunk['start_line']],
+                end_line=rows[chunk['end_line']],
+                start_byte=node.start_byte,
+                end_byte=node.end_byte
+            )
+            chunks.append(chunk)
+        return chunks
+
+    def _finish(self, chunks: List[Dict[str, Any]], split_elements: int) -> Dict[str, int]:
+        """
+        Give the chunks their IDs and links, replace the estimated token
+        counts of multi-piece chunks with real ones and tally the stats.
+        """
+        for chunk in chunks:
+            chunk['chunk_id'] = str(uuid.uuid4())
+            chunk['parent_id'] = None
+        for chunk in chunks:
+            if chunk['parent'] is not None:
+                parent = chunks[chunk['parent']]
+                chunk['parent_id'] = parent['chunk_id']
+                if parent['type'] == ChunkType.CLASS.value:
+                    parent.setdefault('method_ids', []).append(chunk['chunk_id'])
+        packed = [chunk for chunk in chunks if chunk['part'] is not None or chunk['type'] == ChunkType.MODULE.value]
+        for chunk, tokens in zip(packed, self.count_tokens([chunk['code'] for chunk in packed])):
+            chunk['tokens'] = tokens
+        return {
+            'chunks': len(chunks),
+            'split_elements': split_elements,
+            'truncated_chunks': sum(1 for chunk in chunks if chunk['tokens'] > MODEL_INPUT_TOKENS)
+        }
+
+    def _pieces(self, nodes: List[Any], code_bytes: Any, counts: List[int]) -> List[_Piece]:
+        """
+        Break nodes into pieces under the budget, in document order: a node
+        that fits is one piece, a larger one is replaced by its children and
+        a larger one without children by its lines.
+        """
+        pieces = []
+        # Explicit stack (first node on top) so deeply nested code cannot hit the recursion limit
+        stack = list(zip(reversed(nodes), reversed(counts)))
+        while stack:
+            node, tokens = stack.pop()
+            if tokens <= self.max_tokens:
+                pieces.append(_Piece(node.start_byte, node.end_byte, node.start_point[0], node.end_point[0], tokens))
+                continue
+            children = node.children
+            if not children:
+                pieces.extend(self._split_lines(code_bytes, node.start_byte, node.end_byte, node.start_point[0]))
+                continue
+            child_counts = self.count_tokens([_text(code_bytes, child.start_byte, child.end_byte) for child in children])
+            stack.extend(zip(reversed(children), reversed(child_counts)))
+        return pieces
+
+    def _split_lines(self, code_bytes: Any, start: int, end: int, start_line: int) -> List[_Piece]:
+        """Pieces of a byte range along its lines; a line over the budget is cut into equal parts."""
+        spans = []
+        offset = start
+        for line_no, line in enumerate(bytes(code_bytes[start:end]).split(b'\n'), start_line):
+            if line.strip():
+                spans.append((offset, offset + len(line), line_no))
+            offset += len(line) + 1
+        counts = self.count_tokens([_text(code_bytes, begin, stop) for begin, stop, _ in spans])
+        pieces = []
+        for (begin, stop, line_no), tokens in zip(spans, counts):
+            if tokens <= self.max_tokens:
+                pieces.append(_Piece(begin, stop, line_no, line_no, tokens))
+                continue
+            # Minified or generated code: cut the line into parts of about max_tokens each
+            text = _text(code_bytes, begin, stop)
+            parts = -(-tokens // self.max_tokens)
+            size = -(-len(text) // parts)
+            for i in range(0, len(text), size):
+                part_start = begin + len(text[:i].encode('utf-8'))
+                part_end = begin + len(text[:i + size].encode('utf-8'))
+                pieces.append(_Piece(part_start, part_end, line_no, line_no, -(-tokens // parts)))
+        return pieces
+
+    def _pack(self, pieces: List[_Piece]) -> List[List[_Piece]]:
+        """Greedily group consecutive pieces into windows under the budget, with overlap."""
+        windows = []
+        window: List[_Piece] = []
+        window_tokens = 0
+        for piece in pieces:
+            if window and window_tokens + piece.tokens > self.max_tokens:
+                windows.append(window)
+                # Carry the tail of the closed window over, but never all of it
+                carried: List[_Piece] = []
+                carried_tokens = 0
+                for previous in reversed(window[1:]):
+                    if carried_tokens + previous.tokens > self.overlap_tokens:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous.tokens
+                if carried_tokens + piece.tokens > self.max_tokens:
+                    carried, carried_tokens = [], 0
+                window, window_tokens = carried, carried_tokens
+            window.append(piece)
+            window_tokens += piece.tokens
+        if window:
+            windows.append(window)
+        return windows
+
+    def _module_windows(self, root: Any, elements: List[Tuple], code_bytes: Any) -> List[List[_Piece]]:
+        """
+        Pack the top-level nodes that hold no element into windows; a node
+        holding an element ends the run, so each window is contiguous code.
+        """
+        element_starts = sorted(node.start_byte for node, *_ in elements)
+        runs: List[List[Any]] = [[]]
+        position = 0
+        for node in root.children:
+            while position < len(element_starts) and element_starts[position] < node.start_byte:
+                position += 1
+            if position < len(element_starts) and element_starts[position] < node.end_byte:
+                runs.append([])
+            else:
+                runs[-1].append(node)
+        runs = [run for run in runs if run]
+        counts = iter(self.count_tokens([
+            _text(code_bytes, node.start_byte, node.end_byte) for run in runs for node in run
+        ]))
+        windows = []
+        for run in runs:
+            pieces = self._pieces(run, code_bytes, [next(counts) for _ in run])
+            windows.extend(
+                window for window in self._pack(pieces)
+                if sum(piece.tokens for piece in window) >= MIN_MODULE_TOKENS
+            )
+        return windows
@@ -1,9 +1,738 @@
+"""
+Code Indexer Service
+
+This service indexes a codebase as a streaming pipeline. Stages connected by
+bounded queues overlap file I/O, parsing and model inference, and the bounded
+queues give backpressure so memory stays flat whatever the repository size:
+
+    producer -> readers -> parse workers -> batching embedder -> store writer
+
+The producer is an ignore-aware walk of the indexed path for full runs (see
+repo_walker), the paths git
+reports as changed since the last indexed commit, or an explicit list of paths
+when the file watcher reports changes.
+
+Inside a git repository chunks and vectors are keyed by the blob object ID of
+the content they came from. When a file moves to other content (a commit, a
+branch switch) the old chunks are archived rather than deleted, and a file
+that comes back to a blob seen before gets them re-attached without being
+read, parsed or embedded again. Tracked, clean files take their blob ID from
+the git index, so unchanged ones are skipped without even a stat.
+
+Vectors are content-addressed: a chunk's vector ID is the hash of the text
+the model reads, so identical chunks (vendored code, copy-pasted helpers) are
+embedded and stored once and chunks are locations of a vector. A vector is
+searchable while any indexed chunk refers to it, archived while only archived
+chunks do, and deleted with its last chunk.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import subprocess
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import numpy as np
+from app.core.config import get_settings
+from app.db import metadata_store
 from app.db.vector_store import VectorStore
+from app.services.model_registry import get_embedder
+from app.services.git_repo import GitRepo, blob_sha
+from app.services.index_jobs import IndexJob, IndexJobCancelled
+from app.services.parse_pool import ParsePool, open_source
+from app.services.code_parser import ChunkType
+from app.services.embedding_pool import EmbeddingPool
+from app.services.dim_reduction import PCAReducer, evaluate, reducer_path
+from app.services.repo_walker import IgnoreMatcher, looks_binary, too_large
+
+settings = get_settings()
+logger = logging.getLogger("devflow")
+
+LANGUAGE_MAP = {
+    'py': 'python', 'js': 'javascript', 'ts': 'typescript', 'java': 'java', 'go': 'go', 'rb': 'ruby',
+    'cpp': 'cpp', 'cc': 'cpp', 'cxx': 'cpp', 'cs': 'csharp', 'kt': 'kotlin', 'php': 'php', 'c': 'c',
+    'rs': 'rust', 'scala': 'scala', 'swift': 'swift'
+}
+
+# (file_path, size, mtime_ns, content_hash, blob_sha); the hash is None for
+# files re-attached to archived chunks without being read
+FileState = Tuple[str, int, int, Optional[str], Optional[str]]
+
+# End-of-stream marker passed down each queue
+_DONE = object()
+
+# Returned by `_read_file` for files that could not be read, to be retried next run
+_FAILED = object()
+
+# Index state key of the scope (root, recursion, extensions) of the last index run
+SCOPE_KEY = "scope"
+
+def in_index_scope(file_path: str, root: str, recursive: bool, extensions: Optional[List[str]]) -> bool:
+    """Whether an index run over `root` covers `file_path` (used to detect deleted files too)."""
+    parent = os.path.dirname(file_path)
+    if recursive:
+        if parent != root and not parent.startswith(root.rstrip(os.sep) + os.sep):
+            return False
+    elif parent != root:
+        return False
+    ext = os.path.splitext(file_path)[1][1:].lower()
+    if extensions and ext not in [e.lower().lstrip('.') for e in extensions]:
+        return False
+    return ext in LANGUAGE_MAP
+
+class _PipelineStopped(Exception):
+    """Raised in a stage when another stage failed or the job was cancelled."""
+
+class _Pipeline:
+    """Stop signalling and queue helpers shared by the stages of one run."""
+
+    def __init__(self, job: IndexJob):
+        self.job = job
+        self.stop = threading.Event()
+        self.error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    def fail(self, error: BaseException):
+        with self._lock:
+            if self.error is None:
+                self.error = error
+        self.stop.set()
+
+    def _check(self):
+        if self.job.cancelled and not self.stop.is_set():
+            self.fail(IndexJobCancelled(f"Index job {self.job.id} was cancelled"))
+        if self.stop.is_set():
+            raise _PipelineStopped()
+
+    def put(self, q: queue.Queue, item: Any):
+        """Blocking put that gives up once the pipeline is stopping."""
+        while True:
+            self._check()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, q: queue.Queue) -> Any:
+        """Blocking get that gives up once the pipeline is stopping."""
+        while True:
+            self._check()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def start(self, name: str, target: Callable, *args) -> threading.Thread:
+        def run():
+            try:
+                target(*args)
+            except _PipelineStopped:
+                pass
+            except BaseException as e:
+                logger.error(f"Index pipeline stage {name} failed: {e}", exc_info=True)
+                self.fail(e)
+        thread = threading.Thread(target=run, name=f"devflow-index-{name}", daemon=True)
+        thread.start()
+        return thread
 
 class CodeIndexer:
-    def __init__(self, vector_store: VectorStore):
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        parse_pool: Optional[ParsePool] = None,
+        embedding_pool: Optional[EmbeddingPool] = None
+    ):
         self.vector_store = vector_store
+        self.parse_pool = parse_pool or ParsePool(tokenizer=get_embedder().tokenizer)
+        self.embedding_pool = embedding_pool or EmbeddingPool()
+        # Runs write to the same collection, so only one may be in flight
+        self._run_lock = threading.Lock()
+
+    def index_codebase(
+        self,
+        path: str,
+        recursive: bool = True,
+        extensions: Optional[List[str]] = None,
+        incremental: bool = True,
+        job: Optional[IndexJob] = None
+    ) -> Dict[str, Any]:
+        """
+        Index every supported file under `path`.
+
+        Args:
+            path: Absolute directory to index
+            recursive: Include subdirectories
+            extensions: Only index files with these extensions
+            incremental: Skip unchanged files instead of rebuilding from scratch
+            job: Receives progress and is checked for cancellation
+
+        Returns:
+            Summary with file, chunk and embedding totals
+        """
+        job = job or IndexJob(path)
+        with self._run_lock:
+            # A full rebuild starts from an empty vector store; incremental runs keep it
+            if not incremental:
+                self.vector_store.clear()
+                metadata_store.delete_all_chunks()
+            file_states = metadata_store.get_file_states()
+            repo = GitRepo.discover(path) if settings.INDEX_USE_GIT else None
+            git_key = f"git:{path}|{recursive}|{','.join(sorted(extensions or []))}"
+            head = repo.head() if repo else None
+            dirty = repo.dirty_paths() if head else set()
+            blobs = self._clean_blobs(repo, dirty) if head else None
+            changed = self._git_changed_paths(repo, git_key, dirty) if incremental and head else None
+            if changed is not None:
+                # Only reprocess what git reports as changed; the rest of the tree is not visited
+                mode = "git"
+                ignores = IgnoreMatcher(path)
+                candidates = [
+                    p for p in changed
+                    if in_index_scope(p, path, recursive, extensions) and not ignores.is_ignored_path(p)
+                ]
+                existing = sorted(p for p in candidates if os.path.isfile(p))
+                summary, failed = self._run_pipeline(iter(existing), incremental, file_states, job, blobs)
+                deleted_files = [p for p in candidates if p in file_states and not os.path.exists(p)]
+            else:
+                mode = "walk"
+                seen_files = set()
+
+                def walk():
+                    # Ignored directories are pruned, never descended into
+                    for file_path in IgnoreMatcher(path).walk_files(recursive):
+                        if in_index_scope(file_path, path, recursive, extensions):
+                            seen_files.add(file_path)
+                            yield file_path
+
+                summary, failed = self._run_pipeline(walk(), incremental, file_states, job, blobs)
+                # Files that were indexed before but no longer exist (or are now ignored) under the indexed path
+                deleted_files = [
+                    file_path for file_path in file_states
+                    if file_path not in seen_files
+                    and in_index_scope(file_path, path, recursive, extensions)
+                ]
+            self._remove_files(deleted_files, file_states)
+            self._prune_archive()
+            metadata_store.set_index_state(
+                SCOPE_KEY, json.dumps({"path": path, "recursive": recursive, "extensions": extensions})
+            )
+            if head:
+                # Dirty files and files that failed are remembered so they are rechecked
+                # even if git sees no change to them next time
+                recheck = {p for p in dirty if in_index_scope(p, path, recursive, extensions)} | failed
+                metadata_store.set_index_state(git_key, json.dumps({"commit": head, "dirty": sorted(recheck)}))
+        summary["mode"] = mode
+        summary["deleted_files"] = len(deleted_files)
+        summary["message"] = (
+            f"Indexing complete! {summary['total_files']} files, {summary['total_chunks']} code chunks, "
+            f"{summary['total_embeddings']} embeddings "
+            f"({summary['skipped_files']} unchanged, {summary['reused_files']} reused, "
+            f"{summary['deleted_files']} removed)."
+        )
+        return summary
+
+    def _clean_blobs(self, repo: GitRepo, dirty: Set[str]) -> Optional[Dict[str, str]]:
+        """Blob IDs of the tracked files whose working-tree content matches the git index."""
+        try:
+            blobs = repo.blob_shas()
+        except subprocess.CalledProcessError as e:
+            logger.warning(f"git ls-files failed, hashing file contents instead: {e}")
+            return {}
+        for file_path in dirty:
+            blobs.pop(file_path, None)
+        return blobs
+
+    def _git_changed_paths(self, repo: GitRepo, git_key: str, dirty: Set[str]) -> Optional[Set[str]]:
+        """
+        Paths to reprocess according to git: changed between the last indexed
+        commit and HEAD, dirty now, or dirty during the last run.
+
+        Returns:
+            None when there is no usable previous commit and the tree must be walked
+        """
+        stored = metadata_store.get_index_state(git_key)
+        if not stored:
+            return None
+        state = json.loads(stored)
+        if not repo.has_commit(state["commit"]):
+            return None
+        try:
+            return repo.changed_since(state["commit"]) | dirty | set(state.get("dirty", []))
+        except subprocess.CalledProcessError as e:
+            logger.warning(f"git diff failed, walking the tree instead: {e}")
+            return None
+
+    def last_scope(self) -> Optional[Dict[str, Any]]:
+        """Path, recursion and extensions of the last index run (`index_codebase` arguments), if any."""
+        stored = metadata_store.get_index_state(SCOPE_KEY)
+        return json.loads(stored) if stored else None
+
+    def index_files(self, paths: Iterable[str], job: Optional[IndexJob] = None) -> Dict[str, Any]:
+        """
+        Re-index specific files, e.g. the ones the file watcher saw change.
+
+        Only files within the scope of the last index run (its path, recursion
+        and extensions) are indexed. Paths that no longer exist (files or whole
+        directories) are removed from the index; unchanged files are skipped
+        as in incremental runs.
+        """
+        paths = set(paths)
+        job = job or IndexJob(", ".join(sorted(paths)))
+        with self._run_lock:
+            file_states = metadata_store.get_file_states()
+            scope = self.last_scope()
+            # Files just saved are usually dirty, so their blob IDs come from their contents
+            repo = None
+            if paths and settings.INDEX_USE_GIT:
+                common = os.path.commonpath(list(paths))
+                repo = GitRepo.discover(common if os.path.isdir(common) else os.path.dirname(common))
+            existing = sorted(
+                file_path for file_path in paths
+                if os.path.isfile(file_path) and (
+                    in_index_scope(file_path, scope["path"], scope["recursive"], scope["extensions"]) if scope
+                    else os.path.splitext(file_path)[1][1:].lower() in LANGUAGE_MAP
+                )
+            )
+            gone = [
+                removed for removed in paths if not os.path.exists(removed)
+            ]
+            deleted_files = [
+                file_path for file_path in file_states
+                if any(file_path == removed or file_path.startswith(removed.rstrip(os.sep) + os.sep) for removed in gone)
+            ]
+            summary, _ = self._run_pipeline(iter(existing), True, file_states, job, {} if repo else None)
+            self._remove_files(deleted_files, file_states)
+            self._prune_archive()
+        summary["deleted_files"] = len(deleted_files)
+        summary["message"] = (
+            f"Re-indexed {summary['total_files']} files, {summary['total_chunks']} code chunks "
+            f"({summary['skipped_files']} unchanged, {summary['reused_files']} reused, "
+            f"{summary['deleted_files']} removed)."
+        )
+        return summary
+
+    def reduce_dimensions(self, dims: int, sample_size: Optional[int] = None, apply: bool = True) -> Dict[str, Any]:
+        """
+        Fit a PCA on a sample of the stored vectors and, if `apply`, re-project
+        the whole index onto it (see dim_reduction). `dims` of 0 removes the
+        reduction and restores full vectors.
+
+        Returns:
+            Report with the fitted dimensions, the variance they explain and
+            recall@10 per storage option against exact full-vector search
+        """
+        embedder = get_embedder()
+        with self._run_lock:
+            _, documents, metadatas = self.vector_store.sample(sample_size or settings.EMBEDDING_REDUCTION_SAMPLE)
+            # Full vectors come from the embedding cache; anything evicted is re-embedded
+            vectors = embedder.embed_code_batch(documents, metadatas, self.embedding_pool, reduce=False)
+            reducer = PCAReducer.fit(vectors, dims, embedder.model_name) if dims else None
+            report = {
+                "dimensions": dims or vectors.shape[1],
+                "sample_size": len(documents),
+                "explained_variance": round(reducer.explained_variance, 4) if reducer else 1.0,
+                "storage": evaluate(vectors, reducer),
+                "applied": apply
+            }
+            if not apply:
+                return report
+
+            def project(texts: List[str], metas: List[Dict[str, Any]]) -> np.ndarray:
+                vectors = embedder.embed_code_batch(texts, metas, self.embedding_pool, reduce=False)
+                return reducer.transform(vectors) if reducer and len(vectors) else vectors
+
+            def use_reducer():
+                embedder.reducer = reducer
+
+            # Queries switch to the new reduction in the rebuild's swap step,
+            # right before searches move to the rebuilt collections; a failed
+            # rebuild leaves both untouched. A query embedded just before the
+            # switch and run just after it still has the old width, which
+            # Chroma rejects rather than answering from the wrong space.
+            report["rebuilt_vectors"] = self.vector_store.rebuild(project, on_swap=use_reducer)
+            if reducer:
+                reducer.save(reducer_path())
+            elif os.path.exists(reducer_path()):
+                os.remove(reducer_path())
+        logger.info(
+            f"Vectors rebuilt at {report['dimensions']} dimensions "
+            f"({report['explained_variance']:.1%} of the variance kept)"
+        )
+        return report
+
+    def _remove_files(self, file_paths: List[str], file_states: Dict[str, Dict]):
+        """Drop the file records of files that no longer exist, archiving their blob-keyed chunks."""
+        for file_path in file_paths:
+            try:
+                self._sync_vectors(self._retire_chunks(file_path, file_states[file_path]['id']))
+                metadata_store.delete_file(file_path)
+            except Exception as e:
+                logger.error(f"Error removing deleted file {file_path}: {e}", exc_info=True)
+
+    def _retire_chunks(self, file_path: str, file_id: int) -> Set[str]:
+        """
+        Detach a file's current chunks (archiving blob-keyed ones) and return
+        the IDs of the vectors to `_sync_vectors` afterwards.
+        """
+        retired = metadata_store.retire_chunks(file_id)
+        # Vectors stored before vectors were keyed by content can only be found by path
+        return retired | set(self.vector_store.file_vector_ids(file_path))
+
+    def _sync_vectors(self, vector_ids: Set[str]):
+        """
+        Put vectors where their chunks say they belong: in search while any
+        indexed chunk shares them, archived while only archived chunks do,
+        deleted once no chunk does.
+        """
+        refs = metadata_store.embedding_refs(vector_ids)
+        searchable = [vector_id for vector_id, (active, _) in refs.items() if active]
+        archived = [vector_id for vector_id, (active, _) in refs.items() if not active]
+        unreferenced = [vector_id for vector_id in vector_ids if vector_id not in refs]
+        self.vector_store.restore_vectors(searchable)
+        self.vector_store.archive_vectors(archived)
+        self.vector_store.delete_vectors(unreferenced)
+
+    def _prune_archive(self):
+        """Forget the least recently archived chunks beyond INDEX_BLOB_ARCHIVE_CHUNKS."""
+        try:
+            self._sync_vectors(metadata_store.prune_archived_chunks(settings.INDEX_BLOB_ARCHIVE_CHUNKS))
+        except Exception as e:
+            logger.error(f"Error pruning archived chunks: {e}", exc_info=True)
+
+    def _run_pipeline(
+        self,
+        file_paths: Iterator[str],
+        incremental: bool,
+        file_states: Dict[str, Dict],
+        job: IndexJob,
+        blobs: Optional[Dict[str, str]] = None
+    ) -> Tuple[Dict[str, Any], Set[str]]:
+        """
+        Push `file_paths` through the read/parse/embed/store stages.
+
+        `blobs` maps clean tracked files to their git blob IDs; pass None outside
+        git repositories, where chunks are not keyed by blob.
+
+        Returns:
+            The totals, and the paths of the files that could not be read or parsed
+        """
+        pipeline = _Pipeline(job)
+        queue_size = settings.INDEX_QUEUE_SIZE
+        path_queue = queue.Queue(maxsize=queue_size)
+        parse_queue = queue.Queue(maxsize=queue_size)
+        result_queue = queue.Queue(maxsize=queue_size)
+        store_queue = queue.Queue(maxsize=2)
+        summary = {
+            "total_files": 0, "total_chunks": 0, "total_embeddings": 0, "skipped_files": 0, "reused_files": 0,
+            "split_elements": 0, "truncated_chunks": 0, "failed_files": 0
+        }
+        failed: Set[str] = set()
+        archived_blobs = metadata_store.get_archived_blobs() if blobs is not None else set()
+        summary_lock = threading.Lock()
+
+        def count(**values: int):
+            with summary_lock:
+                for name, value in values.items():
+                    summary[name] += value
+
+        def fail_file(file_path: str):
+            with summary_lock:
+                failed.add(file_path)
+                summary["failed_files"] += 1
+
+        def produce():
+            for file_path in file_paths:
+                job.add(files_total=1)
+                pipeline.put(path_queue, file_path)
+
+        def read():
+            while True:
+                file_path = pipeline.get(path_queue)
+                if file_path is _DONE:
+                    return
+                state = file_states.get(file_path) if incremental else None
+                task = self._read_file(file_path, state, blobs, archived_blobs)
+                if task is None:
+                    count(skipped_files=1)
+                    job.add(files_done=1, files_skipped=1)
+                elif task is False:
+                    job.add(files_done=1)
+                elif task is _FAILED:
+                    fail_file(file_path)
+                    job.add(files_done=1)
+                elif task[0] is None:
+                    # Archived chunks exist for this blob: skip parsing and embedding
+                    pipeline.put(result_queue, task)
+                else:
+                    pipeline.put(parse_queue, task)
+
+        def parse():
+            # Group tasks per worker round trip and cap the groups in flight
+            in_flight = deque()
+            group = []
+            max_in_flight = self.parse_pool.workers * 2
+
+            def drain(until: int):
+                while len(in_flight) > until:
+                    states, future = in_flight.popleft()
+                    for result in future.result():
+                        pipeline.put(result_queue, (result, states[result['file_path']]))
+
+            while True:
+                task = pipeline.get(parse_queue)
+                if task is not _DONE:
+                    group.append(task)
+                if group and (task is _DONE or len(group) >= self.parse_pool.chunksize):
+                    states = {file_state[0]: file_state for _, file_state in group}
+                    in_flight.append((states, self.parse_pool.submit([parse_task for parse_task, _ in group])))
+                    group = []
+                    drain(max_in_flight)
+                if task is _DONE:
+                    drain(0)
+                    return
+
+        def embed():
+            batch = _ChunkBatch()
+            while True:
+                item = pipeline.get(result_queue)
+                if item is not _DONE:
+                    result, file_state = item
+                    job.add(files_done=1)
+                    if result is None:
+                        batch.reused.append(file_state)
+                    elif result.get('error'):
+                        logger.error(f"Error processing {result['file_path']}: {result['error']}")
+                        fail_file(result['file_path'])
+                    else:
+                        added = batch.add_file(result, file_state)
+                        stats = result['stats']
+                        count(
+                            total_files=1,
+                            total_chunks=added,
+                            split_elements=stats.get('split_elements', 0),
+                            truncated_chunks=stats.get('truncated_chunks', 0)
+                        )
+                        job.add(chunks_done=added)
+                # Whole files go into a batch, so a file's chunks are never split across flushes
+                if (batch.files or batch.reused) and (item is _DONE or len(batch.texts) >= settings.INDEX_EMBED_BUFFER):
+                    # Content already stored under its key is not embedded again
+                    batch.embed(self.vector_store.existing_ids(list(set(batch.keys))), self.embedding_pool)
+                    pipeline.put(store_queue, batch)
+                    batch = _ChunkBatch()
+                if item is _DONE:
+                    return
+
+        def store():
+            while True:
+                batch = pipeline.get(store_queue)
+                if batch is _DONE:
+                    return
+                stored, reused = self._store_batch(batch)
+                count(total_embeddings=stored, total_files=reused, reused_files=reused)
+                job.add(embeddings_done=stored, files_reused=reused)
+
+        stages = [
+            ([pipeline.start("producer", produce)], path_queue),
+            ([pipeline.start(f"reader-{i}", read) for i in range(settings.INDEX_READER_THREADS)], parse_queue),
+            ([pipeline.start("parser", parse)], result_queue),
+            ([pipeline.start("embedder", embed)], store_queue),
+            ([pipeline.start("writer", store)], None),
+        ]
+        # Close each stage once the one feeding it has finished
+        for threads, downstream in stages:
+            for thread in threads:
+                thread.join()
+            if downstream is None or pipeline.stop.is_set():
+                continue
+            consumers = settings.INDEX_READER_THREADS if downstream is path_queue else 1
+            try:
+                for _ in range(consumers):
+                    pipeline.put(downstream, _DONE)
+            except _PipelineStopped:
+                pass
+        if pipeline.error is not None:
+            raise pipeline.error
+        # Chunks that share a vector with identical content instead of getting their own
+        summary["deduplicated_chunks"] = summary["total_chunks"] - summary["total_embeddings"]
+        # Share of the new chunks the embedding model could not read in full
+        truncated, total = summary["truncated_chunks"], summary["total_chunks"]
+        summary["truncation_rate"] = truncated / total if total else 0.0
+        if truncated:
+            logger.info(f"{truncated} of {total} chunks exceed the model's input and will be truncated")
+        return summary, failed
+
+    def _read_file(
+        self,
+        file_path: str,
+        state: Optional[Dict],
+        blobs: Optional[Dict[str, str]],
+        archived_blobs: Set[str]
+    ):
+        """
+        Stat, hash and read one file.
+
+        Returns:
+            None if the file is unchanged, False if it cannot be indexed (too
+            large or binary), _FAILED if reading it failed, otherwise a (parse task, file state) pair whose task is None when
+            the file's blob has archived chunks to re-attach
+        """
+        try:
+            blob = blobs.get(file_path) if blobs is not None else None
+            if blob and state and state['blob_sha'] == blob:
+                return None
+            stat = os.stat(file_path)
+            if too_large(stat.st_size):
+                logger.info(f"Skipping {file_path}: {stat.st_size} bytes is over INDEX_MAX_FILE_BYTES")
+                return False
+            if blob in archived_blobs:
+                return None, (file_path, stat.st_size, stat.st_mtime_ns, None, blob)
+            if not blob and state and state['size'] == stat.st_size and state['mtime_ns'] == stat.st_mtime_ns:
+                return None
+            with open_source(file_path) as content:
+                if looks_binary(content):
+                    return False
+                content_hash = hashlib.sha256(content).hexdigest()
+                if blobs is not None and not blob:
+                    blob = blob_sha(content)
+                # Small files travel to the parser as bytes; large ones are mapped again there
+                source = content if isinstance(content, bytes) else None
+            if state and state['content_hash'] == content_hash:
+                # Touched but not modified: remember the new mtime and move on
+                metadata_store.update_file_state(file_path, stat.st_size, stat.st_mtime_ns, content_hash, blob)
+                return None
+            if blob in archived_blobs:
+                return None, (file_path, stat.st_size, stat.st_mtime_ns, content_hash, blob)
+        except Exception as e:
+            logger.error(f"Error processing {file_path}: {e}", exc_info=True)
+            return _FAILED
+        ext = os.path.splitext(file_path)[1][1:].lower()
+        lang = LANGUAGE_MAP.get(ext, ext)
+        return (file_path, lang, source), (file_path, stat.st_size, stat.st_mtime_ns, content_hash, blob)
+
+    def _store_batch(self, batch: "_ChunkBatch") -> Tuple[int, int]:
+        """
+        Replace the previous chunks of the batch's files, then record them as indexed.
+
+        A failure fails the whole run (and its job): the files' previous chunks
+        are already detached by then, and their states are left as they were,
+        so the next run indexes them again.
+
+        Returns:
+            (number of vectors stored, number of files re-attached to archived chunks)
+        """
+        file_ids = {}
+        # Vectors whose references change; they are moved only once the chunks are in place,
+        # so content that a file keeps across versions never leaves search
+        touched = set()
+        for file_path, *_ in batch.files + batch.reused:
+            # Detach the previous version of this file
+            file_ids[file_path] = metadata_store.add_file(file_path).id
+            touched |= self._retire_chunks(file_path, file_ids[file_path])
+        reused = 0
+        for file_state in batch.reused:
+            file_path, blob = file_state[0], file_state[4]
+            vector_ids = metadata_store.restore_blob_chunks(blob, file_ids[file_path])
+            if not vector_ids:
+                # Another file took the archived chunks first; the next run parses this one
+                logger.warning(f"No archived chunks left for {file_path} ({blob}); it will be re-indexed")
+                continue
+            touched |= vector_ids
+            metadata_store.update_file_state(*file_state)
+            reused += 1
+        if batch.texts:
+            # A vector found at embedding time may have lost its last chunk in the previous batch
+            batch.embed(self.vector_store.existing_ids(list(set(batch.keys) - set(batch.embedded))), self.embedding_pool)
+            for chunk in batch.chunks:
+                chunk['file_id'] = file_ids[chunk.pop('file_path')]
+            if batch.embedded:
+                self.vector_store.add_vectors(
+                    [batch.texts[i] for i, _ in batch.embedded.values()],
+                    [batch.metadatas[i] for i, _ in batch.embedded.values()],
+                    ids=list(batch.embedded),
+                    embeddings=[embedding for _, embedding in batch.embedded.values()]
+                )
+            metadata_store.add_chunks(batch.chunks)
+            touched.update(batch.keys)
+        self._sync_vectors(touched)
+        # Files are marked as indexed only once their chunks are stored
+        for file_state in batch.files:
+            metadata_store.update_file_state(*file_state)
+        return len(batch.embedded), reused
+
+class _ChunkBatch:
+    """Chunks of whole files collected for one embedding pass and one store write."""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.chunks: List[Dict[str, Any]] = []
+        self.files: List[FileState] = []
+        # Files re-attached to the archived chunks of their blob
+        self.reused: List[FileState] = []
+        # Content key of each chunk, the ID of the vector it shares
+        self.keys: List[str] = []
+        # Vectors embedded for this batch: key -> (index of its first chunk, embedding)
+        self.embedded: Dict[str, Tuple[int, Any]] = {}
+
+    def add_file(self, result: Dict, file_state: FileState) -> int:
+        """Add the chunks of one parsed file; returns how many were added."""
+        file_path = result['file_path']
+        blob = file_state[4]
+        added = 0
+        chunks = result['chunks']
+        for element in chunks:
+            chunk_id = element['chunk_id']
+            # Module-level code is named after its file
+            name = element['name'] or os.path.basename(file_path)
+            metadata = {
+                'type': element['type'],
+                'name': name,
+                'file_path': file_path,
+                'language': result['language']
+            }
+            parent = chunks[element['parent']] if element['parent'] is not None else None
+            if parent is not None and parent['type'] == ChunkType.CLASS.value:
+                # Read by the embedder ("Part of class: ...") and returned by search
+                metadata['parent_class'] = parent['name']
+            if element['part'] is not None:
+                metadata['part'] = element['part']
+            if blob:
+                metadata['blob_sha'] = blob
+            key = get_embedder().content_key(element['code'], metadata)
+            self.texts.append(element['code'])
+            self.metadatas.append(metadata)
+            self.keys.append(key)
+            self.chunks.append({
+                'file_path': file_path,
+                'chunk_id': chunk_id,
+                'type': element['type'],
+                'name': name,
+                'start': element['start_line'],
+                'end': element['end_line'],
+                'embedding_id': key,
+                'blob_sha': blob,
+                'parent_id': element['parent_id']
+            })
+            added += 1
+        self.files.append(file_state)
+        return added
 
-    def index_codebase(self, path: str):
-        # Placeholder: implement code parsing and indexing logic here
-        pass 
\ No newline at end of file
+    def embed(self, existing: Set[str], pool: Optional[EmbeddingPool] = None):
+        """Embed, once per key, the chunks whose key is neither in `existing` nor embedded yet."""
+        pending = {}
+        for index, key in enumerate(self.keys):
+            if key not in existing and key not in self.embedded:
+                pending.setdefault(key, index)
+        if not pending:
+            return
+        embeddings = get_embedder().embed_code_batch(
+            [self.texts[index] for index in pending.values()],
+            [self.metadatas[index] for index in pending.values()],
+            pool
+        )
+        for (key, index), embedding in zip(pending.items(), embeddings):
+            self.embedded[key] = (index, embedding)
@@ -18,15 +18,33 @@ Unsupported/skipped (due to missing pre-built grammars or incompatibility):
 - rust
 - scala
 - swift
+
+Grammars are imported the first time a language is parsed, so a process only
+pays for the languages present in the workspace.
+
+Functions, methods and classes are found with declarative tree-sitter query
+packs in `queries/<language>.scm`, compiled once per language and executed by
+tree-sitter's native query engine. A pack captures each definition as
+@class, @function (a method when it sits directly in a class) or @method, its
+name as @name, and optionally the @receiver type a method belongs to (Go).
+Languages without a pack fall back to a cursor walk over FUNCTION_NODES and
+CLASS_NODES.
 """
-from tree_sitter import Language, Parser, Node
+from tree_sitter import Language, Parser, Node, Query
+import importlib
+import mmap
 import os
+import threading
+from contextlib import contextmanager
 import sys
 from pathlib import Path
 import tempfile
 import subprocess
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any, Union
 from enum import Enum
+from app.core.config import get_settings
+
+settings = get_settings()
 
 class ChunkType(Enum):
     """Types of code chunks that can be extracted."""
@@ -37,53 +55,143 @@ class ChunkType(Enum):
     COMMENT = "comment"
     MODULE = "module"
 
+QUERIES_DIR = Path(__file__).parent / "queries"
+
+# Compiled query packs by language name, shared by every CodeParser in the process
+_QUERY_CACHE: Dict[str, Optional[Query]] = {}
+_QUERY_CACHE_LOCK = threading.Lock()
+
+def load_query(language_name: str, language: Language) -> Optional[Query]:
+    """Compile (once) the query pack of a language; None if it has none or it does not compile."""
+    with _QUERY_CACHE_LOCK:
+        if language_name not in _QUERY_CACHE:
+            query = None
+            path = QUERIES_DIR / f"{language_name}.scm"
+            if path.exists():
+                try:
+                    query = language.query(path.read_text(encoding='utf-8'))
+                except Exception as e:
+                    print(f"Failed to compile {language_name} query pack: {str(e)}")
+            _QUERY_CACHE[language_name] = query
+        return _QUERY_CACHE[language_name]
+
+# Grammar package of each supported language, imported the first time the language is seen
+LANGUAGE_PACKAGES = {
+    'python': 'tree_sitter_python',
+    'javascript': 'tree_sitter_javascript',
+    'java': 'tree_sitter_java',
+    'go': 'tree_sitter_go',
+    'ruby': 'tree_sitter_ruby',
+    'cpp': 'tree_sitter_cpp',
+    'csharp': 'tree_sitter_c_sharp',
+    'kotlin': 'tree_sitter_kotlin'
+}
+
+# Loaded grammars by language name (None when the package is missing or incompatible)
+_LANGUAGE_CACHE: Dict[str, Optional[Language]] = {}
+_LANGUAGE_CACHE_LOCK = threading.Lock()
+
+def load_language(language_name: str) -> Optional[Language]:
+    """Import (once) the grammar of a language; None if it is unknown or cannot be loaded."""
+    with _LANGUAGE_CACHE_LOCK:
+        if language_name not in _LANGUAGE_CACHE:
+            language = None
+            package_name = LANGUAGE_PACKAGES.get(language_name)
+            if package_name:
+                try:
+                    language = Language(importlib.import_module(package_name).language())
+                    print(f"Successfully loaded {language_name} parser")
+                except ImportError:
+                    print(f"Failed to import {package_name}")
+                except Exception as e:
+                    print(f"Failed to load {language_name} parser: {str(e)}")
+            _LANGUAGE_CACHE[language_name] = language
+        return _LANGUAGE_CACHE[language_name]
+
+# Source accepted by the parse path: text, or any bytes-like buffer (bytes, mmap)
+Source = Union[str, bytes, bytearray, memoryview, mmap.mmap]
+
+def as_buffer(code: Source) -> Any:
+    """Bytes-like view of source code; only text needs encoding."""
+    return code.encode('utf-8') if isinstance(code, str) else code
+
+# Node types used by the cursor walk for languages without a query pack
+FUNCTION_NODES = {
+    'python': {'function_definition'},
+    'javascript': {'function_declaration', 'method_definition'},
+    'java': {'method_declaration', 'constructor_declaration'},
+    'go': {'function_declaration', 'method_declaration'},
+    'ruby': {'method', 'singleton_method'},
+    'cpp': {'function_definition'},
+    'csharp': {'method_declaration', 'constructor_declaration'},
+    'kotlin': {'function_declaration'},
+}
+CLASS_NODES = {
+    'python': {'class_definition'},
+    'javascript': {'class_declaration'},
+    'java': {'class_declaration', 'interface_declaration', 'enum_declaration'},
+    'go': {'type_declaration'},
+    'ruby': {'class', 'module'},
+    'cpp': {'class_specifier', 'struct_specifier'},
+    'csharp': {'class_declaration', 'interface_declaration', 'struct_declaration'},
+    'kotlin': {'class_declaration', 'object_declaration'},
+}
+
 class CodeParser:
     def __init__(self):
-        self.parsers = {}
-        self._load_parsers()
-
-    def _load_parsers(self):
-        """Load language parsers using pre-built packages."""
-        # Map of language names to their package names
-        language_packages = {
-            'python': 'tree_sitter_python',
-            'javascript': 'tree_sitter_javascript',
-            'java': 'tree_sitter_java',
-            'go': 'tree_sitter_go',
-            'ruby': 'tree_sitter_ruby',
-            'cpp': 'tree_sitter_cpp',
-            'csharp': 'tree_sitter_c_sharp',
-            'kotlin': 'tree_sitter_kotlin'
-        }
-
-        for lang_name, package_name in language_packages.items():
+        # Idle parsers per language. A Parser is not thread-safe, so each parse
+        # borrows one (creating it on first use) and returns it afterwards
+        self._idle: Dict[str, List[Parser]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded_languages(self) -> List[str]:
+        """Languages whose grammar has been loaded in this process."""
+        return sorted(name for name, language in _LANGUAGE_CACHE.items() if language is not None)
+
+    def supports(self, language: str) -> bool:
+        """Whether `language` can be parsed, loading its grammar if needed."""
+        return load_language(language) is not None
+
+    @contextmanager
+    def _borrow(self, language_name: str) -> Iterator[Parser]:
+        with self._lock:
+            idle = self._idle.get(language_name)
+            parser = idle.pop() if idle else None
+        if parser is None:
+            language = load_language(language_name)
+            if language is None:
+                raise ValueError(f"Unsupported language: {language_name}")
+            parser = Parser(language)
+            # Bound the time spent on pathological (huge or generated) files
+            if settings.PARSE_TIMEOUT_MS:
+                parser.timeout_micros = settings.PARSE_TIMEOUT_MS * 1000
+        try:
+            yield parser
+        finally:
+            with self._lock:
+                self._idle.setdefault(language_name, []).append(parser)
+
+    def parse_code(self, code: Source, language: str) -> Optional[Node]:
+        """
+        Parse code using the appropriate tree-sitter parser.
+
+        Bytes-like sources (bytes, mmap) are handed to tree-sitter as they
+        are. The tree reads from that buffer, so it must stay open while the
+        tree is used.
+        """
+        with self._borrow(language) as parser:
             try:
-                # Import the language package
-                lang_module = __import__(package_name)
-                # Get the language object
-                language = Language(lang_module.language())
-                # Create a parser for this language
-                parser = Parser()
-                parser.language = language
-                self.parsers[lang_name] = parser
-                print(f"Successfully loaded {lang_name} parser")
-            except ImportError:
-                print(f"Failed to import {package_name}")
-            except Exception as e:
-                print(f"Failed to load {lang_name} parser: {str(e)}")
-
-    def parse_code(self, code: str, language: str) -> Optional[Node]:
-        """Parse code using the appropriate tree-sitter parser."""
-        if language not in self.parsers:
-            raise ValueError(f"Unsupported language: {language}")
-            
-        parser = self.parsers[language]
-        tree = parser.parse(bytes(code, 'utf8'))
-        return tree
+                return parser.parse(as_buffer(code))
+            except ValueError:
+                # tree-sitter gives up this way when timeout_micros runs out;
+                # reset so the next parse does not resume the abandoned one
+                parser.reset()
+                raise TimeoutError(f"Parsing {language} code took longer than {settings.PARSE_TIMEOUT_MS} ms")
 
-    def _get_node_text(self, node: Any, code_bytes: bytes) -> str:
-        """Extract text from a node."""
-        return code_bytes[node.start_byte:node.end_byte].decode('utf-8')
+    def _get_node_text(self, node: Any, code_bytes: Any) -> str:
+        """Extract text from a node, decoding only its slice of the source."""
+        return code_bytes[node.start_byte:node.end_byte].decode('utf-8', errors='replace')
 
     def _get_docstring(self, node: Any, code_bytes: bytes) -> Optional[str]:
         """Extract docstring from a node with enhanced parsing."""
@@ -137,7 +245,7 @@ class CodeParser:
                 comments.append(comment_text)
         return comments
 
-    def extract_code_elements(self, code: str, language: str) -> Dict[str, List[Dict]]:
+    def extract_code_elements(self, code: Source, language: str) -> Dict[str, List[Dict]]:
         """
         Extract various code elements including functions, classes, methods, docstrings, and comments.
         
@@ -149,176 +257,202 @@ class CodeParser:
             - docstrings: List of docstrings
             - comments: List of comments
         """
-        # Language-specific node type mappings
-        FUNCTION_NODES = {
-            'python': 'function_definition',
-            'javascript': 'function_declaration',
-            'java': 'method_declaration',
-            'go': 'function_declaration',
-            'ruby': 'method',
-            'cpp': 'function_definition',
-            'csharp': 'method_declaration',
-            'kotlin': 'function_declaration',
-        }
-        CLASS_NODES = {
-            'python': 'class_definition',
-            'javascript': 'class_declaration',
-            'java': 'class_declaration',
-            'go': 'type_declaration',
-            'ruby': 'class',
-            'cpp': 'class_specifier',
-            'csharp': 'class_declaration',
-            'kotlin': 'class_declaration',
-        }
-        function_node = FUNCTION_NODES.get(language, 'function_definition')
-        class_node = CLASS_NODES.get(language, 'class_definition')
-
+        keys = (ChunkType.FUNCTION, ChunkType.CLASS, ChunkType.METHOD, ChunkType.DOCSTRING, ChunkType.COMMENT)
         try:
-            parser = self.parsers[language]
-            tree = parser.parse(bytes(code, 'utf8'))
-            
-            elements = {
-                ChunkType.FUNCTION.value: [],
-                ChunkType.CLASS.value: [],
-                ChunkType.METHOD.value: [],
-                ChunkType.DOCSTRING.value: [],
-                ChunkType.COMMENT.value: []
-            }
-            code_bytes = bytes(code, 'utf8')
-            
-            def visit_node(node, parent_stack=None):
-                if parent_stack is None:
-                    parent_stack = []
-                
-                # Process the current node
-                if node.type == function_node:
-                    name = self._get_function_name(node, language)
-                    code = self._get_node_text(node, code_bytes)
-                    docstring = self._get_docstring(node, code_bytes)
-                    comments = self._get_comments(node, code_bytes)
-                    
-                    # Check if this is a method (inside a class)
-                    is_method = any(p.type == class_node for p in parent_stack)
-                    parent_class = parent_stack[-1].child_by_field_name('name').text.decode('utf-8') if is_method and parent_stack else None
-                    
-                    element = {
-                        'name': name,
-                        'code': code,
-                        'docstring': docstring,
-                        'comments': comments,
-                        'type': ChunkType.METHOD.value if is_method else ChunkType.FUNCTION.value,
-                        'parent_class': parent_class if is_method else None,
-                        'start_line': node.start_point[0],
-                        'end_line': node.end_point[0]
-                    }
-                    
-                    if is_method:
-                        elements[ChunkType.METHOD.value].append(element)
-                    else:
-                        elements[ChunkType.FUNCTION.value].append(element)
-                        
-                elif node.type == class_node:
-                    name = self._get_class_name(node, language)
-                    code = self._get_node_text(node, code_bytes)
-                    docstring = self._get_docstring(node, code_bytes)
-                    comments = self._get_comments(node, code_bytes)
-                    
-                    elements[ChunkType.CLASS.value].append({
-                        'name': name,
-                        'code': code,
-                        'docstring': docstring,
-                        'comments': comments,
-                        'type': ChunkType.CLASS.value,
-                        'start_line': node.start_point[0],
-                        'end_line': node.end_point[0]
-                    })
-                
-                # Process children
-                for child in node.children:
-                    visit_node(child, parent_stack + [node])
-            
-            visit_node(tree.root_node)
+            code_bytes = as_buffer(code)
+            tree = self.parse_code(code_bytes, language)
+            elements = {key.value: [] for key in keys}
+            found = list(self._walk_elements(tree, language, code_bytes))
+            for node, kind, name, parent in found:
+                element = {
+                    'name': name,
+                    'code': self._get_node_text(node, code_bytes),
+                    'docstring': self._get_docstring(node, code_bytes),
+                    'comments': self._get_comments(node, code_bytes),
+                    'type': kind,
+                    'start_line': node.start_point[0],
+                    'end_line': node.end_point[0]
+                }
+                if kind == ChunkType.METHOD.value:
+                    element['parent_class'] = found[parent][2]
+                elif kind == ChunkType.FUNCTION.value:
+                    element['parent_class'] = None
+                elements[kind].append(element)
             return elements
         except Exception as e:
             print(f"Error extracting code elements: {str(e)}")
-            return {
-                ChunkType.FUNCTION.value: [],
-                ChunkType.CLASS.value: [],
-                ChunkType.METHOD.value: [],
-                ChunkType.DOCSTRING.value: [],
-                ChunkType.COMMENT.value: []
+            return {key.value: [] for key in keys}
+
+    def extract_elements(self, tree: Any, code: Source, language: str) -> List[Dict[str, Any]]:
+        """
+        Extract functions, methods and classes from a parsed tree in one pass.
+
+        `code` is the source the tree was parsed from; with a bytes-like
+        source only the emitted elements are decoded.
+
+        Returns:
+            Elements in document order, each with name, type, code, start/end
+            line and byte spans, and `parent`: the index of the enclosing
+            element in the returned list (None at top level)
+        """
+        code_bytes = as_buffer(code)
+        return [
+            {
+                'name': name,
+                'type': kind,
+                'code': self._get_node_text(node, code_bytes),
+                'start_line': node.start_point[0],
+                'end_line': node.end_point[0],
+                'start_byte': node.start_byte,
+                'end_byte': node.end_byte,
+                'parent': parent
             }
+            for node, kind, name, parent in self._walk_elements(tree, language, code_bytes)
+        ]
+
+    def element_nodes(self, tree: Any, code: Source, language: str) -> List[Tuple[Node, str, str, Optional[int]]]:
+        """
+        The nodes behind `extract_elements`: (node, type, name, parent index)
+        per element, in document order, for callers that work on the tree itself.
+        """
+        return list(self._walk_elements(tree, language, as_buffer(code)))
+
+    def _walk_elements(self, tree: Any, language: str, code_bytes: Any) -> Iterator[Tuple[Node, str, str, Optional[int]]]:
+        """
+        Yield (node, type, name, parent index) for every function, method and
+        class, in document order.
+
+        A function directly inside a class is a method; `parent` is the index,
+        in yield order, of the innermost enclosing element.
+        """
+        grammar = load_language(language)
+        query = load_query(language, grammar) if grammar is not None else None
+        if query is not None:
+            return iter(self._query_elements(tree, query, code_bytes))
+        return self._cursor_elements(tree, language, code_bytes)
+
+    def _query_elements(self, tree: Any, query: Query, code_bytes: Any) -> List[Tuple[Node, str, str, Optional[int]]]:
+        """Run a language's query pack and rebuild nesting from the captured spans."""
+        found = {}
+        for _, captures in query.matches(tree.root_node):
+            tag = next((tag for tag in ('class', 'method', 'function') if tag in captures), None)
+            if tag is None or 'name' not in captures:
+                continue
+            node = captures[tag][0]
+            key = (node.start_byte, node.end_byte, node.type)
+            # Alternative patterns can match the same definition; keep the first
+            if key in found:
+                continue
+            receiver = captures.get('receiver')
+            found[key] = (
+                node, tag,
+                self._get_node_text(captures['name'][0], code_bytes),
+                self._get_node_text(receiver[0], code_bytes) if receiver else None
+            )
+        # Outer definitions sort before the ones they contain
+        ordered = sorted(found.values(), key=lambda item: (item[0].start_byte, -item[0].end_byte))
+        elements = []
+        # (end byte, index, type) of the definitions enclosing the current one
+        enclosing: List[Tuple[int, int, str]] = []
+        for index, (node, tag, name, _) in enumerate(ordered):
+            while enclosing and enclosing[-1][0] < node.end_byte:
+                enclosing.pop()
+            parent = enclosing[-1] if enclosing else None
+            if tag == 'class':
+                kind = ChunkType.CLASS.value
+            elif tag == 'method' or (parent is not None and parent[2] == ChunkType.CLASS.value):
+                kind = ChunkType.METHOD.value
+            else:
+                kind = ChunkType.FUNCTION.value
+            elements.append([node, kind, name, parent[1] if parent else None])
+            enclosing.append((node.end_byte, index, kind))
+        # Methods declared outside their type (Go receivers) belong to the type of that name
+        classes = {name: index for index, (_, kind, name, _) in enumerate(elements) if kind == ChunkType.CLASS.value}
+        for element, (_, _, _, receiver) in zip(elements, ordered):
+            if receiver is not None and element[3] is None:
+                element[3] = classes.get(receiver)
+        return [tuple(element) for element in elements]
 
-    def _get_function_name(self, node: Any, language: str) -> str:
-        """Extract function name based on language."""
-        if language == 'python':
-            return node.child_by_field_name('name').text.decode('utf-8')
-        elif language in ['javascript', 'java', 'go', 'cpp', 'csharp', 'kotlin']:
-            return node.child_by_field_name('name').text.decode('utf-8')
-        elif language == 'ruby':
-            return node.child_by_field_name('name').text.decode('utf-8')
-        return "unknown_function"
-
-    def _get_class_name(self, node: Any, language: str) -> str:
-        """Extract class name based on language."""
-        if language == 'python':
-            return node.child_by_field_name('name').text.decode('utf-8')
-        elif language in ['javascript', 'java', 'go', 'cpp', 'csharp', 'kotlin']:
-            return node.child_by_field_name('name').text.decode('utf-8')
-        elif language == 'ruby':
-            return node.child_by_field_name('name').text.decode('utf-8')
-        return "unknown_class"
-
-    def _get_method_name(self, node: Any, language: str) -> str:
-        """Extract method name based on language."""
-        if language == 'python':
-            return node.child_by_field_name('name').text.decode('utf-8')
-        elif language in ['javascript', 'java', 'go', 'cpp', 'csharp', 'kotlin']:
-            return node.child_by_field_name('name').text.decode('utf-8')
-        elif language == 'ruby':
-            return node.child_by_field_name('name').text.decode('utf-8')
-        return "unknown_method"
-
-    def split_code_into_chunks(self, code: str, language: str, max_chunk_size: int = 1000) -> List[Dict]:
-        """Split code into manageable chunks for processing."""
-        def create_chunk(text: str, chunk_type: ChunkType, metadata: Dict = None) -> Dict:
-            return {
-                'text': text,
-                'type': chunk_type.value,
-                'metadata': metadata or {}
+    def _cursor_elements(self, tree: Any, language: str, code_bytes: Any) -> Iterator[Tuple[Node, str, str, Optional[int]]]:
+        """Walk the tree once with a TreeCursor, without recursion, matching FUNCTION_NODES and CLASS_NODES."""
+        function_types = FUNCTION_NODES.get(language, {'function_definition'})
+        class_types = CLASS_NODES.get(language, {'class_definition'})
+        cursor = tree.walk()
+        depth = 0
+        count = 0
+        # (depth, index, type) of the elements enclosing the cursor
+        enclosing: List[Tuple[int, int, str]] = []
+        while True:
+            node = cursor.node
+            node_type = node.type
+            if node_type in function_types or node_type in class_types:
+                name = self._node_name(node, code_bytes)
+                if name is not None:
+                    parent = enclosing[-1] if enclosing else None
+                    if node_type in class_types:
+                        kind = ChunkType.CLASS.value
+                    elif parent is not None and parent[2] == ChunkType.CLASS.value:
+                        kind = ChunkType.METHOD.value
+                    else:
+                        kind = ChunkType.FUNCTION.value
+                    yield node, kind, name, parent[1] if parent else None
+                    enclosing.append((depth, count, kind))
+                    count += 1
+            if cursor.goto_first_child():
+                depth += 1
+                continue
+            while not cursor.goto_next_sibling():
+                if not cursor.goto_parent():
+                    return
+                depth -= 1
+            # Moving to a sibling leaves the previous node at this depth and everything inside it
+            while enclosing and enclosing[-1][0] >= depth:
+                enclosing.pop()
+
+    def _node_name(self, node: Node, code_bytes: Any) -> Optional[str]:
+        """Name of a definition node, following declarators (C++) and type specs (Go)."""
+        name_node = node.child_by_field_name('name')
+        if name_node is None:
+            declarator = node.child_by_field_name('declarator')
+            while declarator is not None and declarator.child_by_field_name('declarator') is not None:
+                declarator = declarator.child_by_field_name('declarator')
+            name_node = declarator
+        if name_node is None:
+            for child in node.named_children:
+                if child.type == 'type_spec':
+                    name_node = child.child_by_field_name('name')
+                    break
+        if name_node is None:
+            return None
+        return self._get_node_text(name_node, code_bytes)
+
+    def split_code_into_chunks(self, code: str, language: str, max_tokens: Optional[int] = None) -> List[Dict]:
+        """
+        Split code into chunks that fit the embedding model, along its syntax
+        tree rather than at a character count (see CodeChunker).
+
+        Token counts are estimated from the length of the text here; the
+        indexer sizes chunks with the embedding tokenizer itself.
+        """
+        from app.services.chunker import CodeChunker
+        chunks, _ = CodeChunker(self, max_tokens=max_tokens).chunk_code(code, language)
+        return [
+            {
+                'text': chunk['code'],
+                'type': chunk['type'],
+                'metadata': {
+                    key: chunk[key]
+                    for key in ('name', 'start_line', 'end_line', 'part', 'tokens')
+                    if chunk[key] is not None
+                }
             }
-        
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        # Split code into lines
-        lines = code.split('\n')
-        
-        for line in lines:
-            line_size = len(line) + 1  # +1 for newline
-            
-            if current_size + line_size > max_chunk_size and current_chunk:
-                # Create a chunk from current lines
-                chunk_text = '\n'.join(current_chunk)
-                chunks.append(create_chunk(chunk_text, ChunkType.MODULE))
-                current_chunk = []
-                current_size = 0
-            
-            current_chunk.append(line)
-            current_size += line_size
-        
-        # Add the last chunk if there are remaining lines
-        if current_chunk:
-            chunk_text = '\n'.join(current_chunk)
-            chunks.append(create_chunk(chunk_text, ChunkType.MODULE))
-        
-        return chunks
+            for chunk in chunks
+        ]
 
-    def extract_functions(self, tree: Node, code: str) -> List[Dict[str, str]]:
+    def extract_functions(self, tree: Node, code: Source) -> List[Dict[str, str]]:
         """Extract function definitions from the AST."""
         functions = []
-        code_bytes = bytes(code, 'utf8')
+        code_bytes = as_buffer(code)
         
         def visit_node(node):
             # print(f"Visiting node type: {node.type}")  # Debug logging
@@ -326,14 +460,16 @@ class CodeParser:
                 try:
                     name_node = node.child_by_field_name('name')
                     if name_node:
-                        name = name_node.text.decode('utf-8')
+                        name = self._get_node_text(name_node, code_bytes)
                         code = self._get_node_text(node, code_bytes)
                         docstring = self._get_docstring(node, code_bytes)
                         # print(f"Found function: {name}")  # Debug logging
                         functions.append({
                             'name': name,
                             'code': code,
-                            'docstring': docstring
+                            'docstring': docstring,
+                            'start_line': node.start_point[0],
+                            'end_line': node.end_point[0]
                         })
                 except Exception as e:
                     print(f"Error extracting function: {str(e)}")  # Debug logging
@@ -344,24 +480,26 @@ class CodeParser:
         print(f"Total functions found: {len(functions)}")  # Debug logging
         return functions
 
-    def extract_classes(self, tree: Node, code: str) -> List[Dict[str, str]]:
+    def extract_classes(self, tree: Node, code: Source) -> List[Dict[str, str]]:
         """Extract class definitions from the AST."""
         classes = []
-        code_bytes = bytes(code, 'utf8')
+        code_bytes = as_buffer(code)
         
         def visit_node(node):
             if node.type == 'class_definition':
                 try:
                     name_node = node.child_by_field_name('name')
                     if name_node:
-                        name = name_node.text.decode('utf-8')
+                        name = self._get_node_text(name_node, code_bytes)
                         code = self._get_node_text(node, code_bytes)
                         docstring = self._get_docstring(node, code_bytes)
                         # print(f"Found class: {name}")  # Debug logging
                         classes.append({
                             'name': name,
                             'code': code,
-                            'docstring': docstring
+                            'docstring': docstring,
+                            'start_line': node.start_point[0],
+                            'end_line': node.end_point[0]
                         })
                 except Exception as e:
                     print(f"Error extracting class: {str(e)}")  # Debug logging
@@ -375,7 +513,7 @@ class CodeParser:
     def parse_file(self, file_path: Path) -> list:
         """Parse a file and extract its code elements."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
+            with open(file_path, 'rb') as f:
                 code = f.read()
             
             # Determine language from file extension
@@ -394,12 +532,7 @@ class CodeParser:
             }
             language = language_map.get(ext, 'python')
             
-            # Parse the code
-            tree = self.parse_code(code, language)
-            if not tree:
-                return []
-            
-            # Extract elements
+            # Extract elements (parses the bytes as read, without decoding)
             elements = self.extract_code_elements(code, language)
             return elements
         except Exception as e:
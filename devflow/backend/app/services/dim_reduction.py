@@ -0,0 +1,152 @@
+"""
+Dimension Reduction Service
+
+This service shrinks the vectors kept in the HNSW index. A PCA is fitted on a
+sample of the stored embeddings, and CodeEmbedder projects every embedding
+onto its leading components (768 -> 128 dims by default, 6x less index
+memory) before storing or searching with it. The projection is saved under
+`.devflow/` and applies to the whole collection, which is re-projected when
+the PCA is (re)fitted. Full-size vectors stay in the embedding cache, so
+refitting does not need the model.
+
+Fitting reports recall@10 of nearest-neighbour search in the reduced space
+(and at float16 / int8 precision) against exact search on the full vectors,
+so the quality cost of a setting is measured before it is applied.
+"""
+
+import logging
+import os
+from typing import Dict, Optional
+import numpy as np
+from app.core.utils import get_workspace_root
+from app.services.embedding_cache import STORAGE_DTYPES, decode_vector, encode_vector
+
+logger = logging.getLogger("devflow")
+
+# Sampled vectors used as queries when measuring recall
+RECALL_QUERIES = 200
+RECALL_K = 10
+
+class PCAReducer:
+    """Projection of normalized embeddings onto their leading principal components."""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, model_name: str, explained_variance: float):
+        """
+        Args:
+            mean: Mean of the fitted vectors, shape (dims,)
+            components: Principal axes as rows, shape (reduced_dims, dims)
+            model_name: Embedding model the PCA was fitted for
+            explained_variance: Share of the sample's variance the components keep
+        """
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.model_name = model_name
+        self.explained_variance = explained_variance
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dims: int, model_name: str) -> "PCAReducer":
+        """Fit on a sample of embeddings (more rows than `dims` are required)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dims <= 0 or dims >= vectors.shape[1]:
+            raise ValueError(f"Reduced dimensions must be between 1 and {vectors.shape[1] - 1}, got {dims}")
+        if vectors.shape[0] <= dims:
+            raise ValueError(f"Fitting {dims} dimensions needs more than {dims} vectors, {vectors.shape[0]} are stored")
+        mean = vectors.mean(axis=0)
+        _, singular_values, axes = np.linalg.svd(vectors - mean, full_matrices=False)
+        variance = singular_values ** 2
+        explained = float(variance[:dims].sum() / max(variance.sum(), 1e-12))
+        return cls(mean, axes[:dims], model_name, explained)
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Project and re-normalize embeddings of shape (n, dims)."""
+        reduced = (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return reduced / np.maximum(norms, 1e-12)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # np.savez appends .npz to names without it; write to a name that already has it
+        pending = path + ".pending.npz"
+        np.savez(
+            pending,
+            mean=self.mean,
+            components=self.components,
+            model_name=np.array(self.model_name),
+            explained_variance=np.array(self.explained_variance)
+        )
+        os.replace(pending, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PCAReducer":
+        with np.load(path) as data:
+            return cls(
+                data["mean"],
+                data["components"],
+                str(data["model_name"]),
+                float(data["explained_variance"])
+            )
+
+def reducer_path() -> str:
+    """Where the workspace's fitted PCA is kept."""
+    return os.path.join(get_workspace_root(), ".devflow", "dim_reduction.npz")
+
+def load_reducer(model_name: str) -> Optional[PCAReducer]:
+    """The workspace's PCA if one was fitted for `model_name`, else None."""
+    path = reducer_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        reducer = PCAReducer.load(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable dimension reduction at {path}: {e}")
+        return None
+    if reducer.model_name != model_name:
+        logger.warning(
+            f"Dimension reduction at {path} was fitted for {reducer.model_name}, not {model_name}; ignoring it"
+        )
+        return None
+    return reducer
+
+def _round_trip(vectors: np.ndarray, dtype: str) -> np.ndarray:
+    """Vectors as read back after storing them at `dtype` precision."""
+    return np.stack([decode_vector(encode_vector(vector, dtype), dtype) for vector in vectors])
+
+def _recall(reference: np.ndarray, candidate: np.ndarray, queries: int, k: int) -> float:
+    """Share of the exact top-k neighbours (by `reference`) that `candidate` also ranks in its top k."""
+    def top_k(vectors):
+        similarities = vectors[:queries] @ vectors.T
+        # A query is its own nearest neighbour; leave it out
+        similarities[np.arange(queries), np.arange(queries)] = -np.inf
+        return np.argpartition(-similarities, k, axis=1)[:, :k]
+    expected, actual = top_k(reference), top_k(candidate)
+    hits = sum(len(set(e) & set(a)) for e, a in zip(expected, actual))
+    return hits / (queries * k)
+
+def evaluate(vectors: np.ndarray, reducer: Optional[PCAReducer]) -> Dict:
+    """
+    Recall@10 and bytes per vector of each storage option, compared with exact
+    search on the full float32 vectors of the sample.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(RECALL_K, vectors.shape[0] - 2)
+    queries = min(RECALL_QUERIES, vectors.shape[0])
+    if k < 1:
+        return {}
+    options = {f"full_{dtype}": (vectors, dtype) for dtype in STORAGE_DTYPES}
+    if reducer is not None:
+        reduced = reducer.transform(vectors)
+        options.update({f"reduced_{dtype}": (reduced, dtype) for dtype in STORAGE_DTYPES})
+    report = {}
+    for name, (candidate, dtype) in options.items():
+        recall = _recall(vectors, _round_trip(candidate, dtype), queries, k)
+        report[name] = {
+            "dimensions": candidate.shape[1],
+            "bytes_per_vector": len(encode_vector(candidate[0], dtype)),
+            f"recall_at_{k}": round(recall, 4),
+            "recall_delta": round(recall - 1.0, 4),
+        }
+    return report
@@ -3,16 +3,38 @@ Embedder Service
 
 This service handles code embeddings using a code-aware model from Hugging Face.
 It provides functionality to generate embeddings for code chunks and queries.
+Code embeddings go through a persistent cache keyed by model and text hash,
+query embeddings through an in-memory LRU keyed by model and normalized query.
+Model weights are loaded on first use (or by the model registry's warm-up),
+so creating an embedder only loads its tokenizer. Inference runs on PyTorch or,
+with EMBEDDING_BACKEND=onnx / onnx-int8, on an exported ONNX Runtime model.
+Once a PCA has been fitted (see dim_reduction), embeddings are returned in its
+reduced space; the caches keep the full vectors.
 """
 
-from typing import List, Dict, Union
+import hashlib
+import threading
+import time
+from typing import List, Dict, Union, Optional
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModel
-import torch
+from app.core.config import get_settings
+from app.services.embedding_cache import EmbeddingCache, QueryEmbeddingCache, get_embedding_cache
+from app.services import onnx_backend
+from app.services.dim_reduction import PCAReducer, load_reducer
+
+settings = get_settings()
+
+DEFAULT_MODEL = "microsoft/codebert-base-mlm"
 
 class CodeEmbedder:
-    def __init__(self, model_name: str = "microsoft/codebert-base-mlm"):
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        max_batch_tokens: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        cache: Optional[EmbeddingCache] = None,
+        backend: Optional[str] = None
+    ):
         """
         Initialize the code embedder with a pre-trained model.
         
@@ -20,11 +42,108 @@ class CodeEmbedder:
             model_name: Name of the pre-trained model to use for embeddings.
                        Default is microsoft/codebert-base-mlm, which is specifically
                        trained for code understanding.
+            max_batch_tokens: Token budget of one padded batch (batch size x longest input)
+            max_batch_size: Upper bound on the number of texts in one batch
+            cache: Persistent cache consulted before running the model
+                   (default: the workspace cache, see embedding_cache)
+            backend: Inference backend, "torch", "onnx" or "onnx-int8"
+                     (default EMBEDDING_BACKEND, see onnx_backend)
         """
+        backend = backend or settings.EMBEDDING_BACKEND
+        if backend not in onnx_backend.BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {onnx_backend.BACKENDS}")
+        self.model_name = model_name
+        self.backend = backend
+        # transformers and torch are imported on first use, keeping them out of app startup
+        from transformers import AutoTokenizer
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
-        self.model.eval()  # Set to evaluation mode
+        self._model = None
+        self._encoder = None
+        self._load_lock = threading.RLock()
+        self.load_seconds: Optional[float] = None
+        self.max_length = 512
+        self.max_batch_tokens = max_batch_tokens or settings.EMBEDDING_BATCH_TOKENS
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_MAX_BATCH_SIZE
+        self.cache = cache or get_embedding_cache()
+        self.query_cache = QueryEmbeddingCache() if settings.QUERY_CACHE_MAX_ENTRIES > 0 else None
+        self.reducer: Optional[PCAReducer] = load_reducer(model_name)
         
+    @property
+    def model(self):
+        """The PyTorch model weights, loaded on first access."""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from transformers import AutoModel
+                    model = AutoModel.from_pretrained(self.model_name)
+                    model.eval()  # Set to evaluation mode
+                    self._model = model
+        return self._model
+
+    @property
+    def encoder(self):
+        """
+        What runs inference: the torch model or an `onnx_backend.OnnxEncoder`,
+        loaded on first access. An ONNX backend that cannot be loaded falls
+        back to torch.
+        """
+        if self._encoder is None:
+            with self._load_lock:
+                if self._encoder is None:
+                    start = time.perf_counter()
+                    encoder = None
+                    if self.backend != "torch":
+                        encoder = onnx_backend.load_encoder(
+                            self.model_name, self.backend, lambda: self.model, self._encode_texts
+                        )
+                        if encoder is None:
+                            self.backend = "torch"
+                        else:
+                            # The export may have loaded the torch weights; they are not needed anymore
+                            self._model = None
+                    self._encoder = encoder or self.model
+                    self.load_seconds = time.perf_counter() - start
+        return self._encoder
+
+    @property
+    def cache_namespace(self) -> str:
+        """Model identity in the embedding cache; quantized or exported models embed slightly differently."""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}"
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the model weights are in memory."""
+        return self._encoder is not None
+
+    def load(self) -> "CodeEmbedder":
+        """Load the model weights now instead of on first use."""
+        self.encoder
+        return self
+
+    def prepare_backend(self) -> str:
+        """
+        Settle which backend runs inference without loading the torch weights.
+
+        An ONNX backend is exported and verified once (or falls back to
+        torch); torch needs no preparation.
+
+        Returns:
+            The backend in use
+        """
+        if self.backend != "torch":
+            self.encoder
+        return self.backend
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the model weights (0 until loaded)."""
+        encoder = self._encoder
+        if encoder is None:
+            return 0
+        if isinstance(encoder, onnx_backend.OnnxEncoder):
+            return encoder.memory_bytes()
+        tensors = list(encoder.parameters()) + list(encoder.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
     def _prepare_code(self, code: str, metadata: Dict = None) -> str:
         """
         Prepare code for embedding by cleaning and formatting.
@@ -62,43 +181,175 @@ class CodeEmbedder:
             return ' '.join(context) + ' ' + code
         return code
     
+    def content_key(self, code: str, metadata: Dict = None) -> str:
+        """
+        Content address of a snippet: the hash of the exact text the model
+        reads, so snippets with equal keys have equal embeddings.
+        """
+        return self._text_key(self._prepare_code(code, metadata))
+
+    def _text_key(self, text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
     def _generate_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for a given text."""
-        # Prepare input
-        inputs = self.tokenizer(
-            text,
-            padding=True,
-            truncation=True,
-            max_length=512,
-            return_tensors="pt"
-        )
+        return self._generate_embeddings([text])[0]
+
+    def _make_batches(self, order: List[int], lengths: List[int]) -> List[List[int]]:
+        """
+        Group text indices (sorted by token length) into batches under the token budget.
         
-        # Generate embeddings
+        Since `order` is ascending by length, the last text added to a batch is
+        its longest one and determines the padded size of the whole batch.
+        """
+        batches = []
+        batch = []
+        for idx in order:
+            padded_tokens = (len(batch) + 1) * lengths[idx]
+            if batch and (padded_tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                batches.append(batch)
+                batch = []
+            batch.append(idx)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _generate_embeddings(self, texts: List[str], pool=None) -> np.ndarray:
+        """
+        Generate normalized embeddings for many texts at once.
+        
+        Texts are tokenized once, sorted by token length and packed into padded
+        batches under `max_batch_tokens`, so similar-length inputs share a forward
+        pass and little compute is spent on padding. With a parallel
+        `pool` (see embedding_pool), the batches run in its worker processes.
+        
+        Returns:
+            Array of shape (len(texts), hidden_size), in the order of `texts`
+        """
+        if not texts:
+            return np.zeros((0, settings.EMBEDDING_DIMENSION), dtype=np.float32)
+        embeddings = None
+        input_ids = self.tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.max_length
+        )["input_ids"]
+        lengths = [len(ids) for ids in input_ids]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+        batches = self._make_batches(order, lengths)
+        batch_ids = [[input_ids[i] for i in batch] for batch in batches]
+        if pool is not None and pool.parallel:
+            outputs = pool.map(batch_ids)
+        else:
+            encoder = self.encoder
+            outputs = (self._forward(encoder, ids) for ids in batch_ids)
+        for batch, batch_embeddings in zip(batches, outputs):
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+            # Normalize the embeddings
+            norms = np.linalg.norm(batch_embeddings, axis=1, keepdims=True)
+            embeddings[batch] = batch_embeddings / np.maximum(norms, 1e-12)
+        return embeddings
+
+    def _forward(self, encoder, input_ids: List[List[int]]) -> np.ndarray:
+        """Unnormalized [CLS] vectors of one batch, from a torch model or an ONNX encoder."""
+        if isinstance(encoder, onnx_backend.OnnxEncoder):
+            return encoder(self.tokenizer.pad({"input_ids": input_ids}, padding=True, return_tensors="np"))
+        import torch
+        inputs = self.tokenizer.pad({"input_ids": input_ids}, padding=True, return_tensors="pt")
         with torch.no_grad():
-            outputs = self.model(**inputs)
+            outputs = encoder(**inputs)
             # Use [CLS] token embedding as the sentence embedding
-            embeddings = outputs.last_hidden_state[:, 0, :].numpy()
-            
-        # Normalize the embedding
-        embedding = embeddings[0]  # Get the first (and only) embedding
-        embedding = embedding / np.linalg.norm(embedding)
-        
-        return embedding
+            return outputs.last_hidden_state[:, 0, :].numpy()
+
+    def _encode_texts(self, encoder, texts: List[str]) -> np.ndarray:
+        """Unnormalized [CLS] vectors of a few texts in one batch (used to compare backends)."""
+        input_ids = self.tokenizer(texts, truncation=True, max_length=self.max_length)["input_ids"]
+        return self._forward(encoder, input_ids)
     
+    def _generate_cached(self, texts: List[str], pool=None) -> np.ndarray:
+        """`_generate_embeddings`, running the model only for texts missing from the cache."""
+        if self.cache is None:
+            return self._generate_embeddings(texts, pool)
+        keys = [self._text_key(text) for text in texts]
+        cached = self.cache.get_many(self.cache_namespace, keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if not missing:
+            # Fully cached: the model is not needed, so it is not loaded
+            return np.stack([cached[key] for key in keys]) if keys else self._generate_embeddings([])
+        computed = self._generate_embeddings([texts[i] for i in missing], pool)
+        # Read after computing: a failed ONNX load switches the namespace back to torch
+        self.cache.put_many(self.cache_namespace, {keys[i]: embedding for i, embedding in zip(missing, computed)})
+        embeddings = np.zeros((len(texts), computed.shape[1]), dtype=np.float32)
+        for i, key in enumerate(keys):
+            if key in cached:
+                embeddings[i] = cached[key]
+        embeddings[missing] = computed
+        return embeddings
+
+    def _reduce(self, embeddings: np.ndarray) -> np.ndarray:
+        """Embeddings in the reduced space of the fitted PCA, if any."""
+        if self.reducer is None or not len(embeddings):
+            return embeddings
+        return self.reducer.transform(embeddings)
+
     def embed_code(self, code: str, metadata: Dict = None) -> np.ndarray:
         """Generate embedding for a code snippet with context."""
         prepared_code = self._prepare_code(code, metadata)
-        return self._generate_embedding(prepared_code)
+        return self._reduce(self._generate_cached([prepared_code]))[0]
+
+    def embed_code_batch(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict]] = None,
+        pool=None,
+        reduce: bool = True
+    ) -> np.ndarray:
+        """
+        Generate embeddings for many code snippets using length-bucketed batches.
+        Snippets found in the embedding cache skip the model.
+        
+        Args:
+            texts: Code snippets to embed
+            metadatas: Optional metadata per snippet (see `_prepare_code`)
+            pool: Optional EmbeddingPool to run the model batches in
+            reduce: Project onto the fitted PCA, if any (False returns full vectors)
+            
+        Returns:
+            Array of shape (len(texts), hidden_size or the reduced dimensions)
+        """
+        if metadatas is None:
+            metadatas = [None] * len(texts)
+        prepared = [self._prepare_code(text, metadata) for text, metadata in zip(texts, metadatas)]
+        embeddings = self._generate_cached(prepared, pool)
+        return self._reduce(embeddings) if reduce else embeddings
     
     def embed_query(self, query: str) -> np.ndarray:
         """Generate embedding for a natural language query."""
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for many natural language queries in batched forward passes.
+        Queries found in the query cache skip the model.
+        """
+        queries = [QueryEmbeddingCache.normalize(query) for query in queries]
+        if self.query_cache is None:
+            return self._reduce(self._embed_queries(queries))
+        cached = self.query_cache.get_many(self.cache_namespace, queries)
+        missing = list(dict.fromkeys(query for query in queries if query not in cached))
+        if missing:
+            computed = self._embed_queries(missing)
+            fresh = dict(zip(missing, computed))
+            self.query_cache.put_many(self.cache_namespace, fresh)
+            cached.update(fresh)
+        return self._reduce(np.stack([cached[query] for query in queries])) if queries else self._embed_queries([])
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
         # Add context to make the query more code-aware
-        enhanced_query = f"Find code that: {query}"
-        return self._generate_embedding(enhanced_query)
+        enhanced_queries = [f"Find code that: {query}" for query in queries]
+        return self._generate_embeddings(enhanced_queries)
     
     def compute_similarity(self, query_embedding: np.ndarray, code_embedding: np.ndarray) -> float:
         """Compute cosine similarity between query and code embeddings."""
         return float(np.dot(query_embedding, code_embedding))
-
-# Create a singleton instance
-code_embedder = CodeEmbedder() 
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+Embedding Cache Service
+
+This service keeps computed embeddings on disk so that re-indexing unchanged
+code (after clearing the index, changing the chunker or a crash) costs almost
+no model time. Entries are keyed by the embedding model and the hash of the
+exact text the model reads, stored as blobs in a SQLite file under `.devflow/`
+(float32, or float16 / int8 with EMBEDDING_CACHE_DTYPE), and evicted least
+recently used first once the cache holds EMBEDDING_CACHE_MAX_ENTRIES vectors.
+
+Query embeddings are short-lived and repeat a lot (the extension re-runs its
+searches, /answer follows /search), so they get a small in-memory LRU with a
+TTL instead, see QueryEmbeddingCache.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import get_settings
+from app.core.utils import get_workspace_root
+
+settings = get_settings()
+logger = logging.getLogger("devflow")
+
+# Keys looked up or written per statement, under SQLite's bound-parameter limit
+_SLICE = 500
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+def encode_vector(vector: np.ndarray, dtype: str) -> bytes:
+    """
+    Serialize a vector at the given precision. int8 stores a float32 scale
+    followed by the values scaled to [-127, 127].
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    if dtype == "float16":
+        return vector.astype(np.float16).tobytes()
+    if dtype == "int8":
+        scale = np.float32(max(float(np.abs(vector).max()), 1e-12) / 127)
+        return scale.tobytes() + np.round(vector / scale).astype(np.int8).tobytes()
+    return vector.tobytes()
+
+def decode_vector(blob: bytes, dtype: str) -> np.ndarray:
+    """The float32 vector serialized by `encode_vector`."""
+    if dtype == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if dtype == "int8":
+        scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+    return np.frombuffer(blob, dtype=np.float32)
+
+class EmbeddingCache:
+    """Persistent (model, text hash) -> float32 vector store with LRU eviction."""
+
+    def __init__(self, path: str, max_entries: Optional[int] = None, dtype: Optional[str] = None):
+        """
+        Args:
+            path: SQLite file holding the cache (created if missing)
+            max_entries: Vectors kept before the least recently used are evicted
+                         (default EMBEDDING_CACHE_MAX_ENTRIES)
+            dtype: Precision new vectors are stored at, see STORAGE_DTYPES
+                   (default EMBEDDING_CACHE_DTYPE); entries keep the precision
+                   they were written with
+        """
+        self.path = path
+        self.max_entries = max_entries or settings.EMBEDDING_CACHE_MAX_ENTRIES
+        self.dtype = dtype or settings.EMBEDDING_CACHE_DTYPE
+        if self.dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown embedding cache dtype {self.dtype!r}, expected one of {STORAGE_DTYPES}")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One connection shared by every thread, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, used_at REAL NOT NULL, "
+            "dtype TEXT NOT NULL DEFAULT 'float32', PRIMARY KEY (model, key))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "dtype" not in columns:
+            # Caches written before the precision was configurable hold float32 vectors
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN dtype TEXT NOT NULL DEFAULT 'float32'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_used_at ON embeddings (used_at)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors of the given keys (missing keys are left out), marking them as used."""
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), _SLICE):
+                batch = unique[start:start + _SLICE]
+                rows = self._conn.execute(
+                    f"SELECT key, vector, dtype FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                )
+                for key, vector, dtype in rows:
+                    found[key] = decode_vector(vector, dtype)
+            if found:
+                now = time.time()
+                # One transaction: in autocommit mode every row would be its own commit
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET used_at = ? WHERE model = ? AND key = ?",
+                        [(now, model, key) for key in found]
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]):
+        """Store vectors by key, then evict the least recently used ones beyond `max_entries`."""
+        if not vectors:
+            return
+        now = time.time()
+        rows = [
+            (model, key, encode_vector(vector, self.dtype), now, self.dtype)
+            for key, vector in vectors.items()
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model, key, vector, used_at, dtype) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._count += self._conn.total_changes - before
+                if self._count > self.max_entries:
+                    # Evict a tenth more than needed so eviction does not run on every write
+                    excess = self._count - self.max_entries + self.max_entries // 10
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE rowid IN "
+                        "(SELECT rowid FROM embeddings ORDER BY used_at LIMIT ?)",
+                        (excess,)
+                    )
+                    self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count, file size and hit/miss counters since startup."""
+        with self._lock:
+            size = sum(
+                os.path.getsize(self.path + suffix)
+                for suffix in ("", "-wal") if os.path.exists(self.path + suffix)
+            )
+            return {"entries": self._count, "bytes": size, "dtype": self.dtype, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        """Drop every cached vector."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._count = 0
+
+class QueryEmbeddingCache:
+    """In-memory (normalized query) -> vector LRU with a TTL, for one model at a time."""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        """
+        Args:
+            max_entries: Queries kept before the least recently used is dropped
+                         (default QUERY_CACHE_MAX_ENTRIES)
+            ttl: Seconds an entry stays valid (default QUERY_CACHE_TTL)
+        """
+        self.max_entries = max_entries or settings.QUERY_CACHE_MAX_ENTRIES
+        self.ttl = settings.QUERY_CACHE_TTL if ttl is None else ttl
+        self.hits = 0
+        self.misses = 0
+        self._model: Optional[str] = None
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """The form queries are cached (and embedded) under: whitespace collapsed and stripped."""
+        return ' '.join(query.split())
+
+    def _check_model(self, model: str):
+        # Vectors of another model (or backend) are meaningless now
+        if model != self._model:
+            self._entries.clear()
+            self._model = model
+
+    def get_many(self, model: str, queries: List[str]) -> Dict[str, np.ndarray]:
+        """Unexpired vectors of the given normalized queries (missing ones are left out)."""
+        found: Dict[str, np.ndarray] = {}
+        now = time.monotonic()
+        with self._lock:
+            self._check_model(model)
+            for query in dict.fromkeys(queries):
+                entry = self._entries.get(query)
+                if entry is not None and now - entry[0] > self.ttl:
+                    del self._entries[query]
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(query)
+                found[query] = entry[1]
+                self.hits += 1
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]):
+        """Store vectors by normalized query, dropping the least recently used beyond `max_entries`."""
+        now = time.monotonic()
+        with self._lock:
+            self._check_model(model)
+            for query, vector in vectors.items():
+                self._entries[query] = (now, vector)
+                self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count and hit/miss counters since startup."""
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+@lru_cache()
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """The process-wide cache in the workspace's `.devflow/`, or None if EMBEDDING_CACHE_ENABLED is off."""
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    path = os.path.join(get_workspace_root(), ".devflow", "embedding_cache.db")
+    try:
+        return EmbeddingCache(path)
+    except sqlite3.Error as e:
+        logger.warning(f"Embedding cache unavailable at {path}: {e}")
+        return None
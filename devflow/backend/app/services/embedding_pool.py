@@ -0,0 +1,98 @@
+"""
+Embedding Pool Service
+
+This service runs the embedding model in worker processes during bulk
+indexing. One PyTorch (or ONNX Runtime) process does not scale across all the
+cores of a large host, so each worker owns a copy of the model with a pinned
+intra-op thread count (EMBEDDING_WORKER_THREADS) and EMBEDDING_WORKERS of them
+run side by side. The indexing process still tokenizes, sorts and batches the
+texts (see CodeEmbedder); only token-ID batches go to the workers and float32
+[CLS] vectors come back.
+
+Workers are spawned rather than forked: forking a process whose PyTorch
+thread pools are already running can deadlock the children. Importing the app
+in a spawned worker is cheap since model weights load lazily.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+import numpy as np
+from app.core.config import get_settings
+from app.services.embedder import CodeEmbedder
+
+settings = get_settings()
+logger = logging.getLogger("devflow")
+
+# Embedder owned by the current worker process, created by the pool initializer
+_worker_embedder: Optional[CodeEmbedder] = None
+
+def _init_worker(model_name: str, backend: str, threads: int):
+    """Pool initializer: pin the thread count, then load one model per worker process."""
+    global _worker_embedder
+    import torch
+    from app.services import onnx_backend
+    torch.set_num_threads(threads)
+    onnx_backend.set_intra_op_threads(threads)
+    _worker_embedder = CodeEmbedder(model_name, backend=backend).load()
+
+def _forward_in_worker(input_ids: List[List[int]]) -> np.ndarray:
+    return _worker_embedder._forward(_worker_embedder.encoder, input_ids).astype(np.float32)
+
+class EmbeddingPool:
+    """Process pool running the embedding model, created on first use and reused across runs."""
+
+    def __init__(self, workers: Optional[int] = None, threads: Optional[int] = None, embedder: Optional[CodeEmbedder] = None):
+        """
+        Args:
+            workers: Number of worker processes (default EMBEDDING_WORKERS; 0 = as many
+                     as fit the cores at `threads` each); 1 embeds in the calling process
+            threads: Intra-op threads per worker (default EMBEDDING_WORKER_THREADS;
+                     0 = cores divided by workers)
+            embedder: Embedder whose model and backend the workers load
+                      (default: the shared one, see model_registry)
+        """
+        cores = os.cpu_count() or 1
+        threads = threads or settings.EMBEDDING_WORKER_THREADS
+        self.workers = workers or settings.EMBEDDING_WORKERS or max(1, cores // (threads or 4))
+        self.threads = threads or max(1, cores // self.workers)
+        self._embedder = embedder
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def parallel(self) -> bool:
+        """Whether batches go to worker processes (otherwise the caller embeds in-process)."""
+        return self.workers > 1
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            embedder = self._embedder
+            if embedder is None:
+                from app.services.model_registry import get_embedder
+                embedder = get_embedder()
+            # Settles the backend first: an ONNX export happens once, here, not in every
+            # worker, while torch weights are only loaded by the workers
+            embedder.prepare_backend()
+            logger.info(
+                f"Starting {self.workers} embedding workers ({embedder.model_name}, "
+                f"{embedder.backend}, {self.threads} threads each)"
+            )
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(embedder.model_name, embedder.backend, self.threads)
+            )
+        return self._executor
+
+    def map(self, batches: List[List[List[int]]]) -> Iterator[np.ndarray]:
+        """Unnormalized [CLS] vectors of each token-ID batch, computed across workers, in input order."""
+        return self._get_executor().map(_forward_in_worker, batches)
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,265 @@
+"""
+File Watcher Service
+
+This service keeps the index fresh while files are edited. It watches the
+workspace with inotify on Linux (falling back to polling elsewhere or when
+inotify is unavailable), coalesces bursts of save events within a debounce
+window and hands each batch of touched paths to a callback, which re-indexes
+just those files. Directories and files the ignore files exclude (see
+repo_walker) are neither watched nor reported.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import queue
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+from app.core.config import get_settings
+from app.services.repo_walker import IGNORE_FILES, IgnoreMatcher
+
+settings = get_settings()
+logger = logging.getLogger("devflow")
+
+# inotify event masks (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Marker queued when events were lost and the whole tree must be rescanned
+RESCAN = object()
+
+class _InotifyBackend:
+    """Recursive inotify watches, one per directory, added as directories appear."""
+
+    name = "inotify"
+
+    def __init__(self, root: str, events: queue.Queue, ignores: IgnoreMatcher):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._root = root
+        self._events = events
+        self._ignores = ignores
+        self._watches: Dict[int, str] = {}
+        try:
+            for directory in ignores.walk_dirs():
+                self._add_watch(directory)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+            if err != errno.ENOENT:
+                logger.warning(f"Cannot watch {directory}: {os.strerror(err)}")
+            return
+        self._watches[wd] = directory
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            ready, _, _ = select.select([self._fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            self._dispatch(data)
+
+    def _dispatch(self, data: bytes):
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self._events.put(RESCAN)
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if self._ignores.is_ignored_path(path):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Watch the new tree and report files written before the watch existed
+                    try:
+                        for new_dir in self._ignores.walk_dirs(start=path):
+                            self._add_watch(new_dir)
+                        for file_path in self._ignores.walk_files(start=path):
+                            self._events.put(file_path)
+                    except OSError as e:
+                        logger.warning(f"Cannot watch new directory {path}: {e}")
+                    continue
+            self._events.put(path)
+
+    def close(self):
+        os.close(self._fd)
+
+class _PollingBackend:
+    """Portable fallback that diffs (mtime, size) snapshots of the tree."""
+
+    name = "polling"
+
+    def __init__(self, root: str, events: queue.Queue, ignores: IgnoreMatcher, interval: float):
+        self._root = root
+        self._events = events
+        self._ignores = ignores
+        self._interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for file_path in self._ignores.walk_files():
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def run(self, stop: threading.Event):
+        while not stop.wait(self._interval):
+            snapshot = self._scan()
+            for path in snapshot.keys() | self._snapshot.keys():
+                if snapshot.get(path) != self._snapshot.get(path):
+                    self._events.put(path)
+            self._snapshot = snapshot
+
+    def close(self):
+        pass
+
+class FileWatcher:
+    """Watches a directory tree and reports touched paths in debounced batches."""
+
+    def __init__(
+        self,
+        root: str,
+        on_change: Callable[[Optional[Set[str]]], None],
+        debounce: Optional[float] = None,
+        poll_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            root: Directory to watch
+            on_change: Called with the set of touched paths, or None when events
+                       were lost and the whole tree should be re-indexed
+            debounce: Seconds of quiet that close a batch (default WATCH_DEBOUNCE_MS)
+            poll_interval: Scan interval of the polling fallback (default WATCH_POLL_INTERVAL)
+        """
+        self.root = os.path.abspath(root)
+        self.on_change = on_change
+        self.debounce = debounce if debounce is not None else settings.WATCH_DEBOUNCE_MS / 1000
+        self.poll_interval = poll_interval or settings.WATCH_POLL_INTERVAL
+        self._events: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        self._backend = None
+        self._ignores = IgnoreMatcher(self.root)
+        self.batches = 0
+        self.last_batch_at: Optional[float] = None
+        self.last_batch_size = 0
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        try:
+            self._backend = _InotifyBackend(self.root, self._events, self._ignores)
+        except OSError as e:
+            logger.warning(f"inotify unavailable ({e}); falling back to polling every {self.poll_interval}s")
+            self._backend = _PollingBackend(self.root, self._events, self._ignores, self.poll_interval)
+        self._threads = [
+            threading.Thread(target=self._backend.run, args=(self._stop,), name="devflow-watch", daemon=True),
+            threading.Thread(target=self._coalesce, name="devflow-watch-batch", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.warning(f"👀 Watching {self.root} for changes ({self._backend.name})")
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self._backend is not None:
+            self._backend.close()
+            self._backend = None
+
+    def _coalesce(self):
+        """Collect events until the tree has been quiet for the debounce window, then flush."""
+        while not self._stop.is_set():
+            try:
+                first = self._events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = {first}
+            # Bound the wait so a file saved continuously is still picked up
+            deadline = time.monotonic() + self.debounce * 10
+            while time.monotonic() < deadline:
+                try:
+                    batch.add(self._events.get(timeout=self.debounce))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch: Set):
+        if any(path is not RESCAN and os.path.basename(path) in IGNORE_FILES for path in batch):
+            # Ignore rules changed; later batches see the new ones
+            self._ignores.reset()
+        paths = None if RESCAN in batch else {
+            path for path in batch if not self._ignores.is_ignored_path(path)
+        }
+        if paths is not None and not paths:
+            return
+        self.batches += 1
+        self.last_batch_at = time.time()
+        self.last_batch_size = len(paths) if paths is not None else 0
+        try:
+            self.on_change(paths)
+        except Exception as e:
+            logger.error(f"Error re-indexing changed files: {e}", exc_info=True)
+
+    def status(self) -> Dict:
+        return {
+            "root": self.root,
+            "running": self.running,
+            "backend": self._backend.name if self._backend else None,
+            "debounce_ms": int(self.debounce * 1000),
+            "batches": self.batches,
+            "last_batch_at": self.last_batch_at,
+            "last_batch_size": self.last_batch_size
+        }
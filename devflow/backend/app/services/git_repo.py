@@ -0,0 +1,102 @@
+"""
+Git Repository Service
+
+Thin wrapper around the local `git` command line used by the indexer to learn
+which files changed since the last indexed commit, without walking, stat-ing
+or hashing the whole working tree.
+"""
+
+import hashlib
+import logging
+import os
+import subprocess
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger("devflow")
+
+class GitRepo:
+    """A local git working tree."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @classmethod
+    def discover(cls, path: str) -> Optional["GitRepo"]:
+        """Return the repository containing `path`, or None if it is not in one (or git is missing)."""
+        try:
+            result = subprocess.run(
+                ["git", "-C", path, "rev-parse", "--is-inside-work-tree", "--show-cdup"],
+                capture_output=True,
+                check=True
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        lines = os.fsdecode(result.stdout).splitlines()
+        if not lines or lines[0] != "true":
+            return None
+        # Resolve the top level relative to `path` (not via realpath) so paths
+        # stay in the same form as the ones the indexer stores
+        cdup = lines[1] if len(lines) > 1 else ""
+        return cls(os.path.normpath(os.path.join(path, cdup)))
+
+    def _git(self, *args: str) -> bytes:
+        return subprocess.run(
+            ["git", "-C", self.root, *args],
+            capture_output=True,
+            check=True
+        ).stdout
+
+    def _paths(self, output: bytes) -> List[str]:
+        """Absolute paths from NUL-separated, repository-relative git output."""
+        return [os.path.join(self.root, os.fsdecode(p)) for p in output.split(b"\0") if p]
+
+    def head(self) -> Optional[str]:
+        """SHA of HEAD, or None for a repository without commits."""
+        try:
+            return self._git("rev-parse", "--verify", "--quiet", "HEAD").decode().strip() or None
+        except subprocess.CalledProcessError:
+            return None
+
+    def has_commit(self, sha: str) -> bool:
+        """Whether `sha` still names a commit (it may have been garbage-collected after a rebase)."""
+        try:
+            self._git("cat-file", "-e", f"{sha}^{{commit}}")
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    def changed_since(self, commit: str) -> Set[str]:
+        """Paths added, modified or deleted between `commit` and HEAD."""
+        return set(self._paths(self._git("diff", "--name-only", "--no-renames", "-z", commit, "HEAD", "--")))
+
+    def blob_shas(self) -> Dict[str, str]:
+        """
+        Blob object ID of every tracked file, read from the git index without
+        touching file contents. Only valid for files that are not dirty.
+        """
+        output = self._git("ls-files", "--stage", "-z")
+        blobs = {}
+        # Each entry is "<mode> <sha> <stage>\t<path>"; unmerged paths have stages 1-3
+        for entry in output.split(b"\0"):
+            if not entry:
+                continue
+            info, _, path = entry.partition(b"\t")
+            _, sha, stage = info.split(b" ")
+            if stage == b"0":
+                blobs[os.path.join(self.root, os.fsdecode(path))] = sha.decode()
+        return blobs
+
+    def dirty_paths(self) -> Set[str]:
+        """Paths whose working-tree content differs from HEAD, including untracked files."""
+        output = self._git("status", "--porcelain=v1", "-z", "--untracked-files=all", "--no-renames")
+        # Each entry is "XY <path>"
+        return {
+            os.path.join(self.root, os.fsdecode(entry[3:]))
+            for entry in output.split(b"\0") if len(entry) > 3
+        }
+
+def blob_sha(content) -> str:
+    """The object ID git gives `content`, a bytes-like buffer (as `git hash-object` computes it)."""
+    digest = hashlib.sha1(b"blob %d\0" % len(content))
+    digest.update(content)
+    return digest.hexdigest()
@@ -0,0 +1,157 @@
+"""
+Index Jobs Service
+
+This service runs repository indexing as background jobs. Each job gets an ID
+the client can poll for progress (files, chunks and embeddings done,
+throughput and ETA) and can be cancelled while it runs.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import get_settings
+
+settings = get_settings()
+
+class IndexJobCancelled(Exception):
+    """Raised inside a running job once cancellation has been requested."""
+
+class IndexJob:
+    """Progress and lifecycle of one indexing run."""
+
+    COUNTERS = ("files_total", "files_done", "files_skipped", "files_reused", "chunks_done", "embeddings_done")
+
+    def __init__(self, path: str):
+        self.id = str(uuid.uuid4())
+        self.path = path
+        self.status = "queued"  # queued -> running -> completed | failed | cancelled
+        self.created_at = datetime.now()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.counters = {name: 0 for name in self.COUNTERS}
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Request cancellation; the job stops at its next checkpoint."""
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        """Checkpoint called by the indexer between units of work."""
+        if self._cancel_event.is_set():
+            raise IndexJobCancelled(f"Index job {self.id} was cancelled")
+
+    def set(self, **counters: int):
+        with self._lock:
+            self.counters.update(counters)
+
+    def add(self, **counters: int):
+        with self._lock:
+            for name, value in counters.items():
+                self.counters[name] += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Snapshot of the job, including throughput and a files-based ETA."""
+        with self._lock:
+            counters = dict(self.counters)
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        files_per_second = counters["files_done"] / elapsed if elapsed > 0 else 0.0
+        embeddings_per_second = counters["embeddings_done"] / elapsed if elapsed > 0 else 0.0
+        eta_seconds = None
+        if self.status == "running" and files_per_second > 0:
+            remaining = max(counters["files_total"] - counters["files_done"], 0)
+            eta_seconds = round(remaining / files_per_second, 1)
+        return {
+            "job_id": self.id,
+            "path": self.path,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "elapsed_seconds": round(elapsed, 2),
+            **counters,
+            "files_per_second": round(files_per_second, 2),
+            "embeddings_per_second": round(embeddings_per_second, 2),
+            "eta_seconds": eta_seconds,
+            "result": self.result,
+            "error": self.error
+        }
+
+class IndexJobManager:
+    """Runs index jobs on a dedicated executor and keeps recent ones for polling."""
+
+    def __init__(self, max_workers: int = 1, history: Optional[int] = None):
+        """
+        Args:
+            max_workers: Jobs that may run at once; 1 queues jobs so runs never
+                         write to the same index concurrently
+            history: Number of jobs kept for polling (default INDEX_JOB_HISTORY)
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="devflow-index")
+        self._jobs: "OrderedDict[str, IndexJob]" = OrderedDict()
+        self._history = history or settings.INDEX_JOB_HISTORY
+        self._lock = threading.Lock()
+
+    def submit(self, path: str, run: Callable[[IndexJob], Dict[str, Any]]) -> IndexJob:
+        """
+        Queue `run(job)` and return the job immediately.
+
+        `run` reports progress through the job and calls `job.check_cancelled()`
+        between units of work; its return value becomes the job result.
+        """
+        job = IndexJob(path)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._executor.submit(self._run, job, run)
+        return job
+
+    def _run(self, job: IndexJob, run: Callable[[IndexJob], Dict[str, Any]]):
+        job.started_at = time.monotonic()
+        try:
+            job.check_cancelled()
+            job.status = "running"
+            job.result = run(job)
+            job.status = "completed"
+        except IndexJobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.monotonic()
+
+    def _evict(self):
+        """Forget the oldest finished jobs beyond the history limit."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(len(self._jobs) - self._history, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[IndexJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IndexJob]:
+        job = self._jobs.get(job_id)
+        if job:
+            job.cancel()
+        return job
+
+    def shutdown(self):
+        """Cancel outstanding jobs and stop the executor."""
+        for job in self.list():
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
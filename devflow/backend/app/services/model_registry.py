@@ -0,0 +1,87 @@
+"""
+Model Registry Service
+
+This service owns the embedding models of the process. Each model is created
+once, on first use or by a background warm-up at startup, and every service
+(indexer, vector store, API endpoints) shares that instance instead of loading
+its own copy of the weights.
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+from app.services.embedder import CodeEmbedder, DEFAULT_MODEL
+
+logger = logging.getLogger("devflow")
+
+class ModelRegistry:
+    """Process-wide, lazily populated map of model name -> CodeEmbedder."""
+
+    def __init__(self):
+        self._models: Dict[str, CodeEmbedder] = {}
+        self._lock = threading.Lock()
+        self._warmup: Optional[threading.Thread] = None
+
+    def get(self, model_name: Optional[str] = None) -> CodeEmbedder:
+        """
+        The shared embedder of a model, created on first request.
+        
+        Creating an embedder only loads its tokenizer; the weights follow on
+        the first embedding (or `warm_up`).
+        """
+        model_name = model_name or DEFAULT_MODEL
+        embedder = self._models.get(model_name)
+        if embedder is None:
+            with self._lock:
+                embedder = self._models.get(model_name)
+                if embedder is None:
+                    embedder = CodeEmbedder(model_name)
+                    self._models[model_name] = embedder
+        return embedder
+
+    def warm_up(self, model_names: Optional[Iterable[str]] = None) -> threading.Thread:
+        """
+        Load the given models (default: the default model) in a background thread.
+        
+        Returns the thread; calling again while a warm-up runs returns the running one.
+        """
+        with self._lock:
+            if self._warmup is not None and self._warmup.is_alive():
+                return self._warmup
+            names = list(model_names or [DEFAULT_MODEL])
+            self._warmup = threading.Thread(
+                target=self._load_all, args=(names,), name="model-warmup", daemon=True
+            )
+            self._warmup.start()
+            return self._warmup
+
+    def _load_all(self, model_names):
+        for name in model_names:
+            try:
+                embedder = self.get(name).load()
+                logger.info(
+                    f"Embedding model {name} loaded in {embedder.load_seconds:.1f}s "
+                    f"({embedder.memory_bytes() / 2**20:.0f} MiB)"
+                )
+            except Exception as e:
+                logger.error(f"Warming up embedding model {name} failed: {e}")
+
+    def memory_report(self) -> Dict[str, Dict]:
+        """Per registered model: its backend, whether its weights are loaded, their size and load time."""
+        with self._lock:
+            models = dict(self._models)
+        return {
+            name: {
+                "backend": embedder.backend,
+                "loaded": embedder.loaded,
+                "memory_bytes": embedder.memory_bytes(),
+                "load_seconds": embedder.load_seconds,
+            }
+            for name, embedder in models.items()
+        }
+
+model_registry = ModelRegistry()
+
+def get_embedder(model_name: Optional[str] = None) -> CodeEmbedder:
+    """The shared embedder of `model_name` (default: the default code model)."""
+    return model_registry.get(model_name)
@@ -0,0 +1,165 @@
+"""
+ONNX Inference Backend
+
+This module runs the embedding model with ONNX Runtime instead of PyTorch
+eager mode, which is markedly faster on CPU-only machines. The torch model is
+exported once per model (optionally with dynamic int8 weight quantization),
+checked against the torch embeddings on a fixed sample and cached under
+`.devflow/onnx/`; later runs load the cached file without touching the torch
+weights. onnxruntime (and onnx, for the export) are optional dependencies,
+imported only when an ONNX backend is selected: without them, or when the
+parity check fails, the embedder stays on torch.
+"""
+
+import logging
+import os
+import re
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from app.core.config import get_settings
+from app.core.utils import get_workspace_root
+
+settings = get_settings()
+logger = logging.getLogger("devflow")
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Intra-op threads of new sessions; 0 lets ONNX Runtime use every core
+_intra_op_threads = 0
+
+# Snippets the exported model must embed like the torch model does
+PARITY_SAMPLES = [
+    "def add(a, b):\n    return a + b",
+    "class UserRepository:\n    def find(self, user_id):\n        return self.db.get(user_id)",
+    "function debounce(fn, ms) { let t; return (...a) => { clearTimeout(t); t = setTimeout(() => fn(...a), ms); }; }",
+    "Find code that: parse a config file and fall back to defaults",
+    "for (int i = 0; i < n; i++) { sum += values[i]; }",
+]
+
+def set_intra_op_threads(threads: int):
+    """Thread count of sessions created from now on (set by embedding workers sharing the cores)."""
+    global _intra_op_threads
+    _intra_op_threads = threads
+
+def _onnxruntime():
+    """The onnxruntime module, or None if it is not installed."""
+    try:
+        import onnxruntime
+        return onnxruntime
+    except ImportError:
+        return None
+
+class OnnxEncoder:
+    """ONNX Runtime session returning the [CLS] vector of each input."""
+
+    def __init__(self, path: str):
+        ort = _onnxruntime()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = _intra_op_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(["embedding"], feed)[0]
+
+    def memory_bytes(self) -> int:
+        """Size of the model file, which the session holds in memory."""
+        return os.path.getsize(self.path)
+
+def model_path(model_name: str, backend: str) -> str:
+    """Cached export of `model_name` for `backend` in the workspace's `.devflow/onnx/`."""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "--", model_name)
+    filename = "model.int8.onnx" if backend == "onnx-int8" else "model.onnx"
+    return os.path.join(get_workspace_root(), ".devflow", "onnx", slug, filename)
+
+def export_model(model, path: str):
+    """Export a transformers encoder to ONNX with dynamic batch and sequence axes, emitting [CLS] only."""
+    import torch
+
+    class ClsHead(torch.nn.Module):
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, input_ids, attention_mask):
+            return self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state[:, 0, :]
+
+    dummy = torch.ones((1, 8), dtype=torch.long)
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"}}
+    with torch.no_grad():
+        torch.onnx.export(
+            ClsHead(model).eval(),
+            (dummy, dummy),
+            path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["embedding"],
+            dynamic_axes={**dynamic_axes, "embedding": {0: "batch"}},
+            opset_version=14,
+            do_constant_folding=True
+        )
+
+def quantize_model(source: str, target: str):
+    """Dynamic int8 quantization of the weights of an exported model."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+
+def parity(reference: Callable[[List[str]], np.ndarray], candidate: Callable[[List[str]], np.ndarray]) -> float:
+    """Lowest cosine similarity between the two encoders' embeddings of PARITY_SAMPLES."""
+    expected = reference(PARITY_SAMPLES)
+    actual = candidate(PARITY_SAMPLES)
+    expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    actual = actual / np.linalg.norm(actual, axis=1, keepdims=True)
+    return float(np.min(np.sum(expected * actual, axis=1)))
+
+def load_encoder(model_name: str, backend: str, model_loader: Callable, encode: Callable) -> Optional[OnnxEncoder]:
+    """
+    The ONNX encoder of a model, exporting and verifying it on first use.
+
+    Args:
+        model_name: Model to export (names the cache directory)
+        backend: "onnx" or "onnx-int8"
+        model_loader: Returns the torch model; only called when no export is cached
+        encode: encode(encoder, texts) -> [CLS] vectors, used for the parity check
+
+    Returns:
+        The encoder, or None if onnxruntime is missing or the export fails
+        or does not match the torch embeddings within EMBEDDING_ONNX_MIN_COSINE
+    """
+    if _onnxruntime() is None:
+        logger.warning(f"EMBEDDING_BACKEND={backend} needs onnxruntime; falling back to torch")
+        return None
+    path = model_path(model_name, backend)
+    if os.path.exists(path):
+        return OnnxEncoder(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under temporary names, so a cached file always passed the parity check
+    pending = path + ".pending"
+    unquantized = path + ".fp32.pending"
+    try:
+        model = model_loader()
+        if backend == "onnx-int8":
+            export_model(model, unquantized)
+            quantize_model(unquantized, pending)
+        else:
+            export_model(model, pending)
+        candidate = OnnxEncoder(pending)
+        similarity = parity(lambda texts: encode(model, texts), lambda texts: encode(candidate, texts))
+        if similarity < settings.EMBEDDING_ONNX_MIN_COSINE:
+            logger.warning(
+                f"ONNX export of {model_name} ({backend}) diverges from torch "
+                f"(min cosine {similarity:.4f}); falling back to torch"
+            )
+            return None
+        os.replace(pending, path)
+        logger.info(f"Exported {model_name} to {path} (parity min cosine {similarity:.4f})")
+        return OnnxEncoder(path)
+    except Exception as e:
+        logger.warning(f"ONNX export of {model_name} ({backend}) failed: {e}; falling back to torch")
+        return None
+    finally:
+        for temporary in (pending, unquantized):
+            if os.path.exists(temporary):
+                os.remove(temporary)
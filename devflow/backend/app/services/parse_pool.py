@@ -0,0 +1,145 @@
+"""
+Parse Pool Service
+
+This service fans tree-sitter parsing and chunking out to worker
+processes, so indexing a large repository uses every core instead of one.
+Each worker owns its own CodeParser and CodeChunker and sends back only the
+token-sized chunks the indexer embeds.
+
+Source travels as bytes and is never decoded as a whole: small files are read
+by the indexer and sent along, large ones are memory-mapped by the worker
+itself so their content is not copied between processes. Only the slices of
+the chunks that are emitted are decoded.
+
+Workers are spawned rather than forked, since the parent may be loading the
+embedding model (and starting its thread pools) at the same time. They only
+import the parser, the chunker and the grammars of the languages they see.
+"""
+
+import copy
+import mmap
+import os
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.config import get_settings
+from app.services.chunker import CodeChunker
+
+settings = get_settings()
+
+# (file_path, language, source); a None source means the worker maps the file itself
+ParseTask = Tuple[str, str, Optional[bytes]]
+
+# Files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD = 64 * 1024
+
+@contextmanager
+def open_source(file_path: str) -> Iterator[Any]:
+    """
+    A file's content as a read-only bytes-like buffer: bytes for small files,
+    an mmap for large ones (valid until the block exits).
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            yield f.read()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+# Chunker owned by the current worker process, created by the pool initializer
+_worker_chunker: Optional[CodeChunker] = None
+
+def _init_worker(tokenizer: Any):
+    """Pool initializer: build one CodeChunker (and CodeParser) per worker process."""
+    global _worker_chunker
+    _worker_chunker = CodeChunker(tokenizer=tokenizer)
+
+def parse_task(chunker: CodeChunker, task: ParseTask) -> Dict:
+    """
+    Parse one file and cut it into chunks that fit the embedding model.
+
+    Errors are returned rather than raised so one bad file cannot abort a
+    whole `Executor.map` run.
+
+    Returns:
+        Dictionary with file_path, language, chunks and stats (see
+        `CodeChunker.chunk_tree`), plus `error` if parsing failed
+    """
+    file_path, language, source = task
+    result = {'file_path': file_path, 'language': language, 'chunks': [], 'stats': {}}
+    try:
+        if source is not None:
+            result['chunks'], result['stats'] = _chunk(chunker, source, language)
+        else:
+            # Chunking must finish while the mapping is open: the tree reads from it
+            with open_source(file_path) as mapped:
+                result['chunks'], result['stats'] = _chunk(chunker, mapped, language)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+def _chunk(chunker: CodeChunker, source: Any, language: str) -> Tuple[List[Dict], Dict[str, int]]:
+    tree = chunker.parser.parse_code(source, language)
+    if not tree:
+        return [], {}
+    return chunker.chunk_tree(tree, source, language)
+
+def _parse_group_in_worker(tasks: List[ParseTask]) -> List[Dict]:
+    return [parse_task(_worker_chunker, task) for task in tasks]
+
+class ParsePool:
+    """Process pool that parses files in parallel, created on first use and reused across runs."""
+
+    def __init__(self, workers: Optional[int] = None, chunksize: Optional[int] = None, tokenizer: Any = None):
+        """
+        Args:
+            workers: Number of worker processes (default PARSE_WORKERS, 0 = one per core);
+                     1 parses in the calling process
+            chunksize: Number of files sent to a worker per round trip (default PARSE_CHUNKSIZE)
+            tokenizer: Tokenizer of the embedding model, used to size chunks
+                       (see CodeChunker); token counts are estimated without one
+        """
+        self.workers = workers or settings.PARSE_WORKERS or os.cpu_count() or 1
+        self.chunksize = chunksize or settings.PARSE_CHUNKSIZE
+        self.tokenizer = tokenizer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._local_chunker: Optional[CodeChunker] = None
+
+    def _get_local_chunker(self) -> CodeChunker:
+        if self._local_chunker is None:
+            # A private copy: fast tokenizers reject concurrent calls from the embedding thread
+            self._local_chunker = CodeChunker(tokenizer=copy.deepcopy(self.tokenizer))
+        return self._local_chunker
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Spawned like the embedding workers: forking while the model warm-up
+                # thread loads torch can deadlock the children
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.tokenizer,)
+            )
+        return self._executor
+
+    def submit(self, tasks: List[ParseTask]) -> Future:
+        """
+        Parse a group of tasks (ideally `chunksize` of them) in one worker round trip.
+
+        Returns:
+            Future resolving to the list of results, in task order
+        """
+        if self.workers <= 1:
+            future = Future()
+            chunker = self._get_local_chunker()
+            future.set_result([parse_task(chunker, task) for task in tasks])
+            return future
+        return self._get_executor().submit(_parse_group_in_worker, tasks)
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
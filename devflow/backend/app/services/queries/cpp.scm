@@ -0,0 +1,23 @@
+; Classes and structs with a body (not forward declarations)
+(class_specifier
+  name: (_) @name
+  body: (field_declaration_list)) @class
+
+(struct_specifier
+  name: (_) @name
+  body: (field_declaration_list)) @class
+
+; Function definitions, including ones returning pointers or references
+(function_definition
+  declarator: (function_declarator
+    declarator: (_) @name)) @function
+
+(function_definition
+  declarator: (pointer_declarator
+    declarator: (function_declarator
+      declarator: (_) @name))) @function
+
+(function_definition
+  declarator: (reference_declarator
+    (function_declarator
+      declarator: (_) @name))) @function
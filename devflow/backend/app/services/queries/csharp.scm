@@ -0,0 +1,19 @@
+; Types
+(class_declaration
+  name: (identifier) @name) @class
+
+(interface_declaration
+  name: (identifier) @name) @class
+
+(struct_declaration
+  name: (identifier) @name) @class
+
+(record_declaration
+  name: (identifier) @name) @class
+
+; Methods and constructors
+(method_declaration
+  name: (identifier) @name) @function
+
+(constructor_declaration
+  name: (identifier) @name) @function
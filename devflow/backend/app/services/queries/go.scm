@@ -0,0 +1,21 @@
+; Struct and interface types
+(type_declaration
+  (type_spec
+    name: (type_identifier) @name
+    type: [(struct_type) (interface_type)])) @class
+
+; Functions
+(function_declaration
+  name: (identifier) @name) @function
+
+; Methods, attached to their receiver type by name
+(method_declaration
+  receiver: (parameter_list
+    (parameter_declaration
+      type: [
+        (type_identifier) @receiver
+        (pointer_type (type_identifier) @receiver)
+        (generic_type type: (type_identifier) @receiver)
+        (pointer_type (generic_type type: (type_identifier) @receiver))
+      ]))
+  name: (field_identifier) @name) @method
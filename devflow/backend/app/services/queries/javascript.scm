@@ -0,0 +1,33 @@
+; Classes, including named class expressions
+(class_declaration
+  name: (identifier) @name) @class
+
+(class
+  name: (identifier) @name) @class
+
+; Function declarations and generators
+(function_declaration
+  name: (identifier) @name) @function
+
+(generator_function_declaration
+  name: (identifier) @name) @function
+
+; Class and object-literal methods
+(method_definition
+  name: [(property_identifier) (private_property_identifier)] @name) @function
+
+; const f = () => {} / const f = function () {}
+(lexical_declaration
+  (variable_declarator
+    name: (identifier) @name
+    value: [(arrow_function) (function_expression) (generator_function)])) @function
+
+(variable_declaration
+  (variable_declarator
+    name: (identifier) @name
+    value: [(arrow_function) (function_expression) (generator_function)])) @function
+
+; Class fields holding functions: handle = () => {}
+(field_definition
+  property: (property_identifier) @name
+  value: [(arrow_function) (function_expression)]) @function
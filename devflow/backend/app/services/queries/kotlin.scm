@@ -0,0 +1,10 @@
+; Classes, interfaces and objects
+(class_declaration
+  name: (identifier) @name) @class
+
+(object_declaration
+  name: (identifier) @name) @class
+
+; Functions (methods when declared in a class body)
+(function_declaration
+  name: (identifier) @name) @function
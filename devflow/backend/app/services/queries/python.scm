@@ -0,0 +1,6 @@
+; Functions (methods when nested directly in a class) and classes
+(class_definition
+  name: (identifier) @name) @class
+
+(function_definition
+  name: (identifier) @name) @function
@@ -0,0 +1,13 @@
+; Classes and modules
+(class
+  name: [(constant) (scope_resolution)] @name) @class
+
+(module
+  name: [(constant) (scope_resolution)] @name) @class
+
+; Instance and singleton methods (top-level defs are functions)
+(method
+  name: (_) @name) @function
+
+(singleton_method
+  name: (_) @name) @method
@@ -0,0 +1,104 @@
+"""
+Query Batcher Service
+
+This service sits between the API and the embedder. Concurrent requests that
+need an embedding (search queries, similar-code snippets) are collected for up
+to QUERY_BATCH_MAX_WAIT_MS or QUERY_BATCH_MAX_SIZE items and embedded in one
+forward pass on a worker thread, so the event loop stays free and a burst of
+requests costs about one model call instead of one each. While a batch runs,
+new requests keep collecting and go out as the next batch.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger("devflow")
+
+class QueryBatcher:
+    """Coalesces concurrent `embed` calls into batched calls of `embed_batch`."""
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], np.ndarray],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        name: str = "query"
+    ):
+        """
+        Args:
+            embed_batch: Embeds a list of texts, returning one row per text
+            max_batch_size: Texts per model call (default QUERY_BATCH_MAX_SIZE)
+            max_wait_ms: Time the first text of a batch waits for company
+                         (default QUERY_BATCH_MAX_WAIT_MS)
+            name: Names the worker thread
+        """
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size or settings.QUERY_BATCH_MAX_SIZE
+        self.max_wait = (settings.QUERY_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        # One thread: batches run one after another while the next one fills up
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"devflow-{name}-batch")
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = False
+        self.batches = 0
+        self.items = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embedding of `text`, computed together with concurrent callers."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None and not self._running:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        """Start a batch from the pending texts unless one is already running."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._running or not self._pending:
+            return
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        self._running = True
+        asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Identical texts in a batch are embedded once
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            embeddings = await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_batch, texts)
+            by_text: Dict[str, np.ndarray] = dict(zip(texts, embeddings))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+            self.batches += 1
+            self.items += len(batch)
+        except Exception as e:
+            logger.error(f"Batched embedding of {len(texts)} texts failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._running = False
+            # Requests that arrived meanwhile have waited long enough
+            self._flush()
+
+    def stats(self) -> Dict[str, float]:
+        """Batches run and texts embedded since startup."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -8,8 +8,8 @@ contextual code explanations and answers to natural language queries.
 
 from typing import List, Dict, Optional
 import os
+import numpy as np
 from openai import OpenAI
-from .embedder import CodeEmbedder
 from ..db.vector_store import VectorStore
 from app.core.config import get_settings
 
@@ -70,11 +70,8 @@ Answer:"""
         Returns:
             Dictionary containing the answer and relevant code references
         """
-        # Generate query embedding
-        query_embedding = self.embedder.embed_query(query)
-        
-        # Retrieve relevant code chunks
-        chunks, scores = self.vector_store.search(query_embedding, k=k)
+        # Retrieve relevant code chunks (the store embeds the query)
+        chunks, scores = self.vector_store.search(query, k=k)
         
         # Create prompt with context
         prompt = self._create_prompt(query, chunks)
@@ -160,14 +157,17 @@ Explanation:"""
         )
         return response.choices[0].message.content
 
-    def answer_query(self, query: str, k: int = 3, openai_key: str = None, openai_model: str = None, openai_token_limit: int = None) -> str:
+    def answer_query(self, query: str, k: int = 3, openai_key: str = None, openai_model: str = None, openai_token_limit: int = None, query_embedding: Optional[np.ndarray] = None) -> str:
         # Use provided key/model/token_limit or fallback to defaults
         client = self.client
         model = openai_model or self.model
         token_limit = openai_token_limit or 512
         if openai_key:
             client = OpenAI(api_key=openai_key)
-        results, scores = self.vector_store.search(query, k=k)
+        if query_embedding is not None:
+            results, scores = self.vector_store.search_by_vector(query_embedding, k=k)
+        else:
+            results, scores = self.vector_store.search(query, k=k)
         context = "\n\n".join([r.get("code", r.get("text", "")) for r in results])
         prompt = (
             f"You are an expert software engineer. Given the following code context and a user question, "
@@ -0,0 +1,252 @@
+"""
+Repository Walker Service
+
+This service decides which files in a workspace are worth indexing. It honors
+`.gitignore` and `.devflowignore` files (nested ones too, plus the ones above
+the walked directory up to the repository root and `.git/info/exclude`),
+prunes ignored directories before descending into them, and provides the size
+and binary-content guards the indexer applies before parsing a file.
+"""
+
+import logging
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger("devflow")
+
+# Never walked, whatever the ignore files say
+ALWAYS_IGNORED_DIRS = {'.git', '.hg', '.svn', '.devflow'}
+
+# Applied before the repository's own ignore files, which can re-include them with `!`
+DEFAULT_IGNORE_PATTERNS = [
+    'node_modules/', '__pycache__/', '.venv/', 'venv/', '.tox/', '.mypy_cache/', '.pytest_cache/',
+    'dist/', 'build/', '*.min.js', '*.bundle.js'
+]
+
+IGNORE_FILES = ('.gitignore', '.devflowignore')
+
+# Bytes sniffed for NUL characters to tell binary from text content
+BINARY_SNIFF_BYTES = 8192
+
+class _Rule:
+    """One compiled gitignore pattern."""
+
+    __slots__ = ("regex", "negate", "dir_only")
+
+    def __init__(self, regex: "re.Pattern", negate: bool, dir_only: bool):
+        self.regex = regex
+        self.negate = negate
+        self.dir_only = dir_only
+
+def _translate(pattern: str) -> str:
+    """Translate the glob part of a gitignore pattern to a regular expression."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == n:
+            out.append('/.*')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif pattern[i] == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                out.append(re.escape('['))
+                i += 1
+                continue
+            body = pattern[i + 1:end].replace('\\', '\\\\')
+            if body[0] in '!^':
+                body = '^' + body[1:]
+            out.append(f'[{body}]')
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(out)
+
+def compile_pattern(line: str) -> Optional[_Rule]:
+    """Compile one line of an ignore file; None for blank lines and comments."""
+    line = line.rstrip('\n\r')
+    if not line.endswith('\\ '):
+        line = line.rstrip()
+    if not line or line.startswith('#'):
+        return None
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    elif line.startswith('\\'):
+        # "\#" and "\!" match names starting with those characters
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # A slash anywhere but at the end anchors the pattern to the ignore file's directory
+    anchored = '/' in line
+    line = line.lstrip('/')
+    prefix = '^' if anchored else '^(?:.*/)?'
+    return _Rule(re.compile(prefix + _translate(line) + '$', re.DOTALL), negate, dir_only)
+
+def _read_rules(path: str) -> List[_Rule]:
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return [rule for rule in map(compile_pattern, f) if rule]
+    except OSError:
+        return []
+
+def _find_repo_root(path: str) -> Optional[str]:
+    current = path
+    while True:
+        if os.path.exists(os.path.join(current, '.git')):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+class IgnoreMatcher:
+    """Answers whether a path under `root` is ignored, loading ignore files lazily."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._rules: Dict[str, List[_Rule]] = {}
+        # Rules from directories above `root`, with the path of `root` relative to each
+        self._outer = self._load_outer()
+
+    def _load_outer(self) -> List[Tuple[str, List[_Rule]]]:
+        repo_root = _find_repo_root(self.root)
+        if repo_root is None:
+            return []
+        outer = []
+        current = self.root
+        while current != repo_root:
+            current = os.path.dirname(current)
+            rules = [rule for name in IGNORE_FILES for rule in _read_rules(os.path.join(current, name))]
+            if rules:
+                outer.append((os.path.relpath(self.root, current).replace(os.sep, '/'), rules))
+        exclude = _read_rules(os.path.join(repo_root, '.git', 'info', 'exclude'))
+        if exclude:
+            outer.append((os.path.relpath(self.root, repo_root).replace(os.sep, '/'), exclude))
+        # Lowest precedence first: info/exclude, then the outermost ignore files
+        return outer[::-1]
+
+    def reset(self):
+        """Forget loaded ignore files, e.g. after one of them changed."""
+        self._rules = {}
+        self._outer = self._load_outer()
+
+    def _rules_for(self, rel_dir: str) -> List[_Rule]:
+        rules = self._rules.get(rel_dir)
+        if rules is None:
+            directory = os.path.join(self.root, rel_dir) if rel_dir else self.root
+            rules = [rule for name in IGNORE_FILES for rule in _read_rules(os.path.join(directory, name))]
+            if not rel_dir:
+                rules = _DEFAULT_RULES + rules
+            self._rules[rel_dir] = rules
+        return rules
+
+    def _match(self, parts: List[str], is_dir: bool) -> bool:
+        """Apply every rule set that can see the path; the last matching rule wins."""
+        ignored = False
+        rel = '/'.join(parts)
+        for prefix, rules in self._outer:
+            ignored = _apply(rules, rel if prefix == '.' else f"{prefix}/{rel}", is_dir, ignored)
+        for depth in range(len(parts)):
+            ignored = _apply(self._rules_for('/'.join(parts[:depth])), '/'.join(parts[depth:]), is_dir, ignored)
+        return ignored
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Whether a path relative to `root` is ignored, by itself or through a parent directory."""
+        parts = [part for part in rel_path.replace(os.sep, '/').split('/') if part and part != '.']
+        if not parts:
+            return False
+        for depth in range(1, len(parts)):
+            if parts[depth - 1] in ALWAYS_IGNORED_DIRS or self._match(parts[:depth], True):
+                return True
+        if is_dir and parts[-1] in ALWAYS_IGNORED_DIRS:
+            return True
+        return self._match(parts, is_dir)
+
+    def is_ignored_path(self, path: str) -> bool:
+        """Like `is_ignored` for an absolute path; paths outside `root` are never ignored."""
+        rel = os.path.relpath(path, self.root)
+        if rel.startswith(os.pardir):
+            return False
+        return self.is_ignored(rel, os.path.isdir(path))
+
+    def walk_dirs(self, recursive: bool = True, start: Optional[str] = None) -> Iterator[str]:
+        """
+        Yield `root` (or `start`, a directory below it) and every directory
+        below that is not ignored, pruning as it goes.
+        """
+        rel_start = os.path.relpath(start, self.root).replace(os.sep, '/') if start else ''
+        stack = ['' if rel_start == '.' else rel_start]
+        while stack:
+            rel_dir = stack.pop()
+            yield os.path.join(self.root, rel_dir) if rel_dir else self.root
+            if not recursive:
+                return
+            for entry in _scandir(os.path.join(self.root, rel_dir)):
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False) and not self._is_ignored_child(rel_dir, rel, True):
+                    stack.append(rel)
+
+    def walk_files(self, recursive: bool = True, start: Optional[str] = None) -> Iterator[str]:
+        """Yield every file under `root` (or `start`) that is not ignored."""
+        for directory in self.walk_dirs(recursive, start):
+            rel_dir = os.path.relpath(directory, self.root).replace(os.sep, '/')
+            rel_dir = '' if rel_dir == '.' else rel_dir
+            for entry in _scandir(directory):
+                if not entry.is_file():
+                    continue
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if not self._is_ignored_child(rel_dir, rel, False):
+                    yield entry.path
+
+    def _is_ignored_child(self, rel_dir: str, rel: str, is_dir: bool) -> bool:
+        """`is_ignored` for an entry whose parent directory is known not to be ignored."""
+        if is_dir and os.path.basename(rel) in ALWAYS_IGNORED_DIRS:
+            return True
+        return self._match(rel.split('/'), is_dir)
+
+def _apply(rules: List[_Rule], rel: str, is_dir: bool, ignored: bool) -> bool:
+    for rule in rules:
+        if rule.dir_only and not is_dir:
+            continue
+        if rule.regex.match(rel):
+            ignored = not rule.negate
+    return ignored
+
+def _scandir(directory: str) -> List[os.DirEntry]:
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(entries, key=lambda entry: entry.name)
+    except OSError as e:
+        logger.warning(f"Cannot list {directory}: {e}")
+        return []
+
+_DEFAULT_RULES = [rule for rule in map(compile_pattern, DEFAULT_IGNORE_PATTERNS) if rule]
+
+def too_large(size: int) -> bool:
+    """Whether a file is over INDEX_MAX_FILE_BYTES (0 disables the limit)."""
+    return bool(settings.INDEX_MAX_FILE_BYTES) and size > settings.INDEX_MAX_FILE_BYTES
+
+def looks_binary(content: bytes) -> bool:
+    """Whether content is binary, judged by NUL bytes in its first BINARY_SNIFF_BYTES."""
+    return b'\0' in content[:BINARY_SNIFF_BYTES]
@@ -0,0 +1,62 @@
+"""
+Shared test setup.
+
+The metadata store opens its database under the workspace root when it is
+imported, so the tests get a throwaway workspace before any app module loads.
+"""
+
+import hashlib
+import os
+import tempfile
+
+os.environ.setdefault("WORKSPACE_ROOT", tempfile.mkdtemp(prefix="devflow-tests-"))
+
+import numpy as np
+import pytest
+
+class FakeEmbedder:
+    """
+    Deterministic stand-in for CodeEmbedder that needs no model: equal texts
+    get equal vectors, and a fitted PCA is applied like CodeEmbedder does.
+    """
+
+    model_name = "fake"
+    tokenizer = None
+    dims = 16
+
+    def __init__(self):
+        self.embedded = 0
+        self.reducer = None
+
+    def content_key(self, code, metadata=None):
+        metadata = metadata or {}
+        text = f"{metadata.get('type')} {metadata.get('name')} {' '.join(code.split())}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _vector(self, text):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        vector = np.random.default_rng(seed).normal(size=self.dims).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _reduce(self, vectors):
+        if self.reducer is None or not len(vectors):
+            return vectors
+        return self.reducer.transform(vectors)
+
+    def embed_code_batch(self, texts, metadatas=None, pool=None, reduce=True):
+        self.embedded += len(texts)
+        vectors = np.stack([self._vector(text) for text in texts]) if texts else np.zeros((0, self.dims), np.float32)
+        return self._reduce(vectors) if reduce else vectors
+
+    def embed_queries(self, queries):
+        return self._reduce(np.stack([self._vector(query) for query in queries]))
+
+@pytest.fixture
+def fake_embedder(monkeypatch):
+    """A FakeEmbedder the indexer and the vector store use instead of the shared embedder."""
+    from app.db import vector_store
+    from app.services import code_indexer
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(code_indexer, "get_embedder", lambda: embedder)
+    monkeypatch.setattr(vector_store, "get_embedder", lambda: embedder)
+    return embedder
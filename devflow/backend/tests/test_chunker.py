@@ -0,0 +1,113 @@
+"""Tests for the token-budget chunker."""
+
+import pytest
+from app.services.chunker import CHARS_PER_TOKEN, CodeChunker
+
+pytestmark = [pytest.mark.unit, pytest.mark.parser]
+
+SMALL = b'''import os
+import sys
+from collections import OrderedDict
+
+LIMIT = 10
+NAMES = OrderedDict(first="a", second="b")
+
+def add(a, b):
+    return a + b
+
+def sub(a, b):
+    return a - b
+'''
+
+def long_function(lines: int) -> bytes:
+    body = "".join(f"    total += value_{i} * {i}\n" for i in range(lines))
+    return f"def accumulate():\n    total = 0\n{body}    return total\n".encode()
+
+@pytest.fixture
+def chunker():
+    return CodeChunker(max_tokens=64, overlap_tokens=0)
+
+def test_small_functions_are_one_chunk_each(chunker):
+    chunks, stats = chunker.chunk_code(SMALL, "python")
+    functions = [chunk for chunk in chunks if chunk["type"] == "function"]
+    assert [(chunk["name"], chunk["part"]) for chunk in functions] == [("add", None), ("sub", None)]
+    assert functions[0]["code"] == "def add(a, b):\n    return a + b"
+    assert stats["split_elements"] == 0
+    assert stats["chunks"] == len(chunks)
+
+def test_module_code_between_elements_is_kept(chunker):
+    chunks, _ = chunker.chunk_code(SMALL, "python")
+    module = "".join(chunk["code"] for chunk in chunks if chunk["type"] == "module")
+    assert "import os" in module and "NAMES = OrderedDict" in module
+    assert "return a + b" not in module
+
+def test_large_function_is_split_under_the_budget(chunker):
+    code = long_function(80)
+    chunks, stats = chunker.chunk_code(code, "python")
+    parts = [chunk for chunk in chunks if chunk["name"] == "accumulate"]
+    assert len(parts) > 1
+    assert [chunk["part"] for chunk in parts] == list(range(len(parts)))
+    assert all(chunk["tokens"] <= chunker.max_tokens for chunk in parts)
+    assert stats["split_elements"] == 1
+    assert stats["truncated_chunks"] == 0
+    # Without overlap the parts cover the function once, in order
+    lines = [line.strip() for chunk in parts for line in chunk["code"].splitlines()]
+    assert lines == [line.strip() for line in code.decode().splitlines()]
+
+def test_overlap_repeats_context_between_parts():
+    chunker = CodeChunker(max_tokens=64, overlap_tokens=16)
+    chunks, _ = chunker.chunk_code(long_function(80), "python")
+    parts = [chunk for chunk in chunks if chunk["name"] == "accumulate"]
+    assert parts[1]["start_line"] <= parts[0]["end_line"]
+
+def test_token_estimate_without_tokenizer(chunker):
+    assert chunker.count_tokens(["abc   def", ""]) == [-(-len("abc def") // CHARS_PER_TOKEN), 0]
+
+def test_unsupported_language_falls_back_to_lines(chunker):
+    code = b"".join(b"line %d of some text\n" % i for i in range(100))
+    chunks, _ = chunker.chunk_code(code, "not-a-language")
+    assert chunks and all(chunk["type"] == "module" for chunk in chunks)
+    assert all(chunk["tokens"] <= chunker.max_tokens for chunk in chunks)
+    assert " ".join(chunk["code"] for chunk in chunks).split() == code.decode().split()
+
+def test_chunk_ids_are_unique(chunker):
+    chunks, _ = chunker.chunk_code(SMALL + long_function(80), "python")
+    assert len({chunk["chunk_id"] for chunk in chunks}) == len(chunks)
+
+CLASS = b'''class Repo:
+    """Stores users."""
+    table = "users"
+
+    def find(self, user_id):
+        """Look a user up."""
+        row = self.db.get(user_id)
+        return row
+
+    class Meta:
+        def describe(self):
+            return "meta"
+'''
+
+def test_class_is_embedded_as_skeleton(chunker):
+    chunks, _ = chunker.chunk_code(CLASS, "python")
+    skeleton = chunks[0]
+    assert (skeleton["type"], skeleton["name"]) == ("class", "Repo")
+    assert '"""Stores users."""' in skeleton["code"]
+    assert 'table = "users"' in skeleton["code"]
+    assert "def find(self, user_id):" in skeleton["code"]
+    assert '"""Look a user up."""' in skeleton["code"]
+    # Member bodies are chunks of their own
+    assert "self.db.get" not in skeleton["code"]
+    assert 'return "meta"' not in skeleton["code"]
+
+def test_skeleton_links_to_member_chunks(chunker):
+    chunks, _ = chunker.chunk_code(CLASS, "python")
+    by_name = {chunk["name"]: chunk for chunk in chunks if chunk["type"] != "module"}
+    repo, find, meta, describe = (by_name[name] for name in ("Repo", "find", "Meta", "describe"))
+    assert "self.db.get(user_id)" in find["code"]
+    assert find["type"] == "method" and find["parent_id"] == repo["chunk_id"]
+    assert meta["parent_id"] == repo["chunk_id"]
+    assert repo["method_ids"] == [find["chunk_id"], meta["chunk_id"]]
+    assert describe["parent_id"] == meta["chunk_id"]
+    assert meta["method_ids"] == [describe["chunk_id"]]
+    assert repo["parent_id"] is None
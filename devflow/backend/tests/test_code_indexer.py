@@ -0,0 +1,115 @@
+"""Tests for content-addressed deduplication and incremental indexing."""
+
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+from app.db import metadata_store
+from app.db.vector_store import VectorStore
+from app.services.code_indexer import CodeIndexer
+from app.services.parse_pool import ParsePool
+
+pytestmark = pytest.mark.integration
+
+SOURCE = '''def parse_tasks(lines):
+    """Split task lines into (name, priority) pairs."""
+    tasks = []
+    for line in lines:
+        name, _, priority = line.partition(":")
+        tasks.append((name.strip(), int(priority or 0)))
+    return tasks
+
+def render_tasks(tasks):
+    return "\\n".join(f"{name} ({priority})" for name, priority in tasks)
+'''
+
+@pytest.fixture
+def setup(fake_embedder, tmp_path):
+    metadata_store.clear()
+    store = VectorStore(chromadb.EphemeralClient())
+    store.clear()
+    indexer = CodeIndexer(store, ParsePool(workers=1))
+    embedder = fake_embedder
+    root = tmp_path / "repo"
+    (root / "vendor").mkdir(parents=True)
+    (root / "tasks.py").write_text(SOURCE)
+    (root / "vendor" / "tasks_copy.py").write_text(SOURCE)
+    return indexer, store, embedder, root
+
+def stored_ids(store):
+    return set(store.collection.get(include=[])["ids"])
+
+def referenced_ids():
+    ids = set()
+    for file in metadata_store.list_files():
+        ids.update(chunk["embedding_id"] for chunk in metadata_store.list_chunks(file["id"]))
+    return ids
+
+def test_identical_chunks_share_one_vector(setup):
+    indexer, store, embedder, root = setup
+    summary = indexer.index_codebase(str(root))
+    assert summary["total_files"] == 2
+    assert summary["total_chunks"] == 2 * summary["total_embeddings"]
+    assert summary["deduplicated_chunks"] == summary["total_embeddings"]
+    assert embedder.embedded == summary["total_embeddings"]
+    assert stored_ids(store) == referenced_ids()
+
+    results, _ = store.search("parse task lines", k=summary["total_embeddings"])
+    result = next(result for result in results if result["name"] == "parse_tasks")
+    assert sorted(location["file_path"] for location in result["locations"]) == sorted(
+        [str(root / "tasks.py"), str(root / "vendor" / "tasks_copy.py")]
+    )
+
+def test_incremental_index_embeds_only_changed_chunks(setup):
+    indexer, store, embedder, root = setup
+    first = indexer.index_codebase(str(root))
+
+    unchanged = indexer.index_codebase(str(root))
+    assert unchanged["skipped_files"] == 2
+    assert embedder.embedded == first["total_embeddings"]
+
+    copy = root / "vendor" / "tasks_copy.py"
+    copy.write_text(SOURCE.replace("return tasks", "return sorted(tasks)"))
+    edited = indexer.index_codebase(str(root))
+    assert edited["total_files"] == 1
+    # Only the edited function is new; the copy's other chunks reuse the shared vectors
+    assert embedder.embedded == first["total_embeddings"] + 1
+    assert len(stored_ids(store)) == first["total_embeddings"] + 1
+    assert stored_ids(store) == referenced_ids()
+
+    # The original's vectors are still shared with the copy, except its own parse_tasks
+    (root / "tasks.py").unlink()
+    indexer.index_codebase(str(root))
+    assert len(stored_ids(store)) == first["total_embeddings"]
+    assert stored_ids(store) == referenced_ids()
+
+def test_storage_failure_fails_the_run_and_is_retried(setup):
+    indexer, store, embedder, root = setup
+    indexer.index_codebase(str(root))
+    (root / "tasks.py").write_text(SOURCE + "\ndef extra():\n    return 1\n")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    store.add_vectors = fail
+    with pytest.raises(RuntimeError, match="disk full"):
+        indexer.index_codebase(str(root))
+    del store.add_vectors
+
+    retried = indexer.index_codebase(str(root))
+    assert retried["total_files"] == 1
+    results, _ = store.search("extra", k=20)
+    assert "extra" in {result["name"] for result in results}
+    assert stored_ids(store) == referenced_ids()
+
+def test_changed_files_outside_the_indexed_scope_are_ignored(setup):
+    indexer, store, embedder, root = setup
+    indexer.index_codebase(str(root), recursive=False, extensions=["py"])
+    assert [file["path"] for file in metadata_store.list_files()] == [str(root / "tasks.py")]
+
+    (root / "vendor" / "tasks_copy.py").write_text(SOURCE + "\ndef nested():\n    return 1\n")
+    (root / "app.js").write_text("function render() { return 1; }\n")
+    (root / "tasks.py").write_text(SOURCE + "\ndef extra():\n    return 1\n")
+    summary = indexer.index_files([str(root / "vendor" / "tasks_copy.py"), str(root / "app.js"), str(root / "tasks.py")])
+    assert summary["total_files"] == 1
+    assert [file["path"] for file in metadata_store.list_files()] == [str(root / "tasks.py")]
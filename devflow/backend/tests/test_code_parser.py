@@ -0,0 +1,96 @@
+"""Tests for element extraction in CodeParser (query packs and the cursor walk)."""
+
+import pytest
+from app.services.code_parser import CodeParser
+
+pytestmark = [pytest.mark.unit, pytest.mark.parser]
+
+PYTHON = b'''def f():
+    def inner():
+        pass
+
+@dec
+def g():
+    pass
+
+@dec
+class C:
+    @property
+    def m(self):
+        pass
+
+    def n(self):
+        class D:
+            def o(self):
+                pass
+        return D
+'''
+
+JAVASCRIPT = b'''function h() { function k() {} }
+export class B { m() {} }
+export function z() {}
+'''
+
+@pytest.fixture(scope="module")
+def parser():
+    return CodeParser()
+
+def summarize(elements):
+    """(type, name, parent name) of each element."""
+    return [
+        (kind, name, elements[parent][2] if parent is not None else None)
+        for _, kind, name, parent in elements
+    ]
+
+def cursor_elements(parser, code, language):
+    tree = parser.parse_code(code, language)
+    return list(parser._cursor_elements(tree, language, code))
+
+def test_cursor_walk_python_decorated_and_nested(parser):
+    assert summarize(cursor_elements(parser, PYTHON, "python")) == [
+        ("function", "f", None),
+        ("function", "inner", "f"),
+        ("function", "g", None),
+        ("class", "C", None),
+        ("method", "m", "C"),
+        ("method", "n", "C"),
+        ("class", "D", "n"),
+        ("method", "o", "D"),
+    ]
+
+def test_cursor_walk_javascript_exported(parser):
+    assert summarize(cursor_elements(parser, JAVASCRIPT, "javascript")) == [
+        ("function", "h", None),
+        ("function", "k", "h"),
+        ("class", "B", None),
+        ("method", "m", "B"),
+        ("function", "z", None),
+    ]
+
+@pytest.mark.parametrize("code, language", [(PYTHON, "python"), (JAVASCRIPT, "javascript")])
+def test_cursor_walk_matches_query_pack(parser, code, language):
+    tree = parser.parse_code(code, language)
+    from_query = parser.element_nodes(tree, code, language)
+    assert summarize(cursor_elements(parser, code, language)) == summarize(from_query)
+
+def test_extract_elements_parent_indices(parser):
+    tree = parser.parse_code(PYTHON, "python")
+    elements = parser.extract_elements(tree, PYTHON, "python")
+    by_name = {element["name"]: index for index, element in enumerate(elements)}
+    assert elements[by_name["g"]]["parent"] is None
+    assert elements[by_name["m"]]["parent"] == by_name["C"]
+    assert elements[by_name["m"]]["code"].startswith("def m(self):")
+
+def test_entry_points_accept_bytes_and_text(parser, tmp_path):
+    source = 'def f():\n    return "\u00e9"\n\nclass K:\n    def g(self):\n        pass\n'
+    path = tmp_path / "mod.py"
+    path.write_bytes(source.encode("utf-8"))
+    from_text = parser.extract_code_elements(source, "python")
+    from_bytes = parser.extract_code_elements(source.encode("utf-8"), "python")
+    assert from_text == from_bytes == parser.parse_file(path)
+    assert [f["name"] for f in from_bytes["function"]] == ["f"]
+    assert "\u00e9" in from_bytes["function"][0]["code"]
+
+    tree = parser.parse_code(source, "python")
+    assert [f["name"] for f in parser.extract_functions(tree, source.encode("utf-8"))] == ["f", "g"]
+    assert [c["name"] for c in parser.extract_classes(tree, source)] == ["K"]
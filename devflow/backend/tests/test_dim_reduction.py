@@ -0,0 +1,188 @@
+"""Tests for PCA dimension reduction and the vector store rebuild."""
+
+import numpy as np
+import pytest
+from app.services import dim_reduction
+from app.services.dim_reduction import PCAReducer, evaluate, load_reducer
+
+pytestmark = pytest.mark.ml
+
+def sample_vectors(n=200, dims=16, seed=0):
+    rng = np.random.default_rng(seed)
+    # Most of the variance in a few directions, like real embeddings
+    vectors = rng.normal(size=(n, 4)) @ rng.normal(size=(4, dims)) + 0.05 * rng.normal(size=(n, dims))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def test_fit_and_transform():
+    reducer = PCAReducer.fit(sample_vectors(), 4, "fake")
+    reduced = reducer.transform(sample_vectors(10, seed=1))
+    assert reducer.dims == 4
+    assert reduced.shape == (10, 4)
+    assert np.allclose(np.linalg.norm(reduced, axis=1), 1.0, atol=1e-5)
+    assert reducer.explained_variance > 0.9
+
+@pytest.mark.parametrize("dims, rows", [(0, 200), (16, 200), (8, 8)])
+def test_fit_rejects_bad_dimensions(dims, rows):
+    with pytest.raises(ValueError):
+        PCAReducer.fit(sample_vectors(rows), dims, "fake")
+
+def test_save_and_load(tmp_path, monkeypatch):
+    path = tmp_path / "dim_reduction.npz"
+    monkeypatch.setattr(dim_reduction, "reducer_path", lambda: str(path))
+    reducer = PCAReducer.fit(sample_vectors(), 4, "fake")
+    reducer.save(str(path))
+    loaded = load_reducer("fake")
+    assert np.allclose(loaded.components, reducer.components)
+    assert loaded.explained_variance == pytest.approx(reducer.explained_variance)
+    # A PCA fitted for another model does not apply
+    assert load_reducer("other-model") is None
+
+def test_evaluate_reports_every_storage_option():
+    vectors = sample_vectors()
+    report = evaluate(vectors, PCAReducer.fit(vectors, 4, "fake"))
+    assert set(report) == {f"{size}_{dtype}" for size in ("full", "reduced") for dtype in ("float32", "float16", "int8")}
+    assert report["full_float32"]["recall_at_10"] == 1.0
+    assert report["reduced_float32"]["dimensions"] == 4
+    assert report["reduced_int8"]["bytes_per_vector"] < report["full_float32"]["bytes_per_vector"]
+
+class TestRebuild:
+    """VectorStore.rebuild and CodeIndexer.reduce_dimensions against a Chroma client."""
+
+    @pytest.fixture
+    def store(self, fake_embedder, tmp_path, monkeypatch):
+        chromadb = pytest.importorskip("chromadb")
+        from app.db import metadata_store
+        from app.db.vector_store import VectorStore
+        from app.services import code_indexer
+        monkeypatch.setattr(code_indexer, "reducer_path", lambda: str(tmp_path / "dim_reduction.npz"))
+        metadata_store.clear()
+        store = VectorStore(chromadb.EphemeralClient())
+        store.clear()
+        texts = [f"def function_{i}(value):\n    return value * {i}" for i in range(40)]
+        store.add_vectors(texts, [{"type": "function", "name": f"function_{i}"} for i in range(40)], ids=[str(i) for i in range(40)])
+        store.archive.add(
+            ids=["archived"], embeddings=[fake_embedder._vector("archived")],
+            documents=["def archived(): pass"], metadatas=[{"type": "function", "name": "archived"}]
+        )
+        return store
+
+    def dims(self, collection):
+        return {len(vector) for vector in collection.get(include=["embeddings"])["embeddings"]}
+
+    def collection_names(self, store):
+        return sorted(getattr(collection, "name", collection) for collection in store.client.list_collections())
+
+    def test_rebuild_replaces_both_collections(self, store):
+        reducer = PCAReducer.fit(store.collection.get(include=["embeddings"])["embeddings"], 4, "fake")
+        rebuilt = store.rebuild(lambda texts, metadatas: reducer.transform(np.stack([np.zeros(16) + len(text) for text in texts])))
+        assert rebuilt == 41
+        assert self.dims(store.collection) == {4} and self.dims(store.archive) == {4}
+        assert store.collection.count() == 40 and store.archive.count() == 1
+        assert self.collection_names(store) == [store.COLLECTION_NAME, store.ARCHIVE_COLLECTION_NAME]
+
+    def test_failed_embedding_keeps_the_index(self, store):
+        def fail(texts, metadatas):
+            raise RuntimeError("model crashed")
+        with pytest.raises(RuntimeError):
+            store.rebuild(fail, page_size=10)
+        assert self.dims(store.collection) == {16} and store.collection.count() == 40
+        assert self.collection_names(store) == [store.COLLECTION_NAME, store.ARCHIVE_COLLECTION_NAME]
+
+    def test_failed_rename_restores_the_old_collections(self, store, monkeypatch):
+        collection_type = type(store.collection)
+        modify = collection_type.modify
+        live = {id(store.collection), id(store.archive)}
+
+        def failing_modify(collection, name=None, **kwargs):
+            # Renaming the rebuilt archive into place fails, after the main collection's swap
+            if name == store.ARCHIVE_COLLECTION_NAME and id(collection) not in live:
+                raise RuntimeError("rename failed")
+            return modify(collection, name=name, **kwargs)
+
+        monkeypatch.setattr(collection_type, "modify", failing_modify)
+        with pytest.raises(RuntimeError, match="rename failed"):
+            store.rebuild(lambda texts, metadatas: np.ones((len(texts), 4)) / 2)
+        monkeypatch.setattr(collection_type, "modify", modify)
+        assert self.collection_names(store) == [store.COLLECTION_NAME, store.ARCHIVE_COLLECTION_NAME]
+        assert self.dims(store.client.get_collection(store.COLLECTION_NAME)) == {16}
+        assert self.dims(store.client.get_collection(store.ARCHIVE_COLLECTION_NAME)) == {16}
+
+    def test_on_swap_runs_before_searches_switch(self, store):
+        seen = []
+        old = store.collection
+        store.rebuild(
+            lambda texts, metadatas: np.ones((len(texts), 4)) / 2,
+            on_swap=lambda: seen.append((store.collection is old, self.collection_names(store)))
+        )
+        assert seen == [(True, [store.COLLECTION_NAME, store.ARCHIVE_COLLECTION_NAME,
+                                f"{store.ARCHIVE_COLLECTION_NAME}_previous", f"{store.COLLECTION_NAME}_previous"])]
+        assert store.collection is not old
+
+    def test_failing_on_swap_rolls_back(self, store):
+        def fail():
+            raise RuntimeError("switch failed")
+        with pytest.raises(RuntimeError, match="switch failed"):
+            store.rebuild(lambda texts, metadatas: np.ones((len(texts), 4)) / 2, on_swap=fail)
+        assert self.collection_names(store) == [store.COLLECTION_NAME, store.ARCHIVE_COLLECTION_NAME]
+        assert self.dims(store.collection) == {16} and self.dims(store.archive) == {16}
+
+    def test_reduction_switches_with_the_collections(self, store, fake_embedder, monkeypatch):
+        from app.services.code_indexer import CodeIndexer
+        from app.services.parse_pool import ParsePool
+        indexer = CodeIndexer(store, ParsePool(workers=1))
+        rebuild = store.rebuild
+        seen = []
+
+        def observed_rebuild(embed, page_size=1000, on_swap=None):
+            def swap():
+                before = fake_embedder.reducer
+                on_swap()
+                seen.append((before, fake_embedder.reducer.dims, self.dims(store.collection)))
+            return rebuild(embed, page_size, swap)
+
+        monkeypatch.setattr(store, "rebuild", observed_rebuild)
+        indexer.reduce_dimensions(4, sample_size=100)
+        # Queries were still full-width until the swap, and the old collection was still searched
+        assert seen == [(None, 4, {16})]
+        assert self.dims(store.collection) == {4}
+
+    def test_interrupted_rename_is_undone_on_startup(self, store):
+        from app.db.vector_store import VectorStore
+        store.collection.modify(name=f"{store.COLLECTION_NAME}_previous")
+        store.client.get_or_create_collection(f"{store.COLLECTION_NAME}_rebuild")
+        recovered = VectorStore(store.client)
+        assert recovered.collection.count() == 40
+        assert self.collection_names(recovered) == [store.COLLECTION_NAME, store.ARCHIVE_COLLECTION_NAME]
+
+    def test_reduce_and_restore(self, store, fake_embedder, tmp_path):
+        from app.services.code_indexer import CodeIndexer
+        from app.services.parse_pool import ParsePool
+        indexer = CodeIndexer(store, ParsePool(workers=1))
+        report = indexer.reduce_dimensions(4, sample_size=100)
+        assert report["dimensions"] == 4 and report["rebuilt_vectors"] == 41
+        assert self.dims(store.collection) == {4} and self.dims(store.archive) == {4}
+        assert fake_embedder.reducer.dims == 4
+        assert (tmp_path / "dim_reduction.npz").exists()
+        results, _ = store.search("multiply a value", k=3)
+        assert len(results) == 3
+
+        report = indexer.reduce_dimensions(0, sample_size=100)
+        assert report["dimensions"] == 16
+        assert self.dims(store.collection) == {16}
+        assert fake_embedder.reducer is None
+        assert not (tmp_path / "dim_reduction.npz").exists()
+
+    def test_failed_rebuild_keeps_the_current_reduction(self, store, fake_embedder, tmp_path, monkeypatch):
+        from app.services.code_indexer import CodeIndexer
+        from app.services.parse_pool import ParsePool
+        indexer = CodeIndexer(store, ParsePool(workers=1))
+
+        def fail(embed, page_size=1000, on_swap=None):
+            raise RuntimeError("rebuild failed")
+
+        monkeypatch.setattr(store, "rebuild", fail)
+        with pytest.raises(RuntimeError):
+            indexer.reduce_dimensions(4, sample_size=100)
+        assert fake_embedder.reducer is None
+        assert not (tmp_path / "dim_reduction.npz").exists()
+        assert len(store.search("multiply a value", k=3)[0]) == 3
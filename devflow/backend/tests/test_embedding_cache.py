@@ -0,0 +1,89 @@
+"""Tests for the persistent embedding cache and the in-memory query cache."""
+
+import numpy as np
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache, QueryEmbeddingCache, decode_vector, encode_vector
+
+pytestmark = pytest.mark.unit
+
+def unit_vector(seed, dims=32):
+    vector = np.random.default_rng(seed).normal(size=dims).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 0.0), ("float16", 1e-3), ("int8", 1e-2)])
+def test_dtype_round_trip(tmp_path, dtype, tolerance):
+    vector = unit_vector(0)
+    decoded = decode_vector(encode_vector(vector, dtype), dtype)
+    assert decoded.dtype == np.float32
+    assert np.abs(decoded - vector).max() <= tolerance
+
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=10, dtype=dtype)
+    cache.put_many("model", {"k": vector})
+    assert np.abs(cache.get_many("model", ["k"])["k"] - vector).max() <= tolerance
+
+def test_entries_keep_the_precision_they_were_written_with(tmp_path):
+    path = str(tmp_path / "cache.db")
+    EmbeddingCache(path, max_entries=10, dtype="float32").put_many("model", {"k": unit_vector(1)})
+    reopened = EmbeddingCache(path, max_entries=10, dtype="int8")
+    assert np.array_equal(reopened.get_many("model", ["k"])["k"], unit_vector(1))
+
+def test_keys_are_scoped_by_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=10)
+    cache.put_many("a", {"k": unit_vector(2)})
+    assert cache.get_many("b", ["k"]) == {}
+    assert cache.stats()["misses"] == 1
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr("app.services.embedding_cache.time.time", lambda: next(clock))
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=10)
+    cache.put_many("model", {f"k{i}": unit_vector(i) for i in range(10)})
+    # Reading k0 makes it the most recently used
+    assert "k0" in cache.get_many("model", ["k0"])
+    cache.put_many("model", {"new": unit_vector(99)})
+    # One over the limit evicts one plus a tenth of the limit, oldest first
+    assert cache.stats()["entries"] == 9
+    remaining = cache.get_many("model", ["k0", "new"] + [f"k{i}" for i in range(1, 10)])
+    assert set(remaining) == {"k0", "new"} | {f"k{i}" for i in range(3, 10)}
+
+def test_marking_entries_used_is_one_commit(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=100)
+    cache.put_many("model", {f"k{i}": unit_vector(i) for i in range(20)})
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    assert len(cache.get_many("model", [f"k{i}" for i in range(20)])) == 20
+    assert statements.count("COMMIT") == 1
+
+class TestQueryEmbeddingCache:
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        now = [0.0]
+        monkeypatch.setattr("app.services.embedding_cache.time.monotonic", lambda: now[0])
+        return now
+
+    def test_entries_expire_after_the_ttl(self, clock):
+        cache = QueryEmbeddingCache(max_entries=10, ttl=60)
+        cache.put_many("model", {"sort a list": unit_vector(0)})
+        clock[0] = 60
+        assert set(cache.get_many("model", ["sort a list"])) == {"sort a list"}
+        clock[0] = 61
+        assert cache.get_many("model", ["sort a list"]) == {}
+        assert cache.stats() == {"entries": 0, "hits": 1, "misses": 1}
+
+    def test_least_recently_used_is_dropped(self, clock):
+        cache = QueryEmbeddingCache(max_entries=2, ttl=60)
+        cache.put_many("model", {"a": unit_vector(0), "b": unit_vector(1)})
+        cache.get_many("model", ["a"])
+        cache.put_many("model", {"c": unit_vector(2)})
+        assert set(cache.get_many("model", ["a", "b", "c"])) == {"a", "c"}
+
+    def test_model_change_invalidates_every_entry(self, clock):
+        cache = QueryEmbeddingCache(max_entries=10, ttl=60)
+        cache.put_many("model", {"a": unit_vector(0)})
+        assert cache.get_many("model@onnx", ["a"]) == {}
+        # Switching back does not bring the old vectors back either
+        assert cache.get_many("model", ["a"]) == {}
+
+    def test_queries_are_normalized(self):
+        assert QueryEmbeddingCache.normalize("  sort\n  a\tlist ") == "sort a list"
@@ -0,0 +1,61 @@
+"""Tests for the batching of file watcher events."""
+
+import queue
+import threading
+import time
+
+import pytest
+
+from app.services.file_watcher import RESCAN, FileWatcher
+
+pytestmark = pytest.mark.unit
+
+DEBOUNCE = 0.1
+
+@pytest.fixture
+def watcher(tmp_path):
+    (tmp_path / ".gitignore").write_text("build/\n")
+    batches = queue.Queue()
+    watcher = FileWatcher(str(tmp_path), batches.put, debounce=DEBOUNCE)
+    # Only the batching thread runs; the tests queue events as a backend would
+    thread = threading.Thread(target=watcher._coalesce, daemon=True)
+    thread.start()
+    yield watcher, batches
+    watcher._stop.set()
+    thread.join(timeout=5)
+
+def test_burst_of_events_is_one_batch(watcher, tmp_path):
+    watcher, batches = watcher
+    for _ in range(3):
+        for name in ("a.py", "b.py"):
+            watcher._events.put(str(tmp_path / name))
+        time.sleep(DEBOUNCE / 4)
+    assert batches.get(timeout=2) == {str(tmp_path / "a.py"), str(tmp_path / "b.py")}
+    assert batches.empty()
+    assert watcher.batches == 1 and watcher.last_batch_size == 2
+
+def test_quiet_period_closes_the_batch(watcher, tmp_path):
+    watcher, batches = watcher
+    watcher._events.put(str(tmp_path / "a.py"))
+    assert batches.get(timeout=2) == {str(tmp_path / "a.py")}
+    watcher._events.put(str(tmp_path / "b.py"))
+    assert batches.get(timeout=2) == {str(tmp_path / "b.py")}
+
+def test_continuous_events_are_flushed_after_the_bound(watcher, tmp_path):
+    watcher, batches = watcher
+    start = time.monotonic()
+    while batches.empty() and time.monotonic() - start < 5:
+        watcher._events.put(str(tmp_path / "a.py"))
+        time.sleep(DEBOUNCE / 4)
+    assert batches.get_nowait() == {str(tmp_path / "a.py")}
+    # The wait is bounded at ten debounce windows
+    assert time.monotonic() - start < DEBOUNCE * 10 + 1
+
+def test_ignored_paths_are_dropped_and_lost_events_rescan(watcher, tmp_path):
+    watcher, batches = watcher
+    watcher._events.put(str(tmp_path / "build" / "out.py"))
+    watcher._events.put(str(tmp_path / "a.py"))
+    assert batches.get(timeout=2) == {str(tmp_path / "a.py")}
+    watcher._events.put(str(tmp_path / "a.py"))
+    watcher._events.put(RESCAN)
+    assert batches.get(timeout=2) is None
@@ -0,0 +1,100 @@
+"""Tests for git-aware incremental indexing: changed paths, blob reuse and retries."""
+
+import shutil
+import subprocess
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+if shutil.which("git") is None:
+    pytest.skip("git is not installed", allow_module_level=True)
+
+from app.db import metadata_store
+from app.db.vector_store import VectorStore
+from app.services import code_indexer as code_indexer_module
+from app.services.code_indexer import CodeIndexer
+from app.services.parse_pool import ParsePool
+
+pytestmark = pytest.mark.integration
+
+FILES = {
+    "tasks.py": "def parse_tasks(lines):\n    return [line.split(':') for line in lines]\n",
+    "render.py": "def render(tasks):\n    return '\\n'.join(name for name, _ in tasks)\n",
+    "store.py": "def save(path, tasks):\n    with open(path, 'w') as f:\n        f.write(str(tasks))\n",
+}
+
+def git(root, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=root, check=True, capture_output=True
+    )
+
+@pytest.fixture
+def repo(fake_embedder, tmp_path):
+    metadata_store.clear()
+    store = VectorStore(chromadb.EphemeralClient())
+    store.clear()
+    root = tmp_path / "repo"
+    root.mkdir()
+    for name, content in FILES.items():
+        (root / name).write_text(content)
+    git(root, "init", "-q", "-b", "main")
+    git(root, "add", "-A")
+    git(root, "commit", "-q", "-m", "initial")
+    return CodeIndexer(store, ParsePool(workers=1)), fake_embedder, root
+
+def test_only_files_changed_since_last_run_are_processed(repo):
+    indexer, embedder, root = repo
+    first = indexer.index_codebase(str(root))
+    assert first["mode"] == "walk" and first["total_files"] == 3
+
+    (root / "render.py").write_text(FILES["render.py"] + "\ndef header():\n    return 'Tasks'\n")
+    git(root, "commit", "-q", "-am", "add header")
+    second = indexer.index_codebase(str(root))
+    assert second["mode"] == "git"
+    assert second["total_files"] == 1 and second["skipped_files"] == 0
+
+    # Uncommitted edits are picked up too, and rechecked on the next run
+    (root / "store.py").write_text(FILES["store.py"] + "\ndef load(path):\n    return open(path).read()\n")
+    assert indexer.index_codebase(str(root))["total_files"] == 1
+    assert indexer.index_codebase(str(root))["skipped_files"] == 1
+
+def test_switching_back_reuses_archived_chunks(repo):
+    indexer, embedder, root = repo
+    indexer.index_codebase(str(root))
+    embedded = embedder.embedded
+
+    git(root, "checkout", "-q", "-b", "feature")
+    git(root, "rm", "-q", "tasks.py")
+    git(root, "commit", "-q", "-m", "drop tasks")
+    removed = indexer.index_codebase(str(root))
+    assert removed["deleted_files"] == 1
+
+    git(root, "checkout", "-q", "main")
+    restored = indexer.index_codebase(str(root))
+    assert restored["reused_files"] == 1
+    # The file's chunks came back from the archive without being parsed or embedded again
+    assert embedder.embedded == embedded
+    results, _ = indexer.vector_store.search("parse task lines", k=10)
+    assert "parse_tasks" in {result["name"] for result in results}
+
+def test_failed_files_are_retried_on_the_next_git_run(repo, monkeypatch):
+    indexer, embedder, root = repo
+    indexer.index_codebase(str(root))
+    (root / "tasks.py").write_text(FILES["tasks.py"] + "\ndef count(tasks):\n    return len(tasks)\n")
+    git(root, "commit", "-q", "-am", "add count")
+
+    open_source = code_indexer_module.open_source
+
+    def unreadable(file_path):
+        if file_path.endswith("tasks.py"):
+            raise OSError("device not ready")
+        return open_source(file_path)
+
+    monkeypatch.setattr(code_indexer_module, "open_source", unreadable)
+    failed = indexer.index_codebase(str(root))
+    assert failed["failed_files"] == 1 and failed["total_files"] == 0
+
+    monkeypatch.setattr(code_indexer_module, "open_source", open_source)
+    retried = indexer.index_codebase(str(root))
+    assert retried["mode"] == "git"
+    assert retried["total_files"] == 1 and retried["failed_files"] == 0
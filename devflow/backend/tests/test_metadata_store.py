@@ -0,0 +1,38 @@
+"""Tests for retiring and pruning chunk records in the metadata store."""
+
+import pytest
+
+from app.db import metadata_store
+
+pytestmark = pytest.mark.unit
+
+def add_chunk(file_id, chunk_id, blob_sha=None):
+    metadata_store.add_chunks([{
+        "chunk_id": chunk_id, "file_id": file_id, "type": "function", "name": chunk_id,
+        "start": 0, "end": 1, "embedding_id": f"vec-{chunk_id}", "blob_sha": blob_sha
+    }])
+    metadata_store.add_feedback(chunk_id, "up")
+
+@pytest.fixture
+def file_id():
+    metadata_store.clear()
+    return metadata_store.add_file("/repo/tasks.py").id
+
+def test_retire_deletes_feedback_of_deleted_chunks(file_id):
+    add_chunk(file_id, "plain")
+    add_chunk(file_id, "kept", blob_sha="b1")
+    assert metadata_store.retire_chunks(file_id) == {"vec-plain", "vec-kept"}
+    assert metadata_store.list_feedback("plain") == []
+    # Archived chunks keep their feedback until they are pruned
+    assert len(metadata_store.list_feedback("kept")) == 1
+    assert metadata_store.prune_archived_chunks(keep=0) == {"vec-kept"}
+    assert metadata_store.list_feedback("kept") == []
+
+def test_retire_deletes_chunks_whose_blob_is_already_archived(file_id):
+    add_chunk(file_id, "first", blob_sha="b1")
+    metadata_store.retire_chunks(file_id)
+    add_chunk(file_id, "second", blob_sha="b1")
+    metadata_store.retire_chunks(file_id)
+    assert metadata_store.get_archived_blobs() == {"b1"}
+    assert len(metadata_store.list_feedback("first")) == 1
+    assert metadata_store.list_feedback("second") == []
@@ -0,0 +1,76 @@
+"""Tests for coalescing concurrent query embeddings."""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.services.query_batcher import QueryBatcher
+
+pytestmark = pytest.mark.unit
+
+class RecordingEmbedder:
+    """embed_batch stand-in: one row per text, recording each call."""
+
+    def __init__(self, fail=False, release=None):
+        self.calls = []
+        self.fail = fail
+        self.release = release
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return np.array([[len(text), i] for i, text in enumerate(texts)], dtype=np.float32)
+
+def run(batcher, texts):
+    async def main():
+        try:
+            return await asyncio.gather(*(batcher.embed(text) for text in texts), return_exceptions=True)
+        finally:
+            batcher.shutdown()
+    return asyncio.run(main())
+
+def test_concurrent_requests_share_one_call():
+    embedder = RecordingEmbedder()
+    batcher = QueryBatcher(embedder, max_batch_size=32, max_wait_ms=20)
+    results = run(batcher, ["sort", "parse json", "sort"])
+    # Duplicates are embedded once, and every caller gets its own text's row
+    assert embedder.calls == [["sort", "parse json"]]
+    assert [result[0] for result in results] == [4, 10, 4]
+    assert batcher.stats() == {"batches": 1, "items": 3, "mean_batch_size": 3.0}
+
+def test_full_batch_does_not_wait():
+    embedder = RecordingEmbedder()
+    batcher = QueryBatcher(embedder, max_batch_size=2, max_wait_ms=60_000)
+    run(batcher, ["a", "b", "c", "d"])
+    assert embedder.calls == [["a", "b"], ["c", "d"]]
+
+def test_requests_arriving_during_a_batch_form_the_next_one():
+    release = threading.Event()
+    embedder = RecordingEmbedder(release=release)
+    batcher = QueryBatcher(embedder, max_batch_size=32, max_wait_ms=1)
+
+    async def main():
+        first = asyncio.ensure_future(batcher.embed("first"))
+        while not embedder.calls:
+            await asyncio.sleep(0.01)
+        later = [asyncio.ensure_future(batcher.embed(text)) for text in ("second", "third")]
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.gather(first, *later)
+        batcher.shutdown()
+
+    asyncio.run(main())
+    assert embedder.calls == [["first"], ["second", "third"]]
+
+def test_errors_reach_every_caller_of_the_batch():
+    embedder = RecordingEmbedder(fail=True)
+    batcher = QueryBatcher(embedder, max_batch_size=32, max_wait_ms=20)
+    results = run(batcher, ["a", "b"])
+    assert len(embedder.calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.stats()["batches"] == 0
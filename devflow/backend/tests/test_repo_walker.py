@@ -0,0 +1,106 @@
+"""Tests for gitignore semantics in IgnoreMatcher."""
+
+import shutil
+import subprocess
+
+import pytest
+
+from app.services.repo_walker import IgnoreMatcher, compile_pattern
+
+pytestmark = pytest.mark.unit
+
+GITIGNORE = """# comment
+*.log
+!important.log
+/root_only.txt
+src/gen/
+logs/
+!logs/keep.txt
+doc?/**/*.tmp
+\\#literal
+tmp[0-9].py
+"""
+
+# (path relative to the root, ignored by the rules above plus src/.gitignore)
+CASES = [
+    ("a.log", True),
+    ("src/deep/a.log", True),
+    ("important.log", False),
+    ("root_only.txt", True),
+    ("src/root_only.txt", False),
+    ("src/gen/x.py", True),
+    ("logs/keep.txt", True),
+    ("docs/c.tmp", True),
+    ("docs/a/b/c.tmp", True),
+    ("#literal", True),
+    ("tmp1.py", True),
+    ("tmpa.py", False),
+    ("src/local.py", True),
+    ("local.py", False),
+]
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text(GITIGNORE)
+    (tmp_path / "src" / "gen").mkdir(parents=True)
+    (tmp_path / "src" / ".gitignore").write_text("local.py\n")
+    return tmp_path
+
+@pytest.mark.parametrize("path, ignored", CASES)
+def test_gitignore_semantics(repo, path, ignored):
+    assert IgnoreMatcher(str(repo)).is_ignored(path) is ignored
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_cases_agree_with_git(repo):
+    shutil.rmtree(repo / ".git")
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    paths = [path for path, _ in CASES]
+    result = subprocess.run(["git", "check-ignore", "--stdin"], cwd=repo, input="\n".join(paths), capture_output=True, text=True)
+    assert set(result.stdout.split("\n")) - {""} == {path for path, ignored in CASES if ignored}
+
+def test_directory_patterns_only_match_directories(repo):
+    (repo / "logs").mkdir()
+    (repo / "data").write_text("a file named like the pattern")
+    (repo / ".gitignore").write_text("logs/\ndata/\n")
+    matcher = IgnoreMatcher(str(repo))
+    assert matcher.is_ignored("logs", is_dir=True)
+    assert matcher.is_ignored_path(str(repo / "logs"))
+    assert not matcher.is_ignored("data", is_dir=False)
+    assert not matcher.is_ignored_path(str(repo / "data"))
+
+def test_files_under_an_ignored_directory_cannot_be_re_included(repo):
+    # "!logs/keep.txt" cannot win over the excluded logs/ directory
+    matcher = IgnoreMatcher(str(repo))
+    assert matcher.is_ignored("logs/keep.txt")
+    (repo / ".gitignore").write_text("logs/*\n!logs/keep.txt\n")
+    matcher.reset()
+    assert not matcher.is_ignored("logs/keep.txt")
+    assert matcher.is_ignored("logs/other.txt")
+
+def test_default_patterns_can_be_re_included(repo):
+    (repo / "build").mkdir()
+    (repo / "build" / "out.py").write_text("x = 1\n")
+    assert IgnoreMatcher(str(repo)).is_ignored("build/out.py")
+    (repo / ".devflowignore").write_text("!build/\n")
+    assert not IgnoreMatcher(str(repo)).is_ignored("build/out.py")
+
+def test_walk_prunes_ignored_directories(repo):
+    (repo / "src" / "gen" / "x.py").write_text("x = 1\n")
+    (repo / "src" / "main.py").write_text("x = 1\n")
+    (repo / "src" / "local.py").write_text("x = 1\n")
+    (repo / "node_modules" / "pkg").mkdir(parents=True)
+    (repo / "node_modules" / "pkg" / "index.js").write_text("")
+    walked = {path[len(str(repo)) + 1:] for path in IgnoreMatcher(str(repo)).walk_files()}
+    assert walked == {".gitignore", "src/.gitignore", "src/main.py"}
+
+def test_outer_ignore_files_apply_to_a_subdirectory_root(repo):
+    (repo / "src" / "sub").mkdir()
+    matcher = IgnoreMatcher(str(repo / "src"))
+    assert matcher.is_ignored("deep/a.log")
+    assert matcher.is_ignored("gen/x.py")
+    assert not matcher.is_ignored("root_only.txt")
+
+@pytest.mark.parametrize("line", ["", "   ", "# comment", "/"])
+def test_blank_and_comment_lines_compile_to_nothing(line):
+    assert compile_pattern(line) is None
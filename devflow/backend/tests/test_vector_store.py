@@ -0,0 +1,86 @@
+"""Tests for vector-native and batched search in VectorStore."""
+
+import numpy as np
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+from app.db import metadata_store
+from app.db.vector_store import VectorStore
+
+pytestmark = pytest.mark.integration
+
+FUNCTIONS = {
+    "parse_json": ("python", "def parse_json(text):\n    return json.loads(text)"),
+    "sort_items": ("python", "def sort_items(items):\n    return sorted(items)"),
+    "render": ("javascript", "function render(node) { return node.html(); }"),
+    "fetch_user": ("javascript", "async function fetchUser(id) { return api.get(id); }"),
+}
+
+@pytest.fixture
+def store(fake_embedder, monkeypatch):
+    metadata_store.clear()
+    store = VectorStore(chromadb.EphemeralClient())
+    store.clear()
+    names = list(FUNCTIONS)
+    store.add_vectors(
+        [FUNCTIONS[name][1] for name in names],
+        [{"type": "function", "name": name, "language": FUNCTIONS[name][0]} for name in names],
+        ids=names
+    )
+    calls = []
+    embed_queries = fake_embedder.embed_queries
+
+    def recording_embed_queries(queries):
+        calls.append(list(queries))
+        return embed_queries(queries)
+
+    monkeypatch.setattr(fake_embedder, "embed_queries", recording_embed_queries)
+    store.embed_calls = calls
+    return store
+
+@pytest.fixture
+def collection_queries(store, monkeypatch):
+    """Number of queries sent to Chroma, per call."""
+    calls = []
+    collection_type = type(store.collection)
+    query = collection_type.query
+
+    def counting_query(collection, *args, **kwargs):
+        calls.append(len(kwargs["query_embeddings"]))
+        return query(collection, *args, **kwargs)
+
+    monkeypatch.setattr(collection_type, "query", counting_query)
+    return calls
+
+def names(results):
+    return [result["name"] for result in results]
+
+def test_search_by_vector_does_not_use_the_model(store, fake_embedder):
+    vector = fake_embedder._vector(FUNCTIONS["sort_items"][1])
+    results, scores = store.search_by_vector(vector, k=2)
+    assert store.embed_calls == []
+    assert names(results)[0] == "sort_items"
+    assert len(scores) == 2 and scores[0] >= scores[1]
+
+def test_search_by_vector_applies_the_filter(store, fake_embedder):
+    vector = fake_embedder._vector(FUNCTIONS["sort_items"][1])
+    results, _ = store.search_by_vector(vector, k=4, where={"language": "javascript"})
+    assert sorted(names(results)) == ["fetch_user", "render"]
+
+def test_search_batch_matches_single_searches(store, fake_embedder, collection_queries):
+    queries = ["parse some json", fake_embedder._vector(FUNCTIONS["render"][1]), "sort the list"]
+    batched = store.search_batch(queries, k=3)
+    # Strings are embedded together, and every query goes out in one collection query
+    assert store.embed_calls == [["parse some json", "sort the list"]]
+    assert collection_queries == [3]
+    assert names(batched[1][0])[0] == "render"
+
+    singles = [store.search(queries[0], k=3), store.search_by_vector(queries[1], k=3), store.search(queries[2], k=3)]
+    for (results, scores), (single_results, single_scores) in zip(batched, singles):
+        assert names(results) == names(single_results)
+        assert np.allclose(scores, single_scores)
+
+def test_search_batch_of_nothing_queries_nothing(store, collection_queries):
+    assert store.search_batch([], k=3) == []
+    assert collection_queries == [] and store.embed_calls == []
@@ -157,12 +157,35 @@ export class DevFlowSidebarProvider implements vscode.WebviewViewProvider {
                 extensions
             };
             const response = await callApi('/index', indexRequest);
-            this.sendMessageToWebview({ type: 'indexComplete', data: response.data, message: response.message });
+            const job = await this.waitForIndexJob(response.data.job_id);
+            if (job.status !== 'completed') {
+                this.sendMessageToWebview({ type: 'error', message: `Indexing ${job.status}: ${job.error ?? ''}` });
+                return;
+            }
+            const { message, ...result } = job.result;
+            this.sendMessageToWebview({ type: 'indexComplete', data: result, message });
         } catch (error) {
             this.sendMessageToWebview({ type: 'error', message: `Indexing failed: ${error}` });
         }
     }
     
+    private async waitForIndexJob(jobId: string): Promise<any> {
+        // Indexing runs as a background job on the backend; poll it until it finishes
+        while (true) {
+            const response = await callApi(`/index/jobs/${jobId}`, {}, 'GET');
+            const job = response.data;
+            if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+                return job;
+            }
+            const eta = job.eta_seconds !== null ? `, ~${Math.ceil(job.eta_seconds)}s left` : '';
+            this.sendMessageToWebview({
+                type: 'loading',
+                message: `Indexing repository... ${job.files_done}/${job.files_total} files, ${job.embeddings_done} embeddings${eta}`
+            });
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
     private async handleClear() {
         try {
             this.sendMessageToWebview({ type: 'loading', message: 'Clearing index...' });